@@ -0,0 +1,865 @@
+"""
+native asyncio transfer engine for amazon aws s3
+"""
+
+import os
+import ssl
+import hmac
+import random
+import asyncio
+import hashlib
+import contextlib
+import logging
+import threading
+
+from concurrent.futures import Future
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass
+from datetime import datetime
+from datetime import timezone
+from typing import Any
+from typing import AsyncIterator
+from typing import Awaitable
+from typing import Callable
+from typing import Dict
+from typing import List
+from typing import Mapping
+from typing import Optional
+from typing import Tuple
+from urllib.parse import quote
+from urllib.parse import urlsplit
+from xml.etree import ElementTree
+
+from watchdog.utils import BaseThread
+
+from file_sync_s3.append import AppendSupport
+from file_sync_s3.aws_s3 import AuthBucketS3
+from file_sync_s3.aws_s3 import BucketOperatorS3
+from file_sync_s3.aws_s3 import MetaEntryS3
+from file_sync_s3.aws_s3 import SupportFuncS3
+from file_sync_s3.body import BodyProviderMmap
+from file_sync_s3.body import BodyProviderRead
+from file_sync_s3.body import SupportFuncBody
+from file_sync_s3.config import CONFIG
+from file_sync_s3.logster import logster_duration
+from file_sync_s3.snapshot import SnapshotChangeError
+from file_sync_s3.snapshot import SnapshotGuard
+from file_sync_s3.sparse import SparseExtentMap
+
+logger = logging.getLogger(__name__)
+
+frozen = dataclass(frozen=True)
+
+override = lambda function : function
+
+
+@frozen
+class EngineConfig:
+    "transfer engine params"
+
+    config_entry = "amazon/engine"
+
+    engine_mode:str  # boto3, asyncio
+    engine_endpoint:str  # empty for aws, or url of s3 compatible service
+    engine_concurrency:int  # concurrent operations and pooled connections
+    engine_io_threads:int  # threads for local file reads and writes
+    engine_chunk_size:int  # multipart part size
+
+    mode_boto3 = "boto3"
+    mode_asyncio = "asyncio"
+
+    @classmethod
+    def default(cls) -> "EngineConfig":
+        ""
+        section = CONFIG[cls.config_entry]
+        return EngineConfig(
+            engine_mode=section['engine_mode'],
+            engine_endpoint=section['engine_endpoint'],
+            engine_concurrency=section['engine_concurrency@int'],
+            engine_io_threads=section['engine_io_threads@int'],
+            engine_chunk_size=section['engine_chunk_size@int'],
+        )
+
+    def has_asyncio(self) -> bool:
+        return self.engine_mode == self.mode_asyncio
+
+
+class ResponseErrorAio(Exception):
+    "unexpected http response"
+
+    def __init__(self, status:int, body:bytes):
+        super().__init__(f"status={status} body={body[:512]!r}")
+        self.status = status
+        self.body = body
+
+
+class SignerV4:
+    "aws signature version 4, header based"
+    "https://docs.aws.amazon.com/AmazonS3/latest/API/sig-v4-header-based-auth.html"
+
+    algorithm = "AWS4-HMAC-SHA256"
+    service = "s3"
+    payload_unsigned = "UNSIGNED-PAYLOAD"
+    payload_empty = hashlib.sha256(b"").hexdigest()
+
+    def __init__(self, region_name:str, access_key:str, secret_key:str):
+        self.region_name = region_name
+        self.access_key = access_key
+        self.secret_key = secret_key
+        self.signing_date = None
+        self.signing_key = None
+
+    @classmethod
+    def quote_path(cls, path:str) -> str:
+        return quote(path, safe="/-_.~")
+
+    @classmethod
+    def quote_query(cls, query:Mapping[str, str]) -> str:
+        return "&".join(
+            f"{quote(key, safe='-_.~')}={quote(str(value), safe='-_.~')}"
+            for key, value in sorted(query.items())
+        )
+
+    def produce_key(self, date_stamp:str) -> bytes:
+        "derive signing key, cached per day"
+        if self.signing_date != date_stamp:
+            def sign(key:bytes, text:str) -> bytes:
+                return hmac.new(key, text.encode("utf-8"), hashlib.sha256).digest()
+            key_date = sign(f"AWS4{self.secret_key}".encode("utf-8"), date_stamp)
+            key_region = sign(key_date, self.region_name)
+            key_service = sign(key_region, self.service)
+            self.signing_key = sign(key_service, "aws4_request")
+            self.signing_date = date_stamp
+        return self.signing_key
+
+    def sign_request(self,
+            method:str,
+            path:str,
+            query:Mapping[str, str],
+            header_dict:Dict[str, str],
+            payload_hash:str,
+            instant:datetime=None,
+        ) -> Dict[str, str]:
+        "add date, payload hash and authorization headers"
+
+        instant = instant or datetime.now(timezone.utc)
+        amz_date = instant.strftime("%Y%m%dT%H%M%SZ")
+        date_stamp = amz_date[:8]
+
+        header_dict = {key.lower(): str(value).strip() for key, value in header_dict.items()}
+        header_dict["x-amz-date"] = amz_date
+        header_dict["x-amz-content-sha256"] = payload_hash
+
+        signed_list = sorted(header_dict)
+        signed_headers = ";".join(signed_list)
+        canonical_headers = "".join(f"{key}:{header_dict[key]}\n" for key in signed_list)
+        canonical_request = "\n".join([
+            method,
+            self.quote_path(path),
+            self.quote_query(query),
+            canonical_headers,
+            signed_headers,
+            payload_hash,
+        ])
+
+        scope = f"{date_stamp}/{self.region_name}/{self.service}/aws4_request"
+        string_to_sign = "\n".join([
+            self.algorithm,
+            amz_date,
+            scope,
+            hashlib.sha256(canonical_request.encode("utf-8")).hexdigest(),
+        ])
+        signature = hmac.new(
+            self.produce_key(date_stamp), string_to_sign.encode("utf-8"), hashlib.sha256,
+        ).hexdigest()
+
+        header_dict["authorization"] = (
+            f"{self.algorithm} Credential={self.access_key}/{scope}, "
+            f"SignedHeaders={signed_headers}, Signature={signature}"
+        )
+        return header_dict
+
+
+@frozen
+class ResponseAio:
+    "http response head"
+
+    status:int
+    header_dict:Dict[str, str]  # lower case names
+
+
+class ConnectionAio:
+    "single keep-alive http/1.1 connection"
+
+    def __init__(self, reader:asyncio.StreamReader, writer:asyncio.StreamWriter):
+        self.reader = reader
+        self.writer = writer
+        self.has_reuse = True
+
+    async def send_head(self, method:str, target:str, header_dict:Mapping[str, str]) -> None:
+        head = f"{method} {target} HTTP/1.1\r\n"
+        head += "".join(f"{key}: {value}\r\n" for key, value in header_dict.items())
+        head += "\r\n"
+        self.writer.write(head.encode("latin-1"))
+
+    async def send_body(self, body_stream:AsyncIterator[memoryview]) -> None:
+        async for chunk in body_stream:
+            self.writer.write(chunk)
+            await self.writer.drain()
+
+    async def read_head(self) -> ResponseAio:
+        status_line = await self.reader.readline()
+        if not status_line:
+            raise ConnectionResetError("connection closed by peer")
+        status = int(status_line.split(b" ", 2)[1])
+        header_dict = dict()
+        while True:
+            line = await self.reader.readline()
+            if line in (b"\r\n", b"\n", b""):
+                break
+            key, _, value = line.decode("latin-1").partition(":")
+            header_dict[key.strip().lower()] = value.strip()
+        if header_dict.get("connection", "").lower() == "close":
+            self.has_reuse = False
+        return ResponseAio(status=status, header_dict=header_dict)
+
+    async def read_body(self, response:ResponseAio, method:str) -> AsyncIterator[bytes]:
+        "stream response body"
+        if method == "HEAD" or response.status in (204, 304):
+            return
+        header_dict = response.header_dict
+        if header_dict.get("transfer-encoding", "").lower() == "chunked":
+            while True:
+                size_line = await self.reader.readline()
+                size = int(size_line.split(b";")[0], 16)
+                if size == 0:
+                    while (await self.reader.readline()) not in (b"\r\n", b"\n", b""):
+                        pass
+                    return
+                remain = size
+                while remain:
+                    chunk = await self.reader.read(min(remain, 1024 * 1024))
+                    if not chunk:
+                        raise ConnectionResetError("truncated chunk")
+                    remain -= len(chunk)
+                    yield chunk
+                await self.reader.readline()
+        elif "content-length" in header_dict:
+            remain = int(header_dict["content-length"])
+            while remain:
+                chunk = await self.reader.read(min(remain, 1024 * 1024))
+                if not chunk:
+                    raise ConnectionResetError("truncated body")
+                remain -= len(chunk)
+                yield chunk
+        else:
+            self.has_reuse = False
+            while True:
+                chunk = await self.reader.read(1024 * 1024)
+                if not chunk:
+                    return
+                yield chunk
+
+    def close(self) -> None:
+        self.writer.close()
+
+
+class HttpPoolAio:
+    "non-blocking http client with per host keep-alive connection pool"
+
+    def __init__(self, pool_size:int):
+        self.pool_size = pool_size
+        self.idle_dict:Dict[Tuple[str, str, int], List[ConnectionAio]] = dict()
+        self.slot_semaphore = None  # bound to running loop on first use
+        self.busy_count = 0  # requests holding a slot
+        self.ssl_context = ssl.create_default_context()
+
+    async def connection_open(self, scheme:str, host:str, port:int) -> Tuple[ConnectionAio, bool]:
+        "reuse idle connection, or open a new one; report reuse"
+        idle_list = self.idle_dict.setdefault((scheme, host, port), [])
+        while idle_list:
+            connection = idle_list.pop()
+            if not connection.reader.at_eof():
+                return (connection, True)
+            connection.close()
+        reader, writer = await asyncio.open_connection(
+            host, port,
+            ssl=self.ssl_context if scheme == "https" else None,
+            limit=1024 * 1024,
+        )
+        return (ConnectionAio(reader, writer), False)
+
+    def connection_release(self, scheme:str, host:str, port:int, connection:ConnectionAio) -> None:
+        if connection.has_reuse:
+            self.idle_dict.setdefault((scheme, host, port), []).append(connection)
+        else:
+            connection.close()
+
+    async def request(self,
+            method:str,
+            url:str,
+            header_dict:Mapping[str, str],
+            body_factory:Callable[[], AsyncIterator[memoryview]]=None,
+            body_sink:Callable[[bytes], Awaitable]=None,
+        ) -> Tuple[ResponseAio, bytes]:
+        "perform request; body is streamed into sink for success, or collected for errors"
+
+        if self.slot_semaphore is None:
+            self.slot_semaphore = asyncio.Semaphore(self.pool_size)
+
+        url_part = urlsplit(url)
+        scheme = url_part.scheme
+        host = url_part.hostname
+        port = url_part.port or (443 if scheme == "https" else 80)
+        target = url_part.path + (f"?{url_part.query}" if url_part.query else "")
+
+        async with self.slot_semaphore, self.busy_slot():
+            for attempt in range(2):
+                connection, has_reuse = await self.connection_open(scheme, host, port)
+                try:
+                    await connection.send_head(method, target, header_dict)
+                    if body_factory:
+                        await connection.send_body(body_factory())
+                    await connection.writer.drain()
+                    response = await connection.read_head()
+                    body = bytearray()
+                    async for chunk in connection.read_body(response, method):
+                        if body_sink and response.status < 300:
+                            await body_sink(chunk)
+                        else:
+                            body.extend(chunk)
+                except (ConnectionError, asyncio.IncompleteReadError):
+                    connection.close()
+                    if has_reuse and attempt == 0:
+                        continue  # stale keep-alive connection, retry on fresh one
+                    raise
+                except:
+                    connection.close()
+                    raise
+                self.connection_release(scheme, host, port, connection)
+                return (response, bytes(body))
+
+    @contextlib.asynccontextmanager
+    async def busy_slot(self) -> AsyncIterator[None]:
+        self.busy_count += 1
+        try:
+            yield
+        finally:
+            self.busy_count -= 1
+
+    def pool_state(self) -> Dict[str, int]:
+        "slot and idle connection counts"
+        return dict(
+            pool_size=self.pool_size,
+            pool_busy=self.busy_count,
+            pool_idle=sum(len(idle_list) for idle_list in self.idle_dict.values()),
+        )
+
+    def close(self) -> None:
+        for idle_list in self.idle_dict.values():
+            for connection in idle_list:
+                connection.close()
+        self.idle_dict.clear()
+
+
+class BucketOperatorAio(BucketOperatorS3):
+    "amazon bucket resource operations with native asyncio transfers"
+    "plain put/get/delete run on the event loop, other features use boto3 base"
+
+    retry_limit = 5  # attempts after the first one, for server errors and throttling
+    retry_delay = 0.1  # first backoff, doubles per attempt, seconds
+    retry_delay_limit = 20.0  # longest backoff, seconds
+
+    def __init__(self,
+            config_access:AuthBucketS3=None,
+            engine_config:EngineConfig=None,
+            **kwargs,
+        ):
+        super().__init__(config_access=config_access, **kwargs)
+        self.engine_config = engine_config or EngineConfig.default()
+        self.http_pool = HttpPoolAio(self.engine_config.engine_concurrency)
+        self.io_executor = ThreadPoolExecutor(
+            self.engine_config.engine_io_threads, thread_name_prefix="engine_io",
+        )
+        self.io_count = 0  # local io calls submitted and not finished
+        self.signer = SignerV4(
+            region_name=self.config_access.region_name,
+            access_key=self.config_access.access_key,
+            secret_key=self.config_access.secret_key,
+        )
+
+    @override
+    def pool_state(self) -> Dict[str, int]:
+        "connection pool and local io pool usage, for diagnostics"
+        return dict(
+            self.http_pool.pool_state(),
+            io_threads=self.engine_config.engine_io_threads,
+            io_queue=max(0, self.io_count - self.engine_config.engine_io_threads),
+        )
+
+    async def io_call(self, function:Callable, *args) -> Any:
+        "run blocking file system or index call on the io pool, keep the loop free"
+        loop = asyncio.get_running_loop()
+        self.io_count += 1
+        try:
+            return await loop.run_in_executor(self.io_executor, function, *args)
+        finally:
+            self.io_count -= 1
+
+    def object_url(self, remot_path:str) -> Tuple[str, str, str]:
+        "produce (url base, host, canonical path) for object key"
+        bucket_name = self.config_access.bucket_name
+        endpoint = self.engine_config.engine_endpoint
+        if endpoint:  # path style for s3 compatible service
+            url_part = urlsplit(endpoint)
+            base = f"{url_part.scheme}://{url_part.netloc}"
+            return (base, url_part.netloc, f"/{bucket_name}/{remot_path}")
+        region_name = self.config_access.region_name
+        if "." in bucket_name:  # path style keeps tls host name valid
+            host = f"s3.{region_name}.amazonaws.com"
+            return (f"https://{host}", host, f"/{bucket_name}/{remot_path}")
+        host = f"{bucket_name}.s3.{region_name}.amazonaws.com"
+        return (f"https://{host}", host, f"/{remot_path}")
+
+    async def request_s3(self,
+            method:str,
+            remot_path:str,
+            query:Mapping[str, str]=None,
+            header_dict:Mapping[str, str]=None,
+            body:bytes=None,
+            body_factory:Callable[[], AsyncIterator[memoryview]]=None,
+            body_length:int=None,
+            body_sink:Callable[[bytes], Awaitable]=None,
+        ) -> Tuple[ResponseAio, bytes]:
+        "signed s3 request, with bounded exponential backoff for server errors and throttling"
+        "connection failures are retried only before any body reached the sink"
+
+        query = query or dict()
+        base, host, path = self.object_url(remot_path)
+        header_dict = dict(header_dict or dict(), host=host)
+
+        if body is not None:
+            payload_hash = hashlib.sha256(body).hexdigest()
+            body_length = len(body)
+            body_factory = lambda: SupportFuncAio.bytes_stream(body)
+        elif body_factory is not None:
+            payload_hash = SignerV4.payload_unsigned
+        else:
+            payload_hash = SignerV4.payload_empty
+        if body_factory is not None or method in ("PUT", "POST"):
+            header_dict["content-length"] = str(body_length or 0)
+
+        url = f"{base}{SignerV4.quote_path(path)}"
+        if query:
+            url += f"?{SignerV4.quote_query(query)}"
+
+        sink_size = 0
+        async def sink_count(chunk:bytes) -> None:
+            nonlocal sink_size
+            sink_size += len(chunk)
+            await body_sink(chunk)
+
+        attempt = 0
+        while True:
+            signed_dict = self.signer.sign_request(method, path, query, header_dict, payload_hash)  # fresh date per attempt
+            try:
+                response, reply = await self.http_pool.request(
+                    method, url, signed_dict, body_factory, sink_count if body_sink else None,
+                )
+            except (ConnectionError, asyncio.IncompleteReadError):
+                if sink_size or attempt >= self.retry_limit:
+                    raise
+            else:
+                if not SupportFuncAio.has_retry(response.status) or attempt >= self.retry_limit:
+                    return (response, reply)
+                logger.info(f"retry: {method} {remot_path} status={response.status}")
+            await asyncio.sleep(random.uniform(0, min(self.retry_delay_limit, self.retry_delay * 2 ** attempt)))
+            attempt += 1
+
+    async def remot_head_aio(self, remot_path:str) -> Optional[dict]:
+        "discover remot object head, if present, in boto3 head_object layout"
+        response, body = await self.request_s3("HEAD", remot_path)
+        if response.status == 404:
+            return None
+        if response.status >= 300:
+            raise ResponseErrorAio(response.status, body)
+        return SupportFuncAio.head_object(response.header_dict)
+
+    async def remot_meta_aio(self, remot_path:str) -> MetaEntryS3:
+        "discover remot object meta data"
+        return SupportFuncS3.meta_decode_maybe(await self.remot_head_aio(remot_path))
+
+    async def read_block(self, local_path:str, offset:int, length:int) -> bytes:
+        "read file block without blocking the loop"
+        return await self.io_call(SupportFuncAio.read_block, local_path, offset, length)
+
+    def file_stream(self,
+            local_path:str,
+            offset:int,
+            length:int,
+            body_provider:BodyProviderMmap=None,
+            sparse_map:SparseExtentMap=None,
+        ) -> Callable[[], AsyncIterator[bytes]]:
+        "produce re-startable file range body stream"
+        "with sparse map, range is in packed body of data extents"
+        block_size = SupportFuncAio.block_size
+        async def body_stream() -> AsyncIterator[bytes]:
+            position = offset
+            finish = offset + length
+            if sparse_map is not None:
+                for range_offset, range_length in sparse_map.file_range_list(offset, length):
+                    async for block in self.file_stream(local_path, range_offset, range_length)():
+                        yield block
+                return
+            if body_provider is not None:  # memoryview slices, no read copy
+                while position < finish:
+                    limit = min(position + block_size, finish)
+                    yield body_provider.part_view(position, limit - position)
+                    position = limit
+                body_provider.part_release(offset, length)
+                return
+            while position < finish:
+                block = await self.read_block(local_path, position, min(block_size, finish - position))
+                if not block:
+                    raise SnapshotChangeError(local_path)  # file shrunk under the upload
+                position += len(block)
+                yield block
+        return body_stream
+
+    @override
+    async def resource_delete(self,
+            remot_path:str,
+        ) -> None:
+        "remove file from remot bucket"
+        logger.info(f"remot: {remot_path}")
+        if self.dedup_index.has_enable():
+            await self.io_call(self.dedup_forget, remot_path)
+        response, body = await self.request_s3("DELETE", remot_path)
+        if response.status >= 300 and response.status != 404:
+            raise ResponseErrorAio(response.status, body)
+
+    @override
+    @logster_duration
+    async def resource_put(self,
+            local_path:str,
+            remot_path:str,
+            use_check:bool=True,
+        ) -> None:
+        "transfer file from local into remot"
+        "dedup and append need digest and server side copies, these go through boto3 base"
+
+        if self.dedup_index.has_enable() or self.append_config.append_enable:
+            await super().resource_put(local_path, remot_path, use_check)
+            return
+
+        logger.info(f"local: {local_path}")
+        logger.info(f"remot: {remot_path}")
+
+        snapshot_guard = await self.io_call(SnapshotGuard, self.snapshot_config, local_path)
+        try:
+            local_meta = await self.io_call(self.local_meta, local_path)
+            remot_meta = await self.remot_meta_aio(remot_path)
+
+            if use_check and (local_meta == remot_meta):
+                logger.info(f"no change")
+                return
+
+            source_path = await self.io_call(snapshot_guard.source_path)
+
+            header_dict = {
+                "x-amz-acl": self.config_access.object_mode,
+            }
+            header_dict.update(self.object_router.object_headers(local_path))
+            header_dict.update(SupportFuncAio.meta_headers(local_meta))
+
+            total_size = local_meta.length
+            logger.info(f"total: {total_size:,}")
+
+            body_size = total_size
+            body_provider = None
+            sparse_map = await self.io_call(self.sparse_map, source_path, total_size)
+            if sparse_map:
+                body_size = sparse_map.data_size
+                header_dict[SupportFuncAio.meta_prefix + SupportFuncS3.key_entry_extent] = sparse_map.encode()
+            elif self.body_config.has_mmap():
+                body_provider = await self.io_call(BodyProviderMmap, source_path, total_size)
+
+            try:
+                with self.progress_tracker.transfer(remot_path, body_size) as progress_counter:
+                    if body_size <= self.engine_config.engine_chunk_size:
+                        part_body = None
+                        if snapshot_guard.has_verify() and not sparse_map:  # rewrite after the digest fails on the service side
+                            if body_provider is None:  # buffer gives short read on truncation, mapping would fault
+                                part_body = await self.io_call(SupportFuncAio.read_body, source_path, body_size)
+                            part_view = body_provider.view if part_body is None else part_body
+                            header_dict["content-md5"] = await self.io_call(SupportFuncBody.content_md5, part_view)
+                            await self.io_call(snapshot_guard.verify)
+                        response, body = await self.request_s3(
+                            "PUT", remot_path,
+                            header_dict=header_dict,
+                            body=part_body,  # takes precedence over the stream
+                            body_factory=self.file_stream(source_path, 0, body_size, body_provider, sparse_map),
+                            body_length=body_size,
+                        )
+                        if response.status >= 300:
+                            raise ResponseErrorAio(response.status, body)
+                        progress_counter(body_size)
+                        await self.io_call(snapshot_guard.verify)  # object holds earlier state, report newer one
+                    else:
+                        await self.multipart_put(
+                            source_path, remot_path, body_size, header_dict, body_provider, snapshot_guard.verify,
+                            progress_counter, sparse_map,
+                        )
+            finally:
+                if body_provider is not None:
+                    await self.io_call(body_provider.close)
+        finally:
+            await self.io_call(snapshot_guard.close)
+
+    async def multipart_put(self,
+            local_path:str,
+            remot_path:str,
+            total_size:int,
+            header_dict:Mapping[str, str],
+            body_provider:BodyProviderMmap=None,
+            publish_check:Callable[[], None]=None,
+            progress_counter:Callable[[int], None]=None,
+            sparse_map:SparseExtentMap=None,
+        ) -> None:
+        "concurrent multipart upload of file ranges, or of packed body ranges with sparse map"
+
+        response, body = await self.request_s3(
+            "POST", remot_path, query=dict(uploads=""), header_dict=header_dict, body=b"",
+        )
+        if response.status >= 300:
+            raise ResponseErrorAio(response.status, body)
+        upload_id = SupportFuncAio.xml_text(body, "UploadId")
+
+        async def part_put(part_number:int, offset:int, length:int) -> str:
+            response, body = await self.request_s3(
+                "PUT", remot_path,
+                query=dict(partNumber=str(part_number), uploadId=upload_id),
+                body_factory=self.file_stream(local_path, offset, length, body_provider, sparse_map),
+                body_length=length,
+            )
+            if response.status >= 300:
+                raise ResponseErrorAio(response.status, body)
+            if progress_counter:
+                progress_counter(length)
+            return response.header_dict["etag"]
+
+        chunk_size = SupportFuncAio.part_size(total_size, self.engine_config.engine_chunk_size)
+        try:
+            etag_list = await asyncio.gather(*[
+                part_put(index + 1, offset, min(chunk_size, total_size - offset))
+                for index, offset in enumerate(range(0, total_size, chunk_size))
+            ])
+            if publish_check:
+                await self.io_call(publish_check)
+            complete = SupportFuncAio.xml_complete(etag_list)
+            response, body = await self.request_s3(
+                "POST", remot_path, query=dict(uploadId=upload_id), body=complete,
+            )
+            if response.status >= 300 or b"<Error>" in body:
+                raise ResponseErrorAio(response.status, body)
+        except:
+            await self.request_s3("DELETE", remot_path, query=dict(uploadId=upload_id))
+            raise
+
+    @override
+    @logster_duration
+    async def resource_get(self,
+            local_path:str,
+            remot_path:str,
+            use_check:bool=True,
+        ) -> None:
+        "transfer file from remot into local"
+
+        logger.info(f"local: {local_path}")
+        logger.info(f"remot: {remot_path}")
+
+        local_meta = await self.io_call(self.local_meta, local_path)
+        remot_head = await self.remot_head_aio(remot_path) or dict()
+        remot_meta = SupportFuncS3.meta_decode_maybe(remot_head)
+
+        if use_check and (local_meta == remot_meta):
+            logger.info(f"no change")
+            return
+
+        source_path = SupportFuncS3.meta_pointer(remot_head) or remot_path
+        source_head = remot_head
+        if source_path != remot_path:
+            logger.info(f"origin: {source_path}")
+            source_head = await self.remot_head_aio(source_path) or dict()
+
+        logger.info(f"total: {remot_meta.length:,}")
+
+        sparse_map = SupportFuncS3.meta_extent(source_head)
+        body_size = sparse_map.data_size if sparse_map else remot_meta.length
+
+        with SupportFuncS3.partial_file(local_path) as partial_path:
+            file_unit = await self.io_call(open, partial_path, "wb")
+            try:
+                with self.progress_tracker.transfer(remot_path, body_size) as progress_counter:
+                    if sparse_map:  # packed body goes into data extents, holes stay unallocated
+                        await self.io_call(file_unit.truncate, sparse_map.total_size)
+                    packed_offset = 0
+                    async def body_sink(chunk:bytes) -> None:
+                        nonlocal packed_offset
+                        if sparse_map:
+                            chunk_view = memoryview(chunk)
+                            done = 0
+                            for range_offset, range_length in sparse_map.file_range_list(packed_offset, len(chunk)):
+                                await self.io_call(
+                                    os.pwrite, file_unit.fileno(), chunk_view[done:done + range_length], range_offset,
+                                )
+                                done += range_length
+                        else:
+                            await self.io_call(file_unit.write, chunk)
+                        packed_offset += len(chunk)
+                        progress_counter(len(chunk))
+                    response, body = await self.request_s3("GET", source_path, body_sink=body_sink)
+                if response.status >= 300:
+                    raise ResponseErrorAio(response.status, body)
+                if packed_offset != body_size:
+                    raise RuntimeError(f"wrong transfer: {packed_offset} != {body_size}")
+            finally:
+                await self.io_call(file_unit.close)
+
+        meta_time = SupportFuncS3.convert_date_time(remot_meta.modified)
+        await self.io_call(os.utime, local_path, (meta_time, meta_time))
+
+        local_meta = await self.io_call(self.local_meta, local_path)
+        if local_meta != remot_meta:
+            raise RuntimeError(f"wrong transfer")
+
+    def close(self) -> None:
+        self.http_pool.close()
+        self.io_executor.shutdown(wait=False)
+
+
+class SupportFuncAio:
+    "protocol helpers"
+
+    meta_prefix = "x-amz-meta-"
+    block_size = 256 * 1024  # file read block
+
+    @classmethod
+    def part_size(cls, total_size:int, chunk_size:int) -> int:
+        "configured part size, grown to keep part count within service limit"
+        return max(chunk_size, -(-total_size // AppendSupport.count_maximum))
+
+    @classmethod
+    def has_retry(cls, status:int) -> bool:
+        "server error or throttling, worth another attempt"
+        return status >= 500 or status == 429
+
+    @classmethod
+    def read_body(cls, local_path:str, length:int) -> memoryview:
+        "whole body of a small file, raise when the file ends early"
+        with BodyProviderRead(local_path, length) as body_provider:
+            return body_provider.part_view(0, length)
+
+    @classmethod
+    def read_block(cls, local_path:str, offset:int, length:int) -> bytes:
+        with open(local_path, "rb") as file_unit:
+            return os.pread(file_unit.fileno(), length, offset)
+
+    @classmethod
+    async def bytes_stream(cls, body:bytes) -> AsyncIterator[bytes]:
+        yield body
+
+    @classmethod
+    def meta_headers(cls, meta_data:MetaEntryS3) -> Dict[str, str]:
+        "map from local meta into remot meta headers"
+        meta_args = SupportFuncS3.meta_encode_args(meta_data)[SupportFuncS3.key_Metadata]
+        return {f"{cls.meta_prefix}{key}": value for key, value in meta_args.items()}
+
+    @classmethod
+    def head_object(cls, header_dict:Mapping[str, str]) -> dict:
+        "map response headers into boto3 head_object layout"
+        return dict(
+            ContentLength=int(header_dict.get("content-length", 0)),
+            ETag=header_dict.get("etag"),
+            Metadata={
+                key[len(cls.meta_prefix):]: value
+                for key, value in header_dict.items()
+                if key.startswith(cls.meta_prefix)
+            },
+        )
+
+    @classmethod
+    def xml_text(cls, body:bytes, name:str) -> str:
+        "find first element text by local name"
+        for element in ElementTree.fromstring(body).iter():
+            if element.tag.rpartition("}")[2] == name:
+                return element.text
+        raise RuntimeError(f"no element: {name}")
+
+    @classmethod
+    def xml_complete(cls, etag_list:List[str]) -> bytes:
+        "produce complete multipart upload request"
+        part_text = "".join(
+            f"<Part><PartNumber>{index + 1}</PartNumber><ETag>{etag}</ETag></Part>"
+            for index, etag in enumerate(etag_list)
+        )
+        return f"<CompleteMultipartUpload>{part_text}</CompleteMultipartUpload>".encode("utf-8")
+
+
+class EngineLoopAio(BaseThread):
+    "event loop thread which drives many concurrent transfer coroutines"
+    "jobs for the same path are serialized, latest pending job wins"
+
+    def __init__(self,
+            engine_config:EngineConfig=None,
+        ):
+        BaseThread.__init__(self)
+        self.name = "engine_loop"
+        self.engine_config = engine_config or EngineConfig.default()
+        self.event_loop = asyncio.new_event_loop()
+        self.active_dict:Dict[str, Future] = dict()
+        self.follow_dict:Dict[str, Callable[[], Awaitable]] = dict()
+        self.state_lock = threading.Condition()
+
+    @override
+    def run(self) -> None:
+        asyncio.set_event_loop(self.event_loop)
+        self.event_loop.run_forever()
+
+    @override
+    def on_thread_stop(self) -> None:
+        self.event_loop.call_soon_threadsafe(self.event_loop.stop)
+
+    def active_count(self) -> int:
+        return len(self.active_dict)
+
+    def has_capacity(self) -> bool:
+        return self.active_count() < self.engine_config.engine_concurrency
+
+    def await_capacity(self, timeout:float) -> bool:
+        "block until a job slot is free"
+        with self.state_lock:
+            return self.state_lock.wait_for(self.has_capacity, timeout)
+
+    def submit(self, job_path:str, job_factory:Callable[[], Awaitable]) -> None:
+        "start job, or postpone it after active job for the same path"
+        with self.state_lock:
+            if job_path in self.active_dict:
+                self.follow_dict[job_path] = job_factory
+            else:
+                self.job_start(job_path, job_factory)
+
+    def job_start(self, job_path:str, job_factory:Callable[[], Awaitable]) -> None:
+        future = asyncio.run_coroutine_threadsafe(job_factory(), self.event_loop)
+        self.active_dict[job_path] = future
+        future.add_done_callback(lambda future: self.job_finish(job_path, future))
+
+    def job_finish(self, job_path:str, future:Future) -> None:
+        if not future.cancelled() and future.exception():
+            logger.error(f"failure: {job_path}: {future.exception()}")
+        with self.state_lock:
+            del self.active_dict[job_path]
+            job_factory = self.follow_dict.pop(job_path, None)
+            if job_factory:
+                self.job_start(job_path, job_factory)
+            self.state_lock.notify_all()
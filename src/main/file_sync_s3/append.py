@@ -0,0 +1,80 @@
+"""
+append aware incremental upload support
+"""
+
+import logging
+
+from dataclasses import dataclass
+from typing import List
+from typing import Tuple
+
+from file_sync_s3.config import CONFIG
+
+logger = logging.getLogger(__name__)
+
+frozen = dataclass(frozen=True)
+
+RANGE_LIST = List[Tuple[int, int]]
+
+
+@frozen
+class AppendConfig:
+    "incremental upload params"
+
+    config_entry = "amazon/append"
+
+    append_enable:bool
+    append_minimum:int  # smallest remot object worth a partial copy
+
+    @classmethod
+    def default(cls) -> "AppendConfig":
+        ""
+        section = CONFIG[cls.config_entry]
+        return AppendConfig(
+            append_enable=section['append_enable@bool'],
+            append_minimum=section['append_minimum@int'],
+        )
+
+
+class AppendSupport:
+    "multipart layout for object = copy of remot prefix + local tail"
+    "https://docs.aws.amazon.com/AmazonS3/latest/userguide/qfacts.html"
+
+    part_minimum = 5 * 1024 * 1024  # every part but the last one
+    copy_maximum = 5 * 1024 * 1024 * 1024  # single upload part copy
+    count_maximum = 10000  # parts per upload
+
+    @classmethod
+    def range_split(cls, start:int, finish:int, chunk_size:int) -> RANGE_LIST:
+        "split [start, finish) into chunks, merge short remainder into previous chunk"
+        range_list = []
+        offset = start
+        while offset < finish:
+            limit = min(offset + chunk_size, finish)
+            if range_list and limit - offset < cls.part_minimum and limit == finish:
+                head, _ = range_list.pop()
+                range_list.append((head, limit))
+            else:
+                range_list.append((offset, limit))
+            offset = limit
+        return range_list
+
+    @classmethod
+    def has_append(cls, split_size:int, total_size:int, append_minimum:int) -> bool:
+        "verify that object can be produced by prefix copy"
+        return max(append_minimum, cls.part_minimum) <= split_size < total_size
+
+    @classmethod
+    def part_plan(cls,
+            split_size:int,
+            total_size:int,
+            chunk_size:int,
+        ) -> Tuple[RANGE_LIST, RANGE_LIST]:
+        "produce [start, finish) ranges for remot prefix copy and for local tail upload"
+        chunk_size = max(chunk_size, cls.part_minimum)
+        while total_size > chunk_size * (cls.count_maximum - 2):
+            chunk_size *= 2  # keep below part count limit
+        copy_size = min(chunk_size, cls.copy_maximum - cls.part_minimum)
+        copy_list = cls.range_split(0, split_size, copy_size)
+        tail_list = cls.range_split(split_size, total_size, chunk_size)
+        return (copy_list, tail_list)
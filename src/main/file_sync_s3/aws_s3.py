@@ -3,19 +3,49 @@ amazon aws s3 file sync support
 """
 
 import os
-import asyncio
+import stat
+import hashlib
 import logging
 import threading
+import contextlib
+import dataclasses
 
+from concurrent.futures import ThreadPoolExecutor
 from dataclasses import dataclass
 from datetime import datetime
 from datetime import timezone
-
-import boto3
-from boto3.s3.transfer import TransferConfig
-
+from typing import Callable
+from typing import Dict
+from typing import Iterator
+from typing import List
+from typing import Optional
+from typing import Tuple
+from typing import TYPE_CHECKING
+
+from file_sync_s3.append import AppendConfig
+from file_sync_s3.append import AppendSupport
+from file_sync_s3.body import BodyConfig
+from file_sync_s3.body import BodyProviderMmap
+from file_sync_s3.body import BodyProviderRead
+from file_sync_s3.body import SupportFuncBody
 from file_sync_s3.config import CONFIG
+from file_sync_s3.config import ConfigSupport
+from file_sync_s3.dedup import DedupConfig
+from file_sync_s3.dedup import DedupIndex
 from file_sync_s3.logster import logster_duration
+from file_sync_s3.progress import ProgressConfig
+from file_sync_s3.progress import ProgressTracker
+from file_sync_s3.route import ObjectRouter
+from file_sync_s3.route import RouteConfig
+from file_sync_s3.snapshot import SnapshotConfig
+from file_sync_s3.snapshot import SnapshotGuard
+from file_sync_s3.sparse import SparseConfig
+from file_sync_s3.sparse import SparseExtentMap
+from file_sync_s3.sparse import SparseReader
+from file_sync_s3.sparse import SupportFuncSparse
+
+if TYPE_CHECKING:  # boto3 import is deferred until first transfer
+    from boto3.s3.transfer import TransferConfig
 
 logger = logging.getLogger(__name__)
 
@@ -24,6 +54,7 @@ frozen = dataclass(frozen=True)
 
 async def asyncio_exec(func, *args):
     ""
+    import asyncio
     loop = asyncio.get_running_loop()
     return await loop.run_in_executor(None, func, *args)
 
@@ -64,8 +95,9 @@ class ConfigTransferS3:
     multipart_chunksize:int
 
     @classmethod
-    def default(cls) -> TransferConfig:
+    def default(cls) -> "TransferConfig":
         ""
+        from boto3.s3.transfer import TransferConfig
         section = CONFIG[cls.config_entry]
         return TransferConfig(
             max_io_queue=section['max_io_queue@int'],
@@ -94,6 +126,13 @@ class SupportFuncS3:
     key_Metadata = "Metadata"
     key_entry_length = "entry_length"
     key_entry_modified = "entry_modified"
+    key_entry_digest = "entry_digest"
+    key_entry_pointer = "entry_pointer"
+    key_entry_extent = "entry_extent"
+
+    digest_chunk = 1024 * 1024
+
+    route_key_list = ("StorageClass", "ContentType", "CacheControl", "ServerSideEncryption", "SSEKMSKeyId")
 
     @classmethod
     def convert_date_time(cls, date_time:datetime) -> float:
@@ -107,6 +146,11 @@ class SupportFuncS3:
         base_time = datetime.utcfromtimestamp(unix_secs)
         return base_time.replace(tzinfo=timezone.utc)
 
+    @classmethod
+    def head_args(cls, remot_head:dict) -> dict:
+        "routed upload settings stored on the object, as boto3 extra arguments"
+        return {key: remot_head[key] for key in cls.route_key_list if remot_head.get(key)}
+
     @classmethod
     def meta_encode_args(cls, meta_data:MetaEntryS3) -> dict:
         "map from local meta into remot meta"
@@ -126,6 +170,75 @@ class SupportFuncS3:
             modified=datetime.fromisoformat(meta_data[cls.key_entry_modified]),
         )
 
+    @classmethod
+    def meta_decode_maybe(cls, head_object:Optional[dict]) -> MetaEntryS3:
+        "map from remot meta into local meta, when present"
+        try:
+            return cls.meta_decode_head(head_object)
+        except:
+            return cls.meta_nothing()
+
+    @classmethod
+    def meta_digest(cls, head_object:dict) -> Optional[str]:
+        "extract content digest from remot meta"
+        return head_object.get(cls.key_Metadata, {}).get(cls.key_entry_digest)
+
+    @classmethod
+    def meta_pointer(cls, head_object:dict) -> Optional[str]:
+        "extract dedup pointer origin from remot meta"
+        return head_object.get(cls.key_Metadata, {}).get(cls.key_entry_pointer)
+
+    @classmethod
+    def meta_extent(cls, head_object:dict) -> Optional[SparseExtentMap]:
+        "extract sparse data extent map from remot meta, object body holds packed extents"
+        meta_text = head_object.get(cls.key_Metadata, {}).get(cls.key_entry_extent)
+        return SparseExtentMap.decode(meta_text) if meta_text else None
+
+    @classmethod
+    def digest_file(cls, local_path:str, total_size:int=None) -> str:
+        "produce file content digest"
+        _, digest = cls.digest_file_split(local_path, 0, total_size)
+        return digest
+
+    @classmethod
+    def digest_file_split(cls,
+            local_path:str,
+            split_size:int,
+            total_size:int=None,
+        ) -> Tuple[str, str]:
+        "produce file prefix digest and file total digest in one pass"
+        hasher = hashlib.sha256()
+        split_digest = hasher.hexdigest()
+        offset = 0
+        with open(local_path, "rb") as file_unit:
+            while total_size is None or offset < total_size:
+                limit = cls.digest_chunk
+                if total_size is not None:
+                    limit = min(limit, total_size - offset)
+                if offset < split_size:
+                    limit = min(limit, split_size - offset)
+                chunk = file_unit.read(limit)
+                if not chunk:
+                    break
+                hasher.update(chunk)
+                offset += len(chunk)
+                if offset == split_size:
+                    split_digest = hasher.hexdigest()
+        return (split_digest, hasher.hexdigest())
+
+    @classmethod
+    @contextlib.contextmanager
+    def partial_file(cls, local_path:str) -> Iterator[str]:
+        "sibling file for download in progress: replaces target on success, removed on failure"
+        partial_path = f"{local_path}.{os.urandom(4).hex()}.part"
+        try:
+            yield partial_path
+        except:
+            if os.path.exists(partial_path):
+                os.remove(partial_path)
+            raise
+        os.replace(partial_path, local_path)
+
     @classmethod
     def meta_nothing(cls) -> MetaEntryS3:
         "produce a 'NONE' representation for file meta data"
@@ -135,73 +248,180 @@ class SupportFuncS3:
         )
 
 
-class ProgressReportS3:
-    "transfer progress reporter"
-
-    def __init__(self, total_size:int, perc_step:float=4.0):
-        self.update_lock = threading.Lock()
-        self.wired_size = 0
-        self.total_size = total_size
-        self.perc_step = perc_step
-        self.percent = 0
-
-    def __call__(self, block_size:int) -> None:
-        with self.update_lock:
-            self.wired_size += block_size
-        percent = 100 * self.wired_size / self.total_size
-        if percent - self.percent > self.perc_step:
-            self.percent = percent
-            self.report_progress()
-
-    def report_progress(self):
-        logger.info(f"{self.percent:6.2f}% {self.wired_size:,}")
-
-
 class BucketOperatorS3:
     "amazon bucket resource operations"
 
+    delete_batch_size = 1000  # delete_objects request limit
+
     def __init__(self,
             config_access:AuthBucketS3=None,
-            config_transfer:TransferConfig=None,
+            config_transfer:"TransferConfig"=None,
+            dedup_index:DedupIndex=None,
+            append_config:AppendConfig=None,
+            body_config:BodyConfig=None,
+            snapshot_config:SnapshotConfig=None,
+            object_router:ObjectRouter=None,
+            progress_tracker:ProgressTracker=None,
+            sparse_config:SparseConfig=None,
         ):
         self.config_access = config_access or AuthBucketS3.default()
-        self.config_transfer = config_transfer or ConfigTransferS3.default()
-        self.session = boto3.session.Session(
-            region_name=self.config_access.region_name,
-            aws_access_key_id=self.config_access.access_key,
-            aws_secret_access_key=self.config_access.secret_key,
-        )
+        self.config_transfer_value = config_transfer
+        self.dedup_index = dedup_index or DedupIndex()
+        self.append_config = append_config or AppendConfig.default()
+        self.body_config = body_config or BodyConfig.default()
+        self.snapshot_config = snapshot_config or SnapshotConfig.default()
+        self.object_router = object_router or ObjectRouter()
+        self.progress_tracker = progress_tracker or ProgressTracker()
+        self.sparse_config = sparse_config or SparseConfig.default()
+        self.client_lock = threading.Lock()
+        self.client_value = None
+
+    @property
+    def config_transfer(self) -> "TransferConfig":
+        "provide transfer config on first use"
+        if self.config_transfer_value is None:
+            self.config_transfer_value = ConfigTransferS3.default()
+        return self.config_transfer_value
 
     def client_s3(self) -> "Client":
-        "produce aws s3 client"
-        return self.session.client('s3')
+        "provide shared aws s3 client, created on first use"
+        if self.client_value is None:
+            with self.client_lock:
+                if self.client_value is None:
+                    import boto3
+                    import botocore.config
+                    logger.info(f"session: {self.config_access.region_name}")
+                    session = boto3.session.Session(
+                        region_name=self.config_access.region_name,
+                        aws_access_key_id=self.config_access.access_key,
+                        aws_secret_access_key=self.config_access.secret_key,
+                    )
+                    self.client_value = session.client('s3', config=botocore.config.Config(
+                        max_pool_connections=self.config_transfer.max_concurrency,
+                    ))
+        return self.client_value
+
+    def config_verify(self) -> None:
+        "parse every section applied by reconfigure, raise on first failure, change nothing"
+        AuthBucketS3.default()
+        if self.config_transfer_value is not None:
+            ConfigTransferS3.default()
+        DedupConfig.default()
+        AppendConfig.default()
+        BodyConfig.default()
+        SnapshotConfig.default()
+        SparseConfig.default()
+        ProgressConfig.default()
+        ObjectRouter(RouteConfig.default())  # rule patterns compile
+
+    def reconfigure(self) -> List[str]:
+        "re-read configuration, apply changes in place, report changed fields"
+
+        change_list = []
+
+        config_access = AuthBucketS3.default()
+        access_change_list = ConfigSupport.change_list(self.config_access, config_access)
+        if access_change_list:
+            self.config_access = config_access
+            change_list += access_change_list
+
+        if self.config_transfer_value is not None:
+            config_transfer = ConfigTransferS3.default()
+            name_list = [field.name for field in dataclasses.fields(ConfigTransferS3)]
+            transfer_change_list = ConfigSupport.change_list(self.config_transfer, config_transfer, name_list)
+            if transfer_change_list:
+                self.config_transfer_value = config_transfer
+                change_list += transfer_change_list
+
+        dedup_config = DedupConfig.default()
+        dedup_change_list = ConfigSupport.change_list(self.dedup_index.dedup_config, dedup_config)
+        if dedup_change_list:
+            self.dedup_index = DedupIndex(dedup_config)
+            change_list += dedup_change_list
+
+        append_config = AppendConfig.default()
+        append_change_list = ConfigSupport.change_list(self.append_config, append_config)
+        if append_change_list:
+            self.append_config = append_config
+            change_list += append_change_list
+
+        body_config = BodyConfig.default()
+        body_change_list = ConfigSupport.change_list(self.body_config, body_config)
+        if body_change_list:
+            self.body_config = body_config
+            change_list += body_change_list
+
+        snapshot_config = SnapshotConfig.default()
+        snapshot_change_list = ConfigSupport.change_list(self.snapshot_config, snapshot_config)
+        if snapshot_change_list:
+            self.snapshot_config = snapshot_config
+            change_list += snapshot_change_list
+
+        sparse_config = SparseConfig.default()
+        sparse_change_list = ConfigSupport.change_list(self.sparse_config, sparse_config)
+        if sparse_change_list:
+            self.sparse_config = sparse_config
+            change_list += sparse_change_list
+
+        change_list += self.object_router.reconfigure()
+        change_list += self.progress_tracker.reconfigure()
+
+        if access_change_list or "max_concurrency" in change_list:
+            with self.client_lock:
+                self.client_value = None  # rebuild client and its connection pool on next use
+
+        return change_list
 
     def local_meta(self, entry:str) -> MetaEntryS3:
-        "discover local file meta data"
-        if os.path.isfile(entry):
-            length = os.path.getsize(entry)
-            modified = SupportFuncS3.convert_unix_time(os.path.getmtime(entry))
-        elif os.path.isdir(entry):
+        "discover local file meta data, with a single stat"
+        try:
+            entry_stat = os.stat(entry)
+        except OSError:
+            return SupportFuncS3.meta_nothing()
+        if stat.S_ISREG(entry_stat.st_mode):
+            length = entry_stat.st_size
+            modified = SupportFuncS3.convert_unix_time(entry_stat.st_mtime)
+        elif stat.S_ISDIR(entry_stat.st_mode):
             length = 0
-            modified = SupportFuncS3.convert_unix_time(os.path.getmtime(entry))
+            modified = SupportFuncS3.convert_unix_time(entry_stat.st_mtime)
         else:
-            length = 0
-            modified = SupportFuncS3.convert_unix_time(0)
+            return SupportFuncS3.meta_nothing()
         return MetaEntryS3(
             length=length,
             modified=modified,
         )
 
-    def remot_meta(self, entry:str) -> MetaEntryS3:
-        "discover remot object meta data"
+    def remot_head(self, entry:str) -> Optional[dict]:
+        "discover remot object head, if present"
         try:
-            head_object = self.client_s3().head_object(
+            return self.client_s3().head_object(
                 Bucket=self.config_access.bucket_name,
                 Key=entry,
             )
-            return SupportFuncS3.meta_decode_head(head_object)
         except:
-            return SupportFuncS3.meta_nothing()
+            return None
+
+    def remot_meta(self, entry:str) -> MetaEntryS3:
+        "discover remot object meta data"
+        return SupportFuncS3.meta_decode_maybe(self.remot_head(entry))
+
+    def pool_state(self) -> Dict[str, int]:
+        "transfer pool usage, for diagnostics"
+        return dict(
+            pool_size=self.config_transfer.max_concurrency,
+            pool_busy=len(self.progress_tracker.active_dict),
+        )
+
+    def remot_list(self, prefix:str) -> Dict[str, Tuple[int, datetime]]:
+        "discover remot objects under the key prefix: key -> (size, upload time)"
+        return {key: (size, last_modified) for key, size, last_modified in self.remot_scan(prefix)}
+
+    def remot_scan(self, prefix:str) -> Iterator[Tuple[str, int, datetime]]:
+        "stream remot objects under the key prefix in key order: (key, size, upload time)"
+        paginator = self.client_s3().get_paginator('list_objects_v2')
+        for page in paginator.paginate(Bucket=self.config_access.bucket_name, Prefix=prefix):
+            for entry in page.get('Contents', []):
+                yield (entry['Key'], entry['Size'], entry['LastModified'])
 
     async def resource_delete(self,
             remot_path:str,
@@ -216,11 +436,148 @@ class BucketOperatorS3:
 
         logger.info(f"remot: {remot_path}")
 
+        self.dedup_forget(remot_path)
+
         self.client_s3().delete_object(
             Bucket=self.config_access.bucket_name,
             Key=remot_path,
         )
 
+    def remot_delete_batch(self, remot_path_list:List[str]) -> None:
+        "remove objects from remot bucket, up to a thousand keys per request"
+        for remot_path in remot_path_list:
+            self.dedup_forget(remot_path)
+        for index in range(0, len(remot_path_list), self.delete_batch_size):
+            batch_list = remot_path_list[index:index + self.delete_batch_size]
+            logger.info(f"remot: {len(batch_list)} objects")
+            response = self.client_s3().delete_objects(
+                Bucket=self.config_access.bucket_name,
+                Delete=dict(
+                    Objects=[dict(Key=remot_path) for remot_path in batch_list],
+                    Quiet=True,
+                ),
+            )
+            for error in response.get('Errors', []):
+                logger.error(f"failure: {error.get('Key')} {error.get('Code')} {error.get('Message')}")
+
+    def remot_transition_batch(self, path_list:List[Tuple[str, str]], storage_class:str) -> None:
+        "move objects into another storage class with concurrent server side copies"
+        "path list holds (local path, remot key), routed settings such as encryption are applied again"
+
+        def transition(local_path:str, remot_path:str) -> None:
+            extra_args = dict(ACL=self.config_access.object_mode)
+            extra_args.update(self.object_router.object_args(local_path))
+            extra_args.update(StorageClass=storage_class, MetadataDirective="COPY")
+            self.client_s3().copy(
+                CopySource=dict(
+                    Bucket=self.config_access.bucket_name,
+                    Key=remot_path,
+                ),
+                Bucket=self.config_access.bucket_name,
+                Key=remot_path,
+                ExtraArgs=extra_args,
+                Config=self.config_transfer,
+            )
+
+        logger.info(f"transition: {len(path_list)} objects -> {storage_class}")
+        with ThreadPoolExecutor(self.config_transfer.max_concurrency) as executor:
+            for (_, remot_path), future in [(entry, executor.submit(transition, *entry)) for entry in path_list]:
+                try:
+                    future.result()
+                except Exception as error:
+                    logger.error(f"failure: {remot_path} {error}")
+
+    def remot_move_batch(self, move_list:List[Tuple[str, str]], keep_source:bool=False) -> List[Tuple[str, str]]:
+        "move objects to new keys with concurrent server side copies, report completed moves"
+        "routed settings (storage class, encryption, content headers) are carried from the source object"
+
+        move_dict = dict(move_list)
+
+        def move(source_path:str, target_path:str) -> None:
+            source_head = self.remot_head(source_path) or dict()
+            route_args = SupportFuncS3.head_args(source_head)
+            origin_path = SupportFuncS3.meta_pointer(source_head) if self.dedup_index.has_pointer() else None
+            if origin_path:  # pointer follows its origin into the new layout
+                meta_data = dict(source_head[SupportFuncS3.key_Metadata])
+                meta_data[SupportFuncS3.key_entry_pointer] = move_dict.get(origin_path, origin_path)
+                self.client_s3().put_object(
+                    Bucket=self.config_access.bucket_name,
+                    Key=target_path,
+                    Body=b"",
+                    ACL=self.config_access.object_mode,
+                    Metadata=meta_data,
+                    **route_args,
+                )
+            else:
+                extra_args = dict(ACL=self.config_access.object_mode)
+                extra_args.update(route_args)
+                extra_args.update(MetadataDirective="COPY")
+                self.client_s3().copy(
+                    CopySource=dict(
+                        Bucket=self.config_access.bucket_name,
+                        Key=source_path,
+                    ),
+                    Bucket=self.config_access.bucket_name,
+                    Key=target_path,
+                    ExtraArgs=extra_args,
+                    Config=self.config_transfer,
+                )
+
+        done_list = []
+        with ThreadPoolExecutor(self.config_transfer.max_concurrency) as executor:
+            future_list = [(entry, executor.submit(move, *entry)) for entry in move_list]
+            for (source_path, target_path), future in future_list:
+                try:
+                    future.result()
+                    done_list.append((source_path, target_path))
+                except Exception as error:
+                    logger.error(f"failure: {source_path} {error}")
+
+        if self.dedup_index.has_enable():
+            for source_path, target_path in done_list:
+                self.dedup_index.remot_move(source_path, target_path)
+
+        if not keep_source:
+            self.remot_delete_batch([source_path for source_path, _ in done_list])
+
+        return done_list
+
+    def lifecycle_install(self, rule:dict) -> None:
+        "install bucket lifecycle rule, replace rule with the same id, keep other rules"
+        from botocore.exceptions import ClientError
+        client = self.client_s3()
+        bucket_name = self.config_access.bucket_name
+        try:
+            rule_list = client.get_bucket_lifecycle_configuration(Bucket=bucket_name)['Rules']
+        except ClientError as error:
+            if error.response['Error']['Code'] != "NoSuchLifecycleConfiguration":
+                raise
+            rule_list = []
+        rule_list = [entry for entry in rule_list if entry.get('ID') != rule['ID']] + [rule]
+        logger.info(f"lifecycle: {rule}")
+        client.put_bucket_lifecycle_configuration(
+            Bucket=bucket_name,
+            LifecycleConfiguration=dict(Rules=rule_list),
+        )
+
+    def lease_put(self, remot_path:str, body:bytes, etag:str=None) -> Optional[str]:
+        "conditional write: create when absent, or replace given version only"
+        "report new version, none when precondition fails"
+        from botocore.exceptions import ClientError
+        condition = dict(IfMatch=etag) if etag else dict(IfNoneMatch="*")
+        try:
+            response = self.client_s3().put_object(
+                Bucket=self.config_access.bucket_name,
+                Key=remot_path,
+                Body=body,
+                **condition,
+            )
+        except ClientError as error:
+            if error.response['Error']['Code'] in ("PreconditionFailed", "ConditionalRequestConflict"):
+                return None
+            raise
+        return response['ETag']
+
     async def resource_get(self,
             local_path:str,
             remot_path:str,
@@ -241,25 +598,37 @@ class BucketOperatorS3:
         logger.info(f"remot: {remot_path}")
 
         local_meta = self.local_meta(local_path)
-        remot_meta = self.remot_meta(remot_path)
+        remot_head = self.remot_head(remot_path) or dict()
+        remot_meta = SupportFuncS3.meta_decode_maybe(remot_head)
 
         if use_check and (local_meta == remot_meta):
             logger.info(f"no change")
             return
 
+        source_path = SupportFuncS3.meta_pointer(remot_head) or remot_path
+        source_head = remot_head
+        if source_path != remot_path:
+            logger.info(f"origin: {source_path}")
+            source_head = self.remot_head(source_path) or dict()
+
         extra_args = dict()
 
         total_size = remot_meta.length
         logger.info(f"total: {total_size:,}")
 
-        self.client_s3().download_file(
-            Bucket=self.config_access.bucket_name,
-            Filename=local_path,
-            Key=remot_path,
-            ExtraArgs=extra_args,
-            Config=self.config_transfer,
-            Callback=ProgressReportS3(total_size),
-        )
+        sparse_map = SupportFuncS3.meta_extent(source_head)
+        if sparse_map:
+            self.sparse_get(local_path, remot_path, source_path, sparse_map)
+        else:
+            with self.progress_tracker.transfer(remot_path, total_size) as progress_counter:
+                self.client_s3().download_file(
+                    Bucket=self.config_access.bucket_name,
+                    Filename=local_path,
+                    Key=source_path,
+                    ExtraArgs=extra_args,
+                    Config=self.config_transfer,
+                    Callback=progress_counter,
+                )
 
         meta_time = SupportFuncS3.convert_date_time(remot_meta.modified)
 
@@ -288,27 +657,401 @@ class BucketOperatorS3:
         logger.info(f"local: {local_path}")
         logger.info(f"remot: {remot_path}")
 
-        local_meta = self.local_meta(local_path)
-        remot_meta = self.remot_meta(remot_path)
+        with SnapshotGuard(self.snapshot_config, local_path) as snapshot_guard:
 
-        if use_check and (local_meta == remot_meta):
-            logger.info(f"no change")
-            return
+            local_meta = self.local_meta(local_path)
+            remot_head = self.remot_head(remot_path)
+            remot_meta = SupportFuncS3.meta_decode_maybe(remot_head)
+
+            if use_check and (local_meta == remot_meta):
+                logger.info(f"no change")
+                return
 
-        extra_args = dict(
-            # https://docs.aws.amazon.com/AmazonS3/latest/dev/acl-overview.html#canned-acl
-            ACL=self.config_access.object_mode,
+            source_path = snapshot_guard.source_path()
+
+            extra_args = dict(
+                # https://docs.aws.amazon.com/AmazonS3/latest/dev/acl-overview.html#canned-acl
+                ACL=self.config_access.object_mode,
+            )
+            extra_args.update(self.object_router.object_args(local_path))
+            extra_args.update(SupportFuncS3.meta_encode_args(local_meta))
+
+            digest = None
+            if self.dedup_index.has_enable() or self.append_config.append_enable:
+                split_digest, digest = SupportFuncS3.digest_file_split(
+                    source_path, remot_meta.length, local_meta.length,
+                )
+                snapshot_guard.verify()  # digest must describe published content
+                if self.dedup_index.has_enable() and self.dedup_index.digest_lookup(digest) != remot_path:
+                    self.dedup_release(remot_path)  # same content keeps referrers valid
+                extra_args[SupportFuncS3.key_Metadata][SupportFuncS3.key_entry_digest] = digest
+                if self.append_config.append_enable and remot_head is not None and AppendSupport.has_append(
+                        remot_meta.length, local_meta.length, self.append_config.append_minimum,
+                    ) and split_digest == SupportFuncS3.meta_digest(remot_head) \
+                        and not SupportFuncS3.meta_extent(remot_head) \
+                        and not SupportFuncS3.meta_pointer(remot_head):  # packed or empty body is not a prefix
+                    self.append_put(source_path, remot_path, remot_head, local_meta, extra_args, snapshot_guard.verify)
+                    return
+                if self.dedup_index.has_enable() and self.dedup_put(remot_path, digest, extra_args):
+                    return
+
+            total_size = local_meta.length
+            logger.info(f"total: {total_size:,}")
+
+            sparse_map = self.sparse_map(source_path, total_size)
+            if sparse_map:
+                extra_args[SupportFuncS3.key_Metadata][SupportFuncS3.key_entry_extent] = sparse_map.encode()
+                self.sparse_put(source_path, remot_path, sparse_map, extra_args)
+                snapshot_guard.verify()  # object holds earlier state, report newer one
+            elif self.body_config.has_mmap() or snapshot_guard.has_verify():
+                self.body_put(source_path, remot_path, total_size, extra_args, snapshot_guard.verify)
+            else:
+                with self.progress_tracker.transfer(remot_path, total_size) as progress_counter:
+                    self.client_s3().upload_file(
+                        Bucket=self.config_access.bucket_name,
+                        Filename=source_path,
+                        Key=remot_path,
+                        ExtraArgs=extra_args,
+                        Config=self.config_transfer,
+                        Callback=progress_counter,
+                    )
+
+            if digest and self.dedup_index.has_enable():
+                self.dedup_index.digest_record(digest, remot_path)
+
+    def sparse_map(self, local_path:str, total_size:int) -> Optional[SparseExtentMap]:
+        "data extent map for sparse upload, none for dense upload"
+        sparse_config = self.sparse_config
+        if not sparse_config.sparse_enable or total_size < sparse_config.sparse_minimum:
+            return None
+        extent_list = SupportFuncSparse.extent_scan(local_path, total_size)
+        if extent_list is None:
+            logger.info(f"dense: no hole support")
+            return None
+        sparse_map = SparseExtentMap(extent_list, total_size)
+        if sparse_map.hole_size() < sparse_config.sparse_minimum:
+            return None
+        if len(sparse_map.extent_list) > sparse_config.sparse_extent_limit:
+            logger.info(f"dense: extents={len(sparse_map.extent_list)}")
+            return None
+        logger.info(f"sparse: data={sparse_map.data_size:,} extents={len(sparse_map.extent_list)}")
+        return sparse_map
+
+    def sparse_put(self,
+            local_path:str,
+            remot_path:str,
+            sparse_map:SparseExtentMap,
+            extra_args:dict,
+        ) -> None:
+        "upload data extents back to back as object body"
+        with SparseReader(local_path, sparse_map) as sparse_reader, \
+                self.progress_tracker.transfer(remot_path, sparse_map.data_size) as progress_counter:
+            self.client_s3().upload_fileobj(
+                Fileobj=sparse_reader,
+                Bucket=self.config_access.bucket_name,
+                Key=remot_path,
+                ExtraArgs=extra_args,
+                Config=self.config_transfer,
+                Callback=progress_counter,
+            )
+
+    def sparse_get(self,
+            local_path:str,
+            remot_path:str,
+            source_path:str,
+            sparse_map:SparseExtentMap,
+        ) -> None:
+        "write packed object body into data extents of a file of full size, holes stay unallocated"
+        "existing local file is replaced only after the whole body arrived"
+        response = self.client_s3().get_object(
+            Bucket=self.config_access.bucket_name,
+            Key=source_path,
         )
-        extra_args.update(SupportFuncS3.meta_encode_args(local_meta))
+        stream = response['Body']
+        chunk_size = SupportFuncS3.digest_chunk
+        with SupportFuncS3.partial_file(local_path) as partial_path, \
+                open(partial_path, "wb") as file_unit, \
+                self.progress_tracker.transfer(remot_path, sparse_map.data_size) as progress_counter:
+            file_unit.truncate(sparse_map.total_size)
+            for start, length in sparse_map.extent_list:
+                position = start
+                finish = start + length
+                while position < finish:
+                    chunk = stream.read(min(chunk_size, finish - position))
+                    if not chunk:
+                        raise RuntimeError(f"wrong transfer")
+                    os.pwrite(file_unit.fileno(), chunk, position)
+                    position += len(chunk)
+                    progress_counter(len(chunk))
+
+    def body_put(self,
+            local_path:str,
+            remot_path:str,
+            total_size:int,
+            extra_args:dict,
+            publish_check:Callable[[], None]=None,
+        ) -> None:
+        "upload parts with content digest, as memoryview slices over a memory map of the file in mmap mode"
+        "or as pread buffers otherwise, which survive the file being truncated under the upload"
+        "publish check runs before the object becomes visible and may raise to abandon it"
+
+        client = self.client_s3()
+        bucket_name = self.config_access.bucket_name
+        publish_check = publish_check or (lambda: None)
+        provider_class = BodyProviderMmap if self.body_config.has_mmap() else BodyProviderRead
+
+        with provider_class(local_path, total_size) as body_provider, \
+                self.progress_tracker.transfer(remot_path, total_size) as progress_counter:
+
+            if total_size <= self.config_transfer.multipart_chunksize:
+                part_reader = body_provider.part_reader(0, total_size)
+                try:
+                    content_md5 = SupportFuncBody.content_md5(part_reader.part_view)
+                    publish_check()  # rewrite after this point fails the digest on the service side
+                    client.put_object(
+                        Bucket=bucket_name,
+                        Key=remot_path,
+                        Body=part_reader,
+                        ContentMD5=content_md5,
+                        **extra_args,
+                    )
+                finally:
+                    part_reader.close()
+                progress_counter(total_size)
+                publish_check()  # object holds earlier state, report newer one
+                return
+
+            _, part_range_list = AppendSupport.part_plan(
+                0, total_size, self.config_transfer.multipart_chunksize,
+            )
 
+            upload_id = client.create_multipart_upload(
+                Bucket=bucket_name,
+                Key=remot_path,
+                **extra_args,
+            )['UploadId']
+
+            def part_send(part_number:int, start:int, finish:int) -> dict:
+                part_reader = body_provider.part_reader(start, finish - start)
+                try:
+                    response = client.upload_part(
+                        Bucket=bucket_name,
+                        Key=remot_path,
+                        UploadId=upload_id,
+                        PartNumber=part_number,
+                        Body=part_reader,
+                        ContentMD5=SupportFuncBody.content_md5(part_reader.part_view),
+                    )
+                finally:
+                    part_reader.close()
+                    body_provider.part_release(start, finish - start)
+                progress_counter(finish - start)
+                return dict(PartNumber=part_number, ETag=response['ETag'])
+
+            try:
+                with ThreadPoolExecutor(self.config_transfer.max_concurrency) as executor:
+                    future_list = [
+                        executor.submit(part_send, index + 1, start, finish)
+                        for index, (start, finish) in enumerate(part_range_list)
+                    ]
+                    part_list = [future.result() for future in future_list]
+                publish_check()
+                client.complete_multipart_upload(
+                    Bucket=bucket_name,
+                    Key=remot_path,
+                    UploadId=upload_id,
+                    MultipartUpload=dict(Parts=part_list),
+                )
+            except:
+                client.abort_multipart_upload(
+                    Bucket=bucket_name,
+                    Key=remot_path,
+                    UploadId=upload_id,
+                )
+                raise
+
+    def append_put(self,
+            local_path:str,
+            remot_path:str,
+            remot_head:dict,
+            local_meta:MetaEntryS3,
+            extra_args:dict,
+            publish_check:Callable[[], None]=None,
+        ) -> None:
+        "produce grown object from server side copy of remot prefix plus upload of local tail"
+
+        split_size = SupportFuncS3.meta_decode_head(remot_head).length
         total_size = local_meta.length
-        logger.info(f"total: {total_size:,}")
+        logger.info(f"append: {split_size:,} -> {total_size:,}")
 
-        self.client_s3().upload_file(
-            Bucket=self.config_access.bucket_name,
-            Filename=local_path,
+        copy_list, tail_list = AppendSupport.part_plan(
+            split_size, total_size, self.config_transfer.multipart_chunksize,
+        )
+
+        client = self.client_s3()
+        bucket_name = self.config_access.bucket_name
+
+        upload_id = client.create_multipart_upload(
+            Bucket=bucket_name,
             Key=remot_path,
+            **extra_args,
+        )['UploadId']
+
+        def part_copy(part_number:int, start:int, finish:int) -> dict:
+            response = client.upload_part_copy(
+                Bucket=bucket_name,
+                Key=remot_path,
+                UploadId=upload_id,
+                PartNumber=part_number,
+                CopySource=dict(Bucket=bucket_name, Key=remot_path),
+                CopySourceIfMatch=remot_head['ETag'],
+                CopySourceRange=f"bytes={start}-{finish - 1}",
+            )
+            return dict(PartNumber=part_number, ETag=response['CopyPartResult']['ETag'])
+
+        def part_send(part_number:int, start:int, finish:int) -> dict:
+            with open(local_path, "rb") as file_unit:
+                file_unit.seek(start)
+                body = file_unit.read(finish - start)
+            response = client.upload_part(
+                Bucket=bucket_name,
+                Key=remot_path,
+                UploadId=upload_id,
+                PartNumber=part_number,
+                Body=body,
+            )
+            progress_counter(finish - start)
+            return dict(PartNumber=part_number, ETag=response['ETag'])
+
+        tail_size = sum(finish - start for (start, finish) in tail_list)
+        try:
+            with ThreadPoolExecutor(self.config_transfer.max_concurrency) as executor, \
+                    self.progress_tracker.transfer(remot_path, tail_size) as progress_counter:
+                future_list = []
+                part_number = 1
+                for (start, finish) in copy_list:
+                    future_list.append(executor.submit(part_copy, part_number, start, finish))
+                    part_number += 1
+                for (start, finish) in tail_list:
+                    future_list.append(executor.submit(part_send, part_number, start, finish))
+                    part_number += 1
+                part_list = [future.result() for future in future_list]
+            if publish_check:
+                publish_check()
+            client.complete_multipart_upload(
+                Bucket=bucket_name,
+                Key=remot_path,
+                UploadId=upload_id,
+                MultipartUpload=dict(Parts=part_list),
+            )
+        except:
+            client.abort_multipart_upload(
+                Bucket=bucket_name,
+                Key=remot_path,
+                UploadId=upload_id,
+            )
+            raise
+
+    def dedup_put(self,
+            remot_path:str,
+            digest:str,
+            extra_args:dict,
+        ) -> bool:
+        "try to store duplicate content without byte transfer"
+
+        origin_path = self.dedup_index.digest_lookup(digest)
+        if origin_path is None or origin_path == remot_path:
+            return False
+
+        origin_head = self.remot_head(origin_path)
+        if origin_head is None or SupportFuncS3.meta_digest(origin_head) != digest:
+            logger.info(f"stale: {origin_path}")
+            self.dedup_index.remot_forget(origin_path)
+            return False
+
+        logger.info(f"dedup: {origin_path}")
+
+        if self.dedup_index.has_pointer():
+            extra_args[SupportFuncS3.key_Metadata][SupportFuncS3.key_entry_pointer] = origin_path
+            self.client_s3().put_object(
+                Bucket=self.config_access.bucket_name,
+                Key=remot_path,
+                Body=b"",
+                **extra_args,
+            )
+            self.dedup_index.digest_record(digest, remot_path, origin_path)
+        else:
+            origin_extent = origin_head.get(SupportFuncS3.key_Metadata, {}).get(SupportFuncS3.key_entry_extent)
+            if origin_extent:  # copy holds packed body of origin
+                extra_args[SupportFuncS3.key_Metadata][SupportFuncS3.key_entry_extent] = origin_extent
+            self.client_s3().copy(
+                CopySource=dict(
+                    Bucket=self.config_access.bucket_name,
+                    Key=origin_path,
+                ),
+                Bucket=self.config_access.bucket_name,
+                Key=remot_path,
+                ExtraArgs=dict(extra_args, MetadataDirective="REPLACE"),
+                Config=self.config_transfer,
+            )
+            self.dedup_index.digest_record(digest, remot_path)
+
+        return True
+
+    def dedup_forget(self, remot_path:str) -> None:
+        "before object is removed, promote its pointers and drop it from the index"
+        if self.dedup_index.has_enable():
+            self.dedup_release(remot_path)
+            self.dedup_index.remot_forget(remot_path)
+
+    def dedup_release(self, remot_path:str) -> None:
+        "before origin is replaced or removed, promote its first pointer into a real object"
+
+        referrer_list = self.dedup_index.referrer_list(remot_path)
+        if not referrer_list:
+            return
+
+        target_path = referrer_list[0]
+        logger.info(f"promote: {target_path}")
+
+        target_head = self.remot_head(target_path)
+        if target_head is None:
+            self.dedup_index.remot_forget(target_path)
+            return self.dedup_release(remot_path)
+
+        meta_data = dict(target_head[SupportFuncS3.key_Metadata])
+        meta_data.pop(SupportFuncS3.key_entry_pointer, None)
+        origin_head = self.remot_head(remot_path) or dict()
+        origin_extent = origin_head.get(SupportFuncS3.key_Metadata, {}).get(SupportFuncS3.key_entry_extent)
+        if origin_extent:  # promoted copy holds packed body of origin
+            meta_data[SupportFuncS3.key_entry_extent] = origin_extent
+
+        extra_args = dict(ACL=self.config_access.object_mode)
+        extra_args.update(SupportFuncS3.head_args(target_head))  # pointer was written with routed settings
+        extra_args.update(Metadata=meta_data, MetadataDirective="REPLACE")
+        self.client_s3().copy(
+            CopySource=dict(
+                Bucket=self.config_access.bucket_name,
+                Key=remot_path,
+            ),
+            Bucket=self.config_access.bucket_name,
+            Key=target_path,
             ExtraArgs=extra_args,
             Config=self.config_transfer,
-            Callback=ProgressReportS3(total_size),
         )
+
+        for pointer_path in referrer_list[1:]:
+            pointer_head = self.remot_head(pointer_path)
+            if pointer_head is None:
+                continue
+            meta_data = dict(pointer_head[SupportFuncS3.key_Metadata])
+            meta_data[SupportFuncS3.key_entry_pointer] = target_path
+            self.client_s3().put_object(
+                Bucket=self.config_access.bucket_name,
+                Key=pointer_path,
+                Body=b"",
+                ACL=self.config_access.object_mode,
+                Metadata=meta_data,
+            )
+
+        self.dedup_index.remot_rebase(remot_path, target_path)
@@ -0,0 +1,173 @@
+"""
+zero-copy upload body support
+"""
+
+import io
+import os
+import mmap
+import base64
+import hashlib
+import logging
+
+from dataclasses import dataclass
+
+from file_sync_s3.config import CONFIG
+from file_sync_s3.snapshot import SnapshotChangeError
+
+logger = logging.getLogger(__name__)
+
+frozen = dataclass(frozen=True)
+
+
+@frozen
+class BodyConfig:
+    "upload body params"
+
+    config_entry = "amazon/transfer"
+
+    upload_mode:str  # managed, mmap
+
+    mode_managed = "managed"
+    mode_mmap = "mmap"
+
+    @classmethod
+    def default(cls) -> "BodyConfig":
+        ""
+        section = CONFIG[cls.config_entry]
+        return BodyConfig(
+            upload_mode=section['upload_mode'],
+        )
+
+    def has_mmap(self) -> bool:
+        return self.upload_mode == self.mode_mmap
+
+
+class PartReaderMmap:
+    "file-like reader over one part, read() returns memoryview slices, no byte copy"
+
+    def __init__(self, part_view:memoryview):
+        self.part_view = part_view
+        self.position = 0
+
+    def __len__(self) -> int:
+        return len(self.part_view)
+
+    def readable(self) -> bool:
+        return True
+
+    def seekable(self) -> bool:
+        return True
+
+    def read(self, size:int=-1) -> memoryview:
+        if size is None or size < 0:
+            size = len(self.part_view) - self.position
+        start = self.position
+        self.position = min(start + size, len(self.part_view))
+        return self.part_view[start:self.position]
+
+    def seek(self, offset:int, whence:int=io.SEEK_SET) -> int:
+        if whence == io.SEEK_SET:
+            position = offset
+        elif whence == io.SEEK_CUR:
+            position = self.position + offset
+        else:
+            position = len(self.part_view) + offset
+        self.position = max(0, min(position, len(self.part_view)))
+        return self.position
+
+    def tell(self) -> int:
+        return self.position
+
+    def close(self) -> None:
+        self.part_view.release()
+
+
+class BodyProviderMmap:
+    "read-only memory map of upload source, serves parts as memoryview slices"
+    "resident pages of a finished part are released, so rss stays flat"
+
+    def __init__(self, local_path:str, total_size:int):
+        self.total_size = total_size
+        self.file_unit = open(local_path, "rb")
+        if total_size:
+            self.mapping = mmap.mmap(self.file_unit.fileno(), total_size, access=mmap.ACCESS_READ)
+            if hasattr(mmap, "MADV_SEQUENTIAL"):
+                self.mapping.madvise(mmap.MADV_SEQUENTIAL)
+            self.view = memoryview(self.mapping)
+        else:  # empty file can not be mapped
+            self.mapping = None
+            self.view = memoryview(b"")
+
+    def __enter__(self) -> "BodyProviderMmap":
+        return self
+
+    def __exit__(self, *args) -> None:
+        self.close()
+
+    def part_view(self, offset:int, length:int) -> memoryview:
+        return self.view[offset:offset + length]
+
+    def part_reader(self, offset:int, length:int) -> PartReaderMmap:
+        return PartReaderMmap(self.part_view(offset, length))
+
+    def part_release(self, offset:int, length:int) -> None:
+        "drop resident pages of the range"
+        if self.mapping is None or not hasattr(mmap, "MADV_DONTNEED"):
+            return
+        start = offset - offset % mmap.PAGESIZE
+        finish = min(offset + length, self.total_size)
+        if finish > start:
+            self.mapping.madvise(mmap.MADV_DONTNEED, start, finish - start)
+
+    def close(self) -> None:
+        self.view.release()
+        if self.mapping is not None:
+            try:
+                self.mapping.close()
+            except BufferError:  # view still held by transport, unmapped on collection
+                logger.warning(f"mapping in use")
+        self.file_unit.close()
+
+
+class BodyProviderRead:
+    "reads parts of upload source into buffers with pread, for files which may change during upload"
+    "a file shrunk under the upload gives a short read, where a memory map would fault the process"
+
+    def __init__(self, local_path:str, total_size:int):
+        self.local_path = local_path
+        self.total_size = total_size
+        self.file_unit = open(local_path, "rb")
+
+    def __enter__(self) -> "BodyProviderRead":
+        return self
+
+    def __exit__(self, *args) -> None:
+        self.close()
+
+    def part_view(self, offset:int, length:int) -> memoryview:
+        "read whole range, raise when the file ends early"
+        buffer = bytearray()
+        while len(buffer) < length:
+            chunk = os.pread(self.file_unit.fileno(), length - len(buffer), offset + len(buffer))
+            if not chunk:
+                raise SnapshotChangeError(self.local_path)
+            buffer += chunk
+        return memoryview(buffer)
+
+    def part_reader(self, offset:int, length:int) -> PartReaderMmap:
+        return PartReaderMmap(self.part_view(offset, length))
+
+    def part_release(self, offset:int, length:int) -> None:
+        "buffers go with their part"
+
+    def close(self) -> None:
+        self.file_unit.close()
+
+
+class SupportFuncBody:
+    "checksum on memory views"
+
+    @classmethod
+    def content_md5(cls, part_view:memoryview) -> str:
+        "base64 md5 for Content-MD5 header"
+        return base64.b64encode(hashlib.md5(part_view).digest()).decode("ascii")
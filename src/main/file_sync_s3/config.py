@@ -2,10 +2,12 @@
 config parser support
 """
 
+import dataclasses
 import datetime
 import io
 import logging
 import os
+import threading
 
 from configparser import ConfigParser
 from configparser import ExtendedInterpolation
@@ -32,8 +34,6 @@ class EnvironmentInterpolation(ExtendedInterpolation):
         # parse according to declared option type
         if option.endswith("@int"):
             return int(value)
-        if option.endswith("@bool"):
-            return bool(value)
         if option.endswith("@float"):
             return float(value)
         if option.endswith("@bool"):
@@ -116,6 +116,16 @@ class ConfigSupport:
             entry_dict[key] = value
         return entry_dict
 
+    @classmethod
+    def change_list(cls, past:Any, next:Any, name_list:List[str]=None) -> List[str]:
+        "report names of config fields which differ between two config objects"
+        if name_list is None:
+            name_list = [field.name for field in dataclasses.fields(past)]
+        return [
+            name for name in name_list
+            if getattr(past, name) != getattr(next, name)
+        ]
+
     @classmethod
     def ensure_environ(cls,) -> None:
         "provide environment variables expected by '*.ini'"
@@ -144,4 +154,41 @@ class ConfigSupport:
         return config_parser
 
 
-CONFIG = ConfigSupport.produce_config()
+class LazyConfigParser:
+    "global configuration, parsed on first access"
+
+    def __init__(self):
+        self.config_lock = threading.Lock()
+        self.config_parser = None
+
+    def config(self) -> RichConfigParser:
+        "provide parsed configuration"
+        if self.config_parser is None:
+            with self.config_lock:
+                if self.config_parser is None:
+                    self.config_parser = ConfigSupport.produce_config()
+        return self.config_parser
+
+    def reload(self) -> RichConfigParser:
+        "re-read configuration files, keep present config on failure"
+        config_parser = ConfigSupport.produce_config()
+        with self.config_lock:
+            self.config_parser = config_parser
+        return config_parser
+
+    def restore(self, config_parser:RichConfigParser) -> None:
+        "return to configuration which was present before a rejected reload"
+        with self.config_lock:
+            self.config_parser = config_parser
+
+    def __getitem__(self, section:str) -> Any:
+        return self.config()[section]
+
+    def __getattr__(self, name:str) -> Any:
+        return getattr(self.config(), name)
+
+    def __str__(self):
+        return str(self.config())
+
+
+CONFIG = LazyConfigParser()
@@ -0,0 +1,155 @@
+"""
+content addressed deduplication support
+"""
+
+import os
+import logging
+import sqlite3
+import threading
+
+from dataclasses import dataclass
+from typing import List
+from typing import Optional
+
+from file_sync_s3.config import CONFIG
+
+logger = logging.getLogger(__name__)
+
+frozen = dataclass(frozen=True)
+
+
+@frozen
+class DedupConfig:
+    "deduplication params"
+
+    config_entry = "amazon/dedup"
+
+    dedup_mode:str  # none, copy, pointer
+    index_path:str  # local digest index database
+
+    mode_none = "none"
+    mode_copy = "copy"
+    mode_pointer = "pointer"
+
+    @classmethod
+    def default(cls) -> "DedupConfig":
+        ""
+        section = CONFIG[cls.config_entry]
+        return DedupConfig(
+            dedup_mode=section['dedup_mode'],
+            index_path=section['index_path'],
+        )
+
+    def has_enable(self) -> bool:
+        "detect if deduplication is active"
+        return self.dedup_mode != self.mode_none
+
+    def has_pointer(self) -> bool:
+        "detect if duplicates are stored as pointer objects"
+        return self.dedup_mode == self.mode_pointer
+
+
+class DedupIndex:
+    "local index: content digest -> remot key"
+    "entry with empty origin is a real object, otherwise a pointer to origin"
+
+    def __init__(self,
+            dedup_config:DedupConfig=None,
+        ):
+        self.dedup_config = dedup_config or DedupConfig.default()
+        self.index_lock = threading.Lock()
+        self.connection = None
+
+    def has_enable(self) -> bool:
+        return self.dedup_config.has_enable()
+
+    def has_pointer(self) -> bool:
+        return self.dedup_config.has_pointer()
+
+    def index_base(self) -> sqlite3.Connection:
+        "provide lazy index database connection"
+        if self.connection is None:
+            index_path = self.dedup_config.index_path
+            if index_path != ":memory:":
+                os.makedirs(os.path.dirname(index_path) or ".", exist_ok=True)
+            logger.info(f"index: {index_path}")
+            connection = sqlite3.connect(index_path, check_same_thread=False)
+            connection.execute(
+                "CREATE TABLE IF NOT EXISTS entry ("
+                "remot_path TEXT PRIMARY KEY, digest TEXT NOT NULL, origin TEXT)"
+            )
+            connection.execute(
+                "CREATE INDEX IF NOT EXISTS entry_digest ON entry (digest)"
+            )
+            connection.execute(
+                "CREATE INDEX IF NOT EXISTS entry_origin ON entry (origin)"
+            )
+            connection.commit()
+            self.connection = connection
+        return self.connection
+
+    def digest_lookup(self, digest:str) -> Optional[str]:
+        "find real remot object with given content digest"
+        with self.index_lock:
+            row = self.index_base().execute(
+                "SELECT remot_path FROM entry WHERE digest=? AND origin IS NULL LIMIT 1",
+                (digest,),
+            ).fetchone()
+        return row[0] if row else None
+
+    def digest_record(self, digest:str, remot_path:str, origin:str=None) -> None:
+        "remember remot object content digest"
+        with self.index_lock:
+            connection = self.index_base()
+            connection.execute(
+                "INSERT OR REPLACE INTO entry (remot_path, digest, origin) VALUES (?, ?, ?)",
+                (remot_path, digest, origin),
+            )
+            connection.commit()
+
+    def referrer_list(self, remot_path:str) -> List[str]:
+        "find pointer objects which refer to given origin"
+        with self.index_lock:
+            row_list = self.index_base().execute(
+                "SELECT remot_path FROM entry WHERE origin=? ORDER BY remot_path",
+                (remot_path,),
+            ).fetchall()
+        return [row[0] for row in row_list]
+
+    def remot_forget(self, remot_path:str) -> None:
+        "drop remot object from the index"
+        with self.index_lock:
+            connection = self.index_base()
+            connection.execute(
+                "DELETE FROM entry WHERE remot_path=?",
+                (remot_path,),
+            )
+            connection.commit()
+
+    def remot_move(self, source:str, target:str) -> None:
+        "follow remot object and its pointer references into new key"
+        with self.index_lock:
+            connection = self.index_base()
+            connection.execute(
+                "UPDATE OR REPLACE entry SET remot_path=? WHERE remot_path=?",
+                (target, source),
+            )
+            connection.execute(
+                "UPDATE entry SET origin=? WHERE origin=?",
+                (target, source),
+            )
+            connection.commit()
+
+    def remot_rebase(self, origin:str, target:str) -> None:
+        "move pointer references from old origin into new origin"
+        with self.index_lock:
+            connection = self.index_base()
+            connection.execute(
+                "UPDATE entry SET origin=NULL WHERE remot_path=?",
+                (target,),
+            )
+            connection.execute(
+                "UPDATE entry SET origin=? WHERE origin=?",
+                (target, origin),
+            )
+            connection.commit()
@@ -0,0 +1,273 @@
+"""
+live state dump and sampling profiler for a running service
+"""
+
+import os
+import sys
+import json
+import time
+import logging
+import tempfile
+import threading
+import contextlib
+import collections
+
+from dataclasses import dataclass
+from typing import Dict
+from typing import Iterator
+from typing import List
+from typing import TYPE_CHECKING
+
+from watchdog.utils import BaseThread
+
+from file_sync_s3.config import CONFIG
+from file_sync_s3.config import ConfigSupport
+
+if TYPE_CHECKING:
+    from file_sync_s3.watcher import WatcherOperator
+
+logger = logging.getLogger(__name__)
+
+frozen = dataclass(frozen=True)
+
+override = lambda function : function
+
+
+@frozen
+class DiagnoseConfig:
+    "state dump and profiler params"
+
+    config_entry = "folder/diagnose"
+
+    diagnose_path:str  # folder for dump and profile files, empty for system temporary folder
+    profile_duration:float  # sampling profiler run time, seconds
+    profile_interval:float  # sampling period, seconds
+    inflight_limit:int  # transfers listed in state dump
+
+    @classmethod
+    def default(cls) -> "DiagnoseConfig":
+        ""
+        section = CONFIG[cls.config_entry]
+        return DiagnoseConfig(
+            diagnose_path=section['diagnose_path'],
+            profile_duration=section['profile_duration@float'],
+            profile_interval=section['profile_interval@float'],
+            inflight_limit=section['inflight_limit@int'],
+        )
+
+
+class StageTimer:
+    "cumulative duration per processing stage, with stages in progress"
+
+    def __init__(self):
+        self.timer_lock = threading.Lock()
+        self.total_dict = dict()  # stage name -> [count, total seconds, longest seconds]
+        self.active_dict = dict()  # token id -> (stage name, thread name, start)
+
+    @contextlib.contextmanager
+    def stage(self, stage_name:str) -> Iterator[None]:
+        "measure the duration of the context"
+        token = object()
+        start = time.monotonic()
+        self.active_dict[id(token)] = (stage_name, threading.current_thread().name, start)
+        try:
+            yield
+        finally:
+            duration = time.monotonic() - start
+            del self.active_dict[id(token)]
+            with self.timer_lock:
+                entry = self.total_dict.setdefault(stage_name, [0, 0.0, 0.0])
+                entry[0] += 1
+                entry[1] += duration
+                entry[2] = max(entry[2], duration)
+
+    def report_dict(self) -> Dict[str, object]:
+        "totals per stage and running stages with their age, oldest first"
+        current = time.monotonic()
+        with self.timer_lock:
+            total_dict = {
+                stage_name: dict(count=count, total=round(total, 3), longest=round(longest, 3))
+                for stage_name, (count, total, longest) in sorted(self.total_dict.items())
+            }
+        active_list = sorted(list(self.active_dict.values()), key=lambda entry: entry[2])
+        return dict(
+            total=total_dict,
+            active=[
+                dict(stage=stage_name, thread=thread_name, running=round(current - start, 3))
+                for stage_name, thread_name, start in active_list
+            ],
+        )
+
+
+class SupportFuncDiagnose:
+    "collapsed stack support"
+
+    @classmethod
+    def frame_stack(cls, frame) -> List[str]:
+        "frame names from outermost to innermost"
+        name_list = []
+        while frame is not None:
+            code = frame.f_code
+            name_list.append(f"{code.co_name} ({os.path.basename(code.co_filename)}:{frame.f_lineno})")
+            frame = frame.f_back
+        name_list.reverse()
+        return name_list
+
+    @classmethod
+    def output_path(cls, diagnose_path:str, kind:str, suffix:str) -> str:
+        folder_path = diagnose_path or tempfile.gettempdir()
+        os.makedirs(folder_path, exist_ok=True)
+        stamp = time.strftime("%Y%m%d-%H%M%S")
+        return os.path.join(folder_path, f"file_sync_s3-{os.getpid()}-{kind}-{stamp}.{suffix}")
+
+
+class SamplingProfiler(BaseThread):
+    "time boxed sampler of all thread stacks, output in collapsed stack format"
+    "one line per distinct stack: thread;outer;...;inner count, ready for flame graph tools"
+
+    def __init__(self,
+            profile_path:str,
+            profile_duration:float,
+            profile_interval:float,
+        ):
+        BaseThread.__init__(self)
+        self.name = "sampling_profiler"
+        self.profile_path = profile_path
+        self.profile_duration = profile_duration
+        self.profile_interval = profile_interval
+        self.stack_counter = collections.Counter()
+        self.sample_count = 0
+
+    def sample(self) -> None:
+        "record current stack of every other thread"
+        name_dict = {thread.ident: thread.name for thread in threading.enumerate()}
+        for ident, frame in sys._current_frames().items():
+            if ident == self.ident:
+                continue
+            stack = ";".join([name_dict.get(ident, str(ident))] + SupportFuncDiagnose.frame_stack(frame))
+            self.stack_counter[stack] += 1
+        self.sample_count += 1
+
+    def write(self) -> None:
+        with open(self.profile_path, "w") as file_unit:
+            for stack, count in self.stack_counter.most_common():
+                file_unit.write(f"{stack} {count}\n")
+
+    @override
+    def run(self) -> None:
+        finish = time.monotonic() + self.profile_duration
+        while time.monotonic() < finish and not self.stopped_event.wait(self.profile_interval):
+            try:
+                self.sample()
+            except Exception as error:
+                logger.error(f"failure: {error}")
+        self.write()
+        logger.info(f"profile: {self.profile_path} samples={self.sample_count}")
+
+
+class DiagnoseOperator:
+    "on demand inspection of a running watcher operator"
+
+    def __init__(self,
+            watcher_operator:"WatcherOperator",
+            diagnose_config:DiagnoseConfig=None,
+        ):
+        self.watcher_operator = watcher_operator
+        self.diagnose_config = diagnose_config or DiagnoseConfig.default()
+        self.sampling_profiler = None
+
+    def reconfigure(self) -> List[str]:
+        "re-read configuration, report changed fields"
+        diagnose_config = DiagnoseConfig.default()
+        change_list = ConfigSupport.change_list(self.diagnose_config, diagnose_config)
+        self.diagnose_config = diagnose_config
+        return change_list
+
+    def state_dict(self) -> Dict[str, object]:
+        "snapshot of queues, transfers, pools and stage timings"
+        watcher_operator = self.watcher_operator
+        event_reactor = watcher_operator.event_reactor
+        bucket_operator = watcher_operator.bucket_operator
+        current = time.time()
+
+        with event_reactor.event_lock:
+            pending_count = len(event_reactor.pending_store)
+            pending_spill = len(event_reactor.pending_store.pending_spill)
+            oldest_stamp = event_reactor.pending_store.oldest_stamp()
+            fanin_count = len(event_reactor.folder_fanin)
+            keeper_count = len(event_reactor.keeper_remot_list)
+            retry_count = len(event_reactor.retry_dict)
+        oldest_deadline = None if oldest_stamp is None else oldest_stamp + event_reactor.folder_config.watcher_timeout
+
+        transfer_scheduler = event_reactor.transfer_scheduler
+        with transfer_scheduler.queue_lock:
+            class_list = [priority_class for priority_class, _ in transfer_scheduler.entry_dict.values()]
+        schedule_dict = {str(priority_class): class_list.count(priority_class) for priority_class in set(class_list)}
+
+        inflight_list = sorted(
+            list(bucket_operator.progress_tracker.active_dict.values()),
+            key=lambda progress_counter: progress_counter.total_size, reverse=True,
+        )
+        engine_dict = None
+        event_engine = watcher_operator.event_engine
+        if event_engine:
+            with event_engine.state_lock:
+                engine_dict = dict(
+                    active=event_engine.active_count(),
+                    follow=len(event_engine.follow_dict),
+                    capacity=event_engine.engine_config.engine_concurrency,
+                )
+
+        return dict(
+            time=round(current, 3),
+            pending=dict(
+                count=pending_count,
+                spill=pending_spill,
+                oldest_deadline=oldest_deadline,
+                overdue=None if oldest_deadline is None else round(current - oldest_deadline, 3),
+                fanin=fanin_count,
+                keeper=keeper_count,
+                retry=retry_count,
+            ),
+            schedule=schedule_dict,
+            inflight=dict(
+                count=len(inflight_list),
+                transfer=[
+                    dict(name=progress_counter.transfer_name, total=progress_counter.total_size, wired=progress_counter.wired_size())
+                    for progress_counter in inflight_list[:self.diagnose_config.inflight_limit]
+                ],
+            ),
+            engine=engine_dict,
+            pool=bucket_operator.pool_state(),
+            stage=event_reactor.stage_timer.report_dict(),
+            thread=sorted(thread.name for thread in threading.enumerate()),
+        )
+
+    def state_dump(self) -> str:
+        "write state snapshot, report file path"
+        state_path = SupportFuncDiagnose.output_path(self.diagnose_config.diagnose_path, "state", "json")
+        state_text = json.dumps(self.state_dict(), indent=2)
+        with open(state_path, "w") as file_unit:
+            file_unit.write(state_text)
+        logger.info(f"state: {state_path}")
+        return state_path
+
+    def profile_start(self) -> str:
+        "start time boxed profiler unless one is running, report its output path"
+        if self.sampling_profiler and self.sampling_profiler.is_alive():
+            logger.info(f"profile in progress: {self.sampling_profiler.profile_path}")
+            return self.sampling_profiler.profile_path
+        profile_path = SupportFuncDiagnose.output_path(self.diagnose_config.diagnose_path, "profile", "txt")
+        logger.info(f"profile start: {profile_path} duration={self.diagnose_config.profile_duration}")
+        self.sampling_profiler = SamplingProfiler(
+            profile_path,
+            self.diagnose_config.profile_duration,
+            self.diagnose_config.profile_interval,
+        )
+        self.sampling_profiler.start()
+        return profile_path
+
+    def terminate(self) -> None:
+        if self.sampling_profiler and self.sampling_profiler.is_alive():
+            self.sampling_profiler.stop()
+            self.sampling_profiler.join()
@@ -0,0 +1,104 @@
+"""
+directory level fan-in of file events under heavy churn
+"""
+
+import os
+import logging
+
+from dataclasses import dataclass
+from typing import List
+from typing import Optional
+
+from file_sync_s3.config import CONFIG
+from file_sync_s3.config import ConfigSupport
+
+logger = logging.getLogger(__name__)
+
+frozen = dataclass(frozen=True)
+
+
+@frozen
+class FaninConfig:
+    "directory fan-in params"
+
+    config_entry = "folder/fanin"
+
+    fanin_enable:bool  # track busy folders as dirty subtrees
+    fanin_rate:int  # events per second in one folder, which make it dirty
+
+    @classmethod
+    def default(cls) -> "FaninConfig":
+        ""
+        section = CONFIG[cls.config_entry]
+        return FaninConfig(
+            fanin_enable=section['fanin_enable@bool'],
+            fanin_rate=section['fanin_rate@int'],
+        )
+
+
+class FolderFanin:
+    "count events per folder, absorb events under dirty subtrees"
+    "dirty subtree is reported once it stays quiet, for a single scan based diff"
+
+    def __init__(self,
+            fanin_config:FaninConfig=None,
+        ):
+        self.fanin_config = fanin_config or FaninConfig.default()
+        self.dirty_dict = dict()  # folder path -> last event time
+        self.count_dict = dict()  # folder path -> events in current window
+        self.window = 0  # current one second window
+
+    def __len__(self) -> int:
+        return len(self.dirty_dict)
+
+    def has_enable(self) -> bool:
+        return self.fanin_config.fanin_enable
+
+    def reconfigure(self) -> List[str]:
+        "re-read configuration, report changed fields"
+        fanin_config = FaninConfig.default()
+        change_list = ConfigSupport.change_list(self.fanin_config, fanin_config)
+        self.fanin_config = fanin_config
+        return change_list
+
+    def dirty_root(self, folder_path:str) -> Optional[str]:
+        "find dirty folder which contains the folder"
+        while True:
+            if folder_path in self.dirty_dict:
+                return folder_path
+            parent_path = os.path.dirname(folder_path)
+            if parent_path == folder_path:
+                return None
+            folder_path = parent_path
+
+    def observe(self, file_path:str, dest_path:Optional[str], current:float) -> bool:
+        "account event, report if it was absorbed by a dirty subtree"
+        folder_path = os.path.dirname(file_path)
+        dirty_path = self.dirty_root(folder_path)
+        if dirty_path is None:
+            window = int(current)
+            if window != self.window:
+                self.window = window
+                self.count_dict.clear()
+            count = self.count_dict.get(folder_path, 0) + 1
+            self.count_dict[folder_path] = count
+            if count < self.fanin_config.fanin_rate:
+                return False
+            logger.info(f"dirty: {folder_path}")
+            self.count_dict.pop(folder_path)
+            dirty_path = folder_path
+        if dest_path and self.dirty_root(os.path.dirname(dest_path)) is None:
+            self.dirty_dict[dirty_path] = current
+            return False  # move out of dirty subtree: let the event create the destination
+        self.dirty_dict[dirty_path] = current
+        return True
+
+    def settled_list(self, current:float, timeout:float) -> List[str]:
+        "remove and report dirty folders without events for the timeout"
+        settled_list = [
+            folder_path for folder_path, stamp in self.dirty_dict.items()
+            if stamp + timeout < current
+        ]
+        for folder_path in settled_list:
+            del self.dirty_dict[folder_path]
+        return settled_list
@@ -0,0 +1,90 @@
+"""
+remote semantics of local file expiration
+"""
+
+import logging
+
+from dataclasses import dataclass
+from datetime import datetime
+from datetime import timedelta
+from datetime import timezone
+from typing import Optional
+
+from file_sync_s3.config import CONFIG
+
+logger = logging.getLogger(__name__)
+
+frozen = dataclass(frozen=True)
+
+
+@frozen
+class KeeperConfig:
+    "remote expiration params"
+
+    config_entry = "amazon/keeper"
+
+    keeper_remote:str  # event, keep, delete, transition
+    keeper_storage_class:str  # transition target
+    keeper_lifecycle:bool  # install equivalent bucket lifecycle rule instead of per object requests
+    keeper_rule_id:str  # lifecycle rule identity
+
+    mode_event = "event"  # local delete event goes through the reactor
+    mode_keep = "keep"  # remote copy is kept
+    mode_delete = "delete"  # remote copies are deleted in batches
+    mode_transition = "transition"  # remote copy moves to colder storage class
+
+    @classmethod
+    def default(cls) -> "KeeperConfig":
+        ""
+        section = CONFIG[cls.config_entry]
+        return KeeperConfig(
+            keeper_remote=section['keeper_remote'],
+            keeper_storage_class=section['keeper_storage_class'],
+            keeper_lifecycle=section['keeper_lifecycle@bool'],
+            keeper_rule_id=section['keeper_rule_id'],
+        )
+
+    def has_event(self) -> bool:
+        "keeper deletes flow as ordinary events"
+        return self.keeper_remote == self.mode_event
+
+    def has_lifecycle(self) -> bool:
+        "bucket lifecycle rule does the remote work"
+        return self.keeper_lifecycle and self.keeper_remote in (self.mode_delete, self.mode_transition)
+
+    def has_retain(self) -> bool:
+        "remote copy outlives expired local file"
+        return self.keeper_remote in (self.mode_keep, self.mode_transition)
+
+
+class SupportFuncKeeper:
+    "lifecycle rule support"
+
+    @classmethod
+    def lifecycle_refusal(cls, remot_prefix:str, has_pointer:bool) -> Optional[str]:
+        "reason why a lifecycle rule would reach objects keeper does not own, none when safe"
+        if not remot_prefix:
+            return "folder maps to bucket root, rule would expire lease and dedup objects"
+        if has_pointer:
+            return "dedup pointer mode, rule would expire origins which live pointers reference"
+        return None
+
+    @classmethod
+    def lifecycle_rule(cls, keeper_config:KeeperConfig, remot_prefix:str, diem_span:int) -> dict:
+        "produce bucket lifecycle rule equivalent to keeper expiration"
+        "https://docs.aws.amazon.com/AmazonS3/latest/userguide/intro-lifecycle-rules.html"
+        rule = dict(
+            ID=keeper_config.keeper_rule_id,
+            Filter=dict(Prefix=remot_prefix),
+            Status="Enabled",
+        )
+        if keeper_config.keeper_remote == KeeperConfig.mode_transition:
+            rule['Transitions'] = [dict(Days=diem_span, StorageClass=keeper_config.keeper_storage_class)]
+        else:
+            rule['Expiration'] = dict(Days=diem_span)
+        return rule
+
+    @classmethod
+    def has_retired(cls, last_modified:datetime, diem_span:int) -> bool:
+        "remot object is old enough to be a retained copy of expired local file"
+        return datetime.now(timezone.utc) - last_modified >= timedelta(days=diem_span)
@@ -0,0 +1,246 @@
+"""
+remot key layout with optional hash shard prefix
+"""
+
+import os
+import sys
+import heapq
+import hashlib
+import logging
+import argparse
+
+from dataclasses import dataclass
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict
+from typing import Iterator
+from typing import List
+from typing import Optional
+from typing import Tuple
+
+from file_sync_s3.config import CONFIG
+from file_sync_s3.config import ConfigSupport
+from file_sync_s3.partition import PartitionConfig
+
+logger = logging.getLogger(__name__)
+
+frozen = dataclass(frozen=True)
+
+
+@frozen
+class LayoutConfig:
+    "remot key layout params"
+
+    config_entry = "amazon/layout"
+
+    layout_mode:str  # flat, shard
+    shard_width:int  # hex digits of shard prefix, produces 16**shard_width prefixes
+
+    mode_flat = "flat"  # key is plain path relative to the folder
+    mode_shard = "shard"  # key is prefixed with hash shard of the plain key
+
+    @classmethod
+    def default(cls) -> "LayoutConfig":
+        ""
+        section = CONFIG[cls.config_entry]
+        return LayoutConfig(
+            layout_mode=section['layout_mode'],
+            shard_width=section['shard_width@int'],
+        )
+
+    def has_shard(self) -> bool:
+        return self.layout_mode == self.mode_shard
+
+
+class SupportFuncLayout:
+    "shard prefix support"
+
+    @classmethod
+    def shard_name(cls, plain_key:str, shard_width:int) -> str:
+        "deterministic shard of the plain key"
+        return hashlib.sha1(plain_key.encode("utf-8")).hexdigest()[:shard_width]
+
+    @classmethod
+    def shard_list(cls, shard_width:int) -> List[str]:
+        "every shard name of given width, in key order"
+        return [f"{index:0{shard_width}x}" for index in range(16 ** shard_width)]
+
+
+class KeyLayout:
+    "map plain keys into stored remot keys and back"
+
+    def __init__(self,
+            layout_config:LayoutConfig=None,
+        ):
+        self.layout_config = layout_config or LayoutConfig.default()
+
+    def reconfigure(self) -> List[str]:
+        "re-read configuration, layout is never changed live"
+        "keys already stored in the old layout stay valid until restart, after the layout migrate tool"
+        layout_config = LayoutConfig.default()
+        change_list = ConfigSupport.change_list(self.layout_config, layout_config)
+        if change_list:
+            logger.warning(f"layout change ignored until restart, migrate existing keys first: {change_list}")
+        return []
+
+    def has_shard(self) -> bool:
+        return self.layout_config.has_shard()
+
+    def remot_key(self, plain_key:str) -> str:
+        "stored remot key for the plain key"
+        if not self.has_shard():
+            return plain_key
+        return SupportFuncLayout.shard_name(plain_key, self.layout_config.shard_width) + "/" + plain_key
+
+    def plain_key(self, remot_key:str) -> Optional[str]:
+        "plain key of stored remot key, none for keys outside of the layout"
+        if not self.has_shard():
+            return remot_key
+        shard_name, _, plain_key = remot_key.partition("/")
+        if shard_name != SupportFuncLayout.shard_name(plain_key, self.layout_config.shard_width):
+            return None
+        return plain_key
+
+    def prefix_list(self, plain_prefix:str) -> List[str]:
+        "stored key prefixes which together cover the plain key prefix"
+        if not self.has_shard():
+            return [plain_prefix]
+        return [
+            shard_name + "/" + plain_prefix
+            for shard_name in SupportFuncLayout.shard_list(self.layout_config.shard_width)
+        ]
+
+    def remot_list(self, bucket_operator:"BucketOperatorS3", plain_prefix:str) -> Dict[str, Tuple[int, "datetime"]]:
+        "discover remot objects under the plain key prefix: plain key -> (size, upload time)"
+        prefix_list = self.prefix_list(plain_prefix)
+        if len(prefix_list) == 1:
+            listing_list = [bucket_operator.remot_list(prefix_list[0])]
+        else:
+            with ThreadPoolExecutor(bucket_operator.config_transfer.max_concurrency) as executor:
+                listing_list = list(executor.map(bucket_operator.remot_list, prefix_list))
+        object_dict = dict()
+        for listing in listing_list:
+            for remot_key, remot_entry in listing.items():
+                plain_key = self.plain_key(remot_key)
+                if plain_key is not None:
+                    object_dict[plain_key] = remot_entry
+        return object_dict
+
+    def remot_scan(self, bucket_operator:"BucketOperatorS3", plain_prefix:str) -> Iterator[Tuple[str, int, "datetime"]]:
+        "stream remot objects under the plain key prefix in plain key order: (plain key, size, upload time)"
+        "every shard lists in plain key order, so shards are joined with a streaming merge"
+        scan_list = [
+            self.plain_scan(bucket_operator.remot_scan(remot_prefix))
+            for remot_prefix in self.prefix_list(plain_prefix)
+        ]
+        return scan_list[0] if len(scan_list) == 1 else heapq.merge(*scan_list)
+
+    def plain_scan(self, remot_iter:Iterator[Tuple[str, int, "datetime"]]) -> Iterator[Tuple[str, int, "datetime"]]:
+        "map stored keys into plain keys, drop keys outside of the layout"
+        for remot_key, size, last_modified in remot_iter:
+            plain_key = self.plain_key(remot_key)
+            if plain_key is not None:
+                yield (plain_key, size, last_modified)
+
+
+class LayoutMigrator:
+    "rewrite existing remot keys from one layout into another"
+
+    def __init__(self,
+            bucket_operator:"BucketOperatorS3",
+            source_layout:KeyLayout,
+            target_layout:KeyLayout,
+            skip_prefix_list:List[str]=None,
+        ):
+        self.bucket_operator = bucket_operator
+        self.source_layout = source_layout
+        self.target_layout = target_layout
+        self.skip_prefix_list = skip_prefix_list or [PartitionConfig.default().lease_prefix]
+
+    def move_list(self, plain_prefix:str) -> List[Tuple[str, str]]:
+        "source and target keys of objects which change place"
+        "service keys stay in place, keys already in the target shard layout are not sharded again"
+        object_dict = self.source_layout.remot_list(self.bucket_operator, plain_prefix)
+        move_list = []
+        for plain_key in sorted(object_dict):
+            if any(plain_key.startswith(prefix) for prefix in self.skip_prefix_list):
+                continue  # lease objects, not synced content
+            source_key = self.source_layout.remot_key(plain_key)
+            if self.target_layout.has_shard() and self.target_layout.plain_key(source_key) is not None:
+                continue  # moved by an earlier run, flat source accepts every key
+            target_key = self.target_layout.remot_key(plain_key)
+            if source_key != target_key:
+                move_list.append((source_key, target_key))
+        return move_list
+
+    def migrate(self, plain_prefix:str="", keep_source:bool=False) -> int:
+        "move objects with concurrent server side copies, report moved count"
+        move_list = self.move_list(plain_prefix)
+        logger.info(f"migrate: {len(move_list)} objects")
+        done_list = self.bucket_operator.remot_move_batch(move_list, keep_source)
+        logger.info(f"migrate: {len(done_list)} moved")
+        return len(done_list)
+
+    def restore(self, folder_path:str, plain_prefix:str="") -> int:
+        "transfer objects into local folder, recover local paths from plain keys, report restored count"
+        object_dict = self.source_layout.remot_list(self.bucket_operator, plain_prefix)
+
+        def restore_entry(plain_key:str) -> None:
+            local_path = os.path.join(folder_path, plain_key)
+            os.makedirs(os.path.dirname(local_path), exist_ok=True)
+            self.bucket_operator.resource_get_sync(local_path, self.source_layout.remot_key(plain_key))
+
+        restore_count = 0
+        with ThreadPoolExecutor(self.bucket_operator.config_transfer.max_concurrency) as executor:
+            for plain_key, future in [(key, executor.submit(restore_entry, key)) for key in sorted(object_dict)]:
+                try:
+                    future.result()
+                    restore_count += 1
+                except Exception as error:
+                    logger.error(f"failure: {plain_key} {error}")
+        return restore_count
+
+
+def layout_main(argument_list:List[str]=None) -> int:
+    "layout tool invocation"
+
+    from file_sync_s3.service import setup_logger
+    from file_sync_s3.aws_s3 import BucketOperatorS3
+
+    parser = argparse.ArgumentParser(description="remot key layout tool")
+    parser.add_argument("--prefix", default="", help="plain key prefix to process")
+    parser.add_argument("--source-mode", default=LayoutConfig.mode_flat, choices=[LayoutConfig.mode_flat, LayoutConfig.mode_shard])
+    parser.add_argument("--source-width", type=int, default=None)
+    command_parser = parser.add_subparsers(dest="command", required=True)
+    migrate_parser = command_parser.add_parser("migrate", help="rewrite keys into target layout with server side copies")
+    migrate_parser.add_argument("--target-mode", default=LayoutConfig.mode_shard, choices=[LayoutConfig.mode_flat, LayoutConfig.mode_shard])
+    migrate_parser.add_argument("--target-width", type=int, default=None)
+    migrate_parser.add_argument("--keep-source", action="store_true", help="do not delete source keys")
+    restore_parser = command_parser.add_parser("restore", help="transfer objects into local folder")
+    restore_parser.add_argument("folder_path")
+    argument = parser.parse_args(argument_list)
+
+    setup_logger()
+
+    layout_config = LayoutConfig.default()
+    source_layout = KeyLayout(LayoutConfig(
+        layout_mode=argument.source_mode,
+        shard_width=argument.source_width or layout_config.shard_width,
+    ))
+    target_layout = source_layout
+    if argument.command == "migrate":
+        target_layout = KeyLayout(LayoutConfig(
+            layout_mode=argument.target_mode,
+            shard_width=argument.target_width or layout_config.shard_width,
+        ))
+
+    layout_migrator = LayoutMigrator(BucketOperatorS3(), source_layout, target_layout)
+    if argument.command == "migrate":
+        layout_migrator.migrate(argument.prefix, argument.keep_source)
+    else:
+        layout_migrator.restore(argument.folder_path, argument.prefix)
+
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(layout_main())
@@ -0,0 +1,204 @@
+"""
+multi-node work partitioning with lease based membership
+"""
+
+import os
+import bisect
+import socket
+import hashlib
+import logging
+import dataclasses
+
+from dataclasses import dataclass
+from datetime import datetime
+from datetime import timezone
+from typing import Callable
+from typing import List
+from typing import Optional
+from typing import Tuple
+
+from watchdog.utils import BaseThread
+
+from file_sync_s3.config import CONFIG
+from file_sync_s3.config import ConfigSupport
+
+logger = logging.getLogger(__name__)
+
+frozen = dataclass(frozen=True)
+
+override = lambda function : function
+
+
+@frozen
+class PartitionConfig:
+    "multi-node partitioning params"
+
+    config_entry = "folder/partition"
+
+    partition_enable:bool  # split path space between nodes which share the folder
+    node_name:str  # node identity, empty for host name and process id
+    lease_prefix:str  # bucket key prefix of node lease objects
+    lease_duration:float  # lease expires unless renewed within, seconds
+    lease_renew:float  # lease renewal and membership refresh period, seconds
+    ring_replica:int  # hash ring points per node
+
+    @classmethod
+    def default(cls) -> "PartitionConfig":
+        ""
+        section = CONFIG[cls.config_entry]
+        return PartitionConfig(
+            partition_enable=section['partition_enable@bool'],
+            node_name=section['node_name'] or f"{socket.gethostname()}-{os.getpid()}",
+            lease_prefix=section['lease_prefix'],
+            lease_duration=section['lease_duration@float'],
+            lease_renew=section['lease_renew@float'],
+            ring_replica=section['ring_replica@int'],
+        )
+
+
+class SupportFuncPartition:
+    "hash ring support"
+
+    @classmethod
+    def ring_point(cls, text:str) -> int:
+        "position on the hash ring"
+        return int.from_bytes(hashlib.sha1(text.encode("utf-8")).digest()[:8], "big")
+
+    @classmethod
+    def has_expired(cls, last_modified:datetime, lease_duration:float) -> bool:
+        "lease age is measured against its last write time"
+        return (datetime.now(timezone.utc) - last_modified).total_seconds() > lease_duration
+
+
+class HashRing:
+    "consistent hash ring: node owns the keys up to each of its points"
+    "adding or removing a node moves only the keys of its neighbour ranges"
+
+    def __init__(self, node_list:List[str], ring_replica:int):
+        self.node_list = sorted(node_list)
+        entry_list = sorted(
+            (SupportFuncPartition.ring_point(f"{node_name}#{index}"), node_name)
+            for node_name in self.node_list
+            for index in range(ring_replica)
+        )
+        self.point_list = [point for point, _ in entry_list]
+        self.owner_list = [node_name for _, node_name in entry_list]
+
+    def owner(self, plain_key:str) -> Optional[str]:
+        "node which owns the key"
+        if not self.point_list:
+            return None
+        index = bisect.bisect_left(self.point_list, SupportFuncPartition.ring_point(plain_key))
+        return self.owner_list[index % len(self.owner_list)]
+
+
+class PartitionLease(BaseThread):
+    "hold node lease object in the bucket, track live nodes, decide key ownership"
+    "lease writes are conditional: create only when absent, renew only own version"
+
+    def __init__(self,
+            partition_config:PartitionConfig=None,
+            bucket_operator:"BucketOperatorS3"=None,
+        ):
+        BaseThread.__init__(self)
+        self.name = "partition_lease"
+        self.partition_config = partition_config or PartitionConfig.default()
+        self.bucket_operator = bucket_operator
+        self.lease_etag = None  # version of held lease object
+        self.hash_ring = HashRing([], 0)
+        self.rebalance_notice:Callable[[List[str]], None] = lambda node_list: None
+
+    def reconfigure(self) -> List[str]:
+        "re-read configuration, report changed fields, node identity stays"
+        partition_config = dataclasses.replace(PartitionConfig.default(), node_name=self.partition_config.node_name)
+        change_list = ConfigSupport.change_list(self.partition_config, partition_config)
+        self.partition_config = partition_config
+        return change_list
+
+    def has_enable(self) -> bool:
+        return self.partition_config.partition_enable
+
+    def has_owner(self, plain_key:str) -> bool:
+        "this node is responsible for the key"
+        if not self.has_enable():
+            return True
+        return self.hash_ring.owner(plain_key) == self.partition_config.node_name
+
+    def has_lease_key(self, plain_key:str) -> bool:
+        "key belongs to lease bookkeeping, not to synced content"
+        return self.has_enable() and plain_key.startswith(self.partition_config.lease_prefix)
+
+    def lease_key(self, node_name:str) -> str:
+        return self.partition_config.lease_prefix + node_name
+
+    def lease_renew(self) -> bool:
+        "create or renew own lease, take over own expired lease, report if lease is held"
+        if self.stopped_event.is_set():
+            return False
+        lease_key = self.lease_key(self.partition_config.node_name)
+        lease_body = self.partition_config.node_name.encode("utf-8")
+        if self.lease_etag is None:
+            self.lease_etag = self.bucket_operator.lease_put(lease_key, lease_body)
+            if self.lease_etag is None:  # name is taken, may be a stale lease of past run
+                lease_head = self.bucket_operator.remot_head(lease_key)
+                if lease_head and SupportFuncPartition.has_expired(
+                        lease_head['LastModified'], self.partition_config.lease_duration,
+                    ):
+                    self.lease_etag = self.bucket_operator.lease_put(lease_key, lease_body, lease_head['ETag'])
+        else:
+            self.lease_etag = self.bucket_operator.lease_put(lease_key, lease_body, self.lease_etag)
+            if self.lease_etag is None:
+                logger.warning(f"lease lost: {lease_key}")
+        return self.lease_etag is not None
+
+    def member_list(self) -> List[str]:
+        "nodes with live leases"
+        lease_prefix = self.partition_config.lease_prefix
+        return sorted(
+            lease_key[len(lease_prefix):]
+            for lease_key, (_, last_modified) in self.bucket_operator.remot_list(lease_prefix).items()
+            if not SupportFuncPartition.has_expired(last_modified, self.partition_config.lease_duration)
+        )
+
+    def member_refresh(self) -> Tuple[List[str], bool]:
+        "renew lease and rebuild hash ring from live nodes, report nodes and if ownership changed"
+        node_list = self.member_list() if self.lease_renew() else []
+        changed = node_list != self.hash_ring.node_list
+        if changed:
+            logger.info(f"members: {node_list}")
+            self.hash_ring = HashRing(node_list, self.partition_config.ring_replica)
+        return (node_list, changed)
+
+    def lease_release(self) -> None:
+        "drop own lease, so that other nodes take over without waiting for expiration"
+        if self.lease_etag is None:
+            return
+        self.lease_etag = None
+        self.hash_ring = HashRing([], 0)
+        try:
+            self.bucket_operator.resource_delete_sync(self.lease_key(self.partition_config.node_name))
+        except Exception as error:
+            logger.error(f"failure: {error}")
+
+    @override
+    def on_thread_start(self) -> None:
+        "ownership is known before the first event is dispatched"
+        try:
+            self.member_refresh()
+        except Exception as error:
+            logger.error(f"failure: {error}")
+
+    @override
+    def on_thread_stop(self) -> None:
+        self.lease_release()
+
+    @override
+    def run(self) -> None:
+        "periodic lease renewal, rebalance on membership change"
+        while not self.stopped_event.wait(self.partition_config.lease_renew):
+            try:
+                node_list, changed = self.member_refresh()
+                if changed:
+                    self.rebalance_notice(node_list)
+            except Exception as error:
+                logger.error(f"failure: {error}")
@@ -0,0 +1,443 @@
+"""
+memory compact store of postponed file events
+"""
+
+import os
+import logging
+import sqlite3
+
+from array import array
+from dataclasses import dataclass
+from typing import List
+from typing import Optional
+from typing import Tuple
+
+from watchdog import events
+
+from file_sync_s3.config import CONFIG
+from file_sync_s3.config import ConfigSupport
+from file_sync_s3.schedule import PriorityClass
+
+logger = logging.getLogger(__name__)
+
+frozen = dataclass(frozen=True)
+
+
+@frozen
+class PendingConfig:
+    "pending event store params"
+
+    config_entry = "folder/pending"
+
+    pending_spill_limit:int  # entries kept in memory, others go to disk
+    pending_spill_path:str  # spill database, empty for private temporary file
+    pending_handover:int  # settled entries kept in transfer scheduler
+
+    @classmethod
+    def default(cls) -> "PendingConfig":
+        ""
+        section = CONFIG[cls.config_entry]
+        return PendingConfig(
+            pending_spill_limit=section['pending_spill_limit@int'],
+            pending_spill_path=section['pending_spill_path'],
+            pending_handover=section['pending_handover@int'],
+        )
+
+
+@frozen
+class EventEntry:
+    "postponed file event"
+
+    stamp:float  # event fire time
+    origin:float  # first event fire time
+    event:events.FileSystemEvent  # original event
+    priority_class:int  # transfer scheduling class
+
+
+class PendingCode:
+    "map between watchdog event and compact event code"
+
+    class_list = tuple(
+        getattr(events, name) for name in (
+            "FileCreatedEvent",
+            "FileModifiedEvent",
+            "FileDeletedEvent",
+            "FileMovedEvent",
+            "FileOpenedEvent",
+            "FileClosedEvent",
+            "FileClosedNoWriteEvent",
+        ) if hasattr(events, name)
+    )
+
+    code_dict = {event_class.event_type: code for code, event_class in enumerate(class_list)}
+
+    @classmethod
+    def event_code(cls, event:events.FileSystemEvent) -> int:
+        "produce compact code of the event"
+        return cls.code_dict[event.event_type]
+
+    @classmethod
+    def event_build(cls, code:int, src_path:str, dest_path:Optional[str]) -> events.FileSystemEvent:
+        "rebuild watchdog event from compact code"
+        event_class = cls.class_list[code]
+        if event_class.event_type == events.EVENT_TYPE_MOVED:
+            return event_class(src_path, dest_path)
+        return event_class(src_path)
+
+
+class PendingQueue:
+    "insertion ordered records of one priority class in parallel arrays"
+    "removed records leave holes, skipped by the head and compacted later"
+
+    __slots__ = (
+        "stamp_array",
+        "origin_array",
+        "code_array",
+        "dir_array",
+        "name_list",
+        "dest_dict",
+        "head",
+        "count",
+    )
+
+    code_free = -1
+
+    def __init__(self):
+        self.stamp_array = array('d')
+        self.origin_array = array('d')
+        self.code_array = array('b')
+        self.dir_array = array('L')
+        self.name_list = []  # shared with directory name dict keys
+        self.dest_dict = dict()  # slot -> moved event dest path
+        self.head = 0  # slots before head are free
+        self.count = 0  # slots in use
+
+    def __len__(self) -> int:
+        return self.count
+
+    def append(self,
+            stamp:float,
+            origin:float,
+            code:int,
+            dir_id:int,
+            name:str,
+            dest_path:Optional[str],
+        ) -> int:
+        "store record at the tail, report its slot"
+        slot = len(self.code_array)
+        self.stamp_array.append(stamp)
+        self.origin_array.append(origin)
+        self.code_array.append(code)
+        self.dir_array.append(dir_id)
+        self.name_list.append(name)
+        if dest_path:
+            self.dest_dict[slot] = dest_path
+        self.count += 1
+        return slot
+
+    def remove(self, slot:int) -> None:
+        "free the slot"
+        self.code_array[slot] = self.code_free
+        self.name_list[slot] = None
+        self.dest_dict.pop(slot, None)
+        self.count -= 1
+
+    def compact(self) -> List[int]:
+        "drop free slots before head, report moved slots, now shifted by former head"
+        head = self.head
+        self.stamp_array = self.stamp_array[head:]
+        self.origin_array = self.origin_array[head:]
+        self.code_array = self.code_array[head:]
+        self.dir_array = self.dir_array[head:]
+        self.name_list = self.name_list[head:]
+        self.dest_dict = {slot - head: dest_path for slot, dest_path in self.dest_dict.items()}
+        self.head = 0
+        return [slot for slot, code in enumerate(self.code_array) if code != self.code_free]
+
+
+class PendingSpill:
+    "disk store for entries above memory limit"
+
+    def __init__(self, spill_path:str):
+        self.spill_path = spill_path
+        self.connection = None
+        self.count = 0
+
+    def __len__(self) -> int:
+        return self.count
+
+    def spill_base(self) -> sqlite3.Connection:
+        "provide lazy spill database connection"
+        if self.connection is None:
+            if self.spill_path:
+                os.makedirs(os.path.dirname(self.spill_path) or ".", exist_ok=True)
+            logger.info(f"spill: {self.spill_path or '<temporary>'}")
+            connection = sqlite3.connect(self.spill_path, check_same_thread=False)
+            connection.execute("PRAGMA journal_mode=OFF")
+            connection.execute("PRAGMA synchronous=OFF")
+            connection.execute("DROP TABLE IF EXISTS entry")
+            connection.execute(
+                "CREATE TABLE entry ("
+                "path TEXT PRIMARY KEY, stamp REAL, origin REAL, code INTEGER, class INTEGER, dest TEXT)"
+            )
+            connection.execute(
+                "CREATE INDEX entry_class_stamp ON entry (class, stamp)"
+            )
+            self.connection = connection
+        return self.connection
+
+    def lookup(self, path:str) -> Optional[Tuple[float, float, int]]:
+        "report (stamp, origin, class) of stored path"
+        if not self.count:
+            return None
+        return self.spill_base().execute(
+            "SELECT stamp, origin, class FROM entry WHERE path=?", (path,),
+        ).fetchone()
+
+    def store(self,
+            path:str,
+            stamp:float,
+            origin:float,
+            code:int,
+            priority_class:int,
+            dest_path:Optional[str],
+        ) -> None:
+        "insert or replace entry"
+        connection = self.spill_base()
+        present = connection.execute("SELECT 1 FROM entry WHERE path=?", (path,)).fetchone()
+        connection.execute(
+            "INSERT OR REPLACE INTO entry (path, stamp, origin, code, class, dest) VALUES (?, ?, ?, ?, ?, ?)",
+            (path, stamp, origin, code, priority_class, dest_path or None),
+        )
+        if present is None:
+            self.count += 1
+
+    def remove(self, path:str) -> Optional[Tuple[float, float, int, int, Optional[str]]]:
+        "remove entry, report (stamp, origin, code, class, dest)"
+        if not self.count:
+            return None
+        connection = self.spill_base()
+        row = connection.execute(
+            "SELECT stamp, origin, code, class, dest FROM entry WHERE path=?", (path,),
+        ).fetchone()
+        if row is not None:
+            connection.execute("DELETE FROM entry WHERE path=?", (path,))
+            self.count -= 1
+            self.spill_reset()
+        return row
+
+    def expire_list(self, priority_class:int, deadline:float, limit:int) -> List[tuple]:
+        "remove settled entries of the class, report (path, stamp, origin, code, dest)"
+        if not self.count or limit <= 0:
+            return []
+        connection = self.spill_base()
+        row_list = connection.execute(
+            "SELECT path, stamp, origin, code, dest FROM entry WHERE class=? AND stamp<? ORDER BY stamp LIMIT ?",
+            (priority_class, deadline, limit),
+        ).fetchall()
+        connection.executemany("DELETE FROM entry WHERE path=?", [(row[0],) for row in row_list])
+        self.count -= len(row_list)
+        self.spill_reset()
+        return row_list
+
+    def oldest_stamp(self) -> Optional[float]:
+        "earliest settle stamp of stored entries"
+        if not self.count:
+            return None
+        return self.spill_base().execute("SELECT MIN(stamp) FROM entry").fetchone()[0]
+
+    def spill_reset(self) -> None:
+        "release disk space once drained"
+        if not self.count and self.connection is not None:
+            self.connection.close()
+            self.connection = None
+
+
+class PendingStore:
+    "postponed file events keyed by path, in a compact layout"
+    "path is split into interned folder and file name, record fields live in per class arrays"
+    "entries above memory limit spill to disk, events are rebuilt when settled"
+
+    compact_minimum = 4096  # free head slots before queue compaction
+
+    def __init__(self,
+            pending_config:PendingConfig=None,
+        ):
+        self.pending_config = pending_config or PendingConfig.default()
+        self.pending_spill = PendingSpill(self.pending_config.pending_spill_path)
+        self.queue_list = [PendingQueue() for _ in PriorityClass.class_list]
+        self.dir_index = dict()  # folder path -> folder id
+        self.dir_list = []  # folder id -> folder path
+        self.name_dict_list = []  # folder id -> file name -> record location
+
+    def __len__(self) -> int:
+        return self.memory_count() + len(self.pending_spill)
+
+    def __contains__(self, path:str) -> bool:
+        return self.lookup(path) is not None
+
+    def memory_count(self) -> int:
+        return sum(len(queue) for queue in self.queue_list)
+
+    def reconfigure(self) -> List[str]:
+        "re-read configuration, report changed fields, spill path applies once spill is drained"
+        pending_config = PendingConfig.default()
+        change_list = ConfigSupport.change_list(self.pending_config, pending_config)
+        self.pending_config = pending_config
+        if not len(self.pending_spill):
+            self.pending_spill = PendingSpill(pending_config.pending_spill_path)
+        return change_list
+
+    def path_split(self, path:str) -> Tuple[int, str]:
+        "produce (folder id, file name), intern the folder"
+        dir_path, _, name = path.rpartition(os.sep)
+        dir_id = self.dir_index.get(dir_path)
+        if dir_id is None:
+            dir_id = len(self.dir_list)
+            self.dir_index[dir_path] = dir_id
+            self.dir_list.append(dir_path)
+            self.name_dict_list.append(dict())
+        return (dir_id, name)
+
+    def location(self, path:str) -> Optional[int]:
+        "find in memory record location: slot * 4 + class"
+        dir_path, _, name = path.rpartition(os.sep)
+        dir_id = self.dir_index.get(dir_path)
+        if dir_id is None:
+            return None
+        return self.name_dict_list[dir_id].get(name)
+
+    def lookup(self, path:str) -> Optional[Tuple[float, float, int]]:
+        "report (stamp, origin, priority class) of pending path"
+        location = self.location(path)
+        if location is None:
+            return self.pending_spill.lookup(path)
+        queue = self.queue_list[location & 3]
+        slot = location >> 2
+        return (queue.stamp_array[slot], queue.origin_array[slot], location & 3)
+
+    def store(self,
+            event:events.FileSystemEvent,
+            stamp:float,
+            origin:float,
+            priority_class:int,
+        ) -> None:
+        "insert or replace pending event of the path"
+        "record with unchanged stamp and class is updated in place, otherwise it moves to the queue tail"
+        "so that each queue stays ordered by stamp, except for retry backoff entries"
+        "caller gives moved record a stamp not older than the entries already queued"
+        path = event.src_path
+        code = PendingCode.event_code(event)
+        dest_path = getattr(event, "dest_path", None) or None
+        location = self.location(path)
+        if location is not None:
+            queue = self.queue_list[location & 3]
+            slot = location >> 2
+            if (location & 3) == priority_class and queue.stamp_array[slot] == stamp:
+                queue.origin_array[slot] = origin
+                queue.code_array[slot] = code
+                queue.dest_dict.pop(slot, None)
+                if dest_path:
+                    queue.dest_dict[slot] = dest_path
+                return
+            self.record_remove(location)
+        elif self.pending_spill.lookup(path) is not None or \
+                self.memory_count() >= self.pending_config.pending_spill_limit:
+            self.pending_spill.store(path, stamp, origin, code, priority_class, dest_path)
+            return
+        dir_id, name = self.path_split(path)
+        slot = self.queue_list[priority_class].append(stamp, origin, code, dir_id, name, dest_path)
+        self.name_dict_list[dir_id][name] = (slot << 2) | priority_class
+
+    def pop(self, path:str) -> Optional[EventEntry]:
+        "remove pending event of the path"
+        location = self.location(path)
+        if location is None:
+            row = self.pending_spill.remove(path)
+            if row is None:
+                return None
+            stamp, origin, code, priority_class, dest_path = row
+            return EventEntry(stamp, origin, PendingCode.event_build(code, path, dest_path), priority_class)
+        event_entry = self.entry_build(location)
+        self.record_remove(location)
+        return event_entry
+
+    def entry_build(self, location:int) -> EventEntry:
+        "rebuild postponed event from the record"
+        priority_class = location & 3
+        slot = location >> 2
+        queue = self.queue_list[priority_class]
+        path = self.dir_list[queue.dir_array[slot]] + os.sep + queue.name_list[slot]
+        event = PendingCode.event_build(queue.code_array[slot], path, queue.dest_dict.get(slot))
+        return EventEntry(queue.stamp_array[slot], queue.origin_array[slot], event, priority_class)
+
+    def record_remove(self, location:int) -> None:
+        "free the record and its name entry"
+        queue = self.queue_list[location & 3]
+        slot = location >> 2
+        del self.name_dict_list[queue.dir_array[slot]][queue.name_list[slot]]
+        queue.remove(slot)
+        if not self.memory_count() and not len(self.pending_spill):
+            self.clear()
+
+    def clear(self) -> None:
+        "drop all records and interned folders"
+        self.queue_list = [PendingQueue() for _ in PriorityClass.class_list]
+        self.dir_index = dict()
+        self.dir_list = []
+        self.name_dict_list = []
+
+    def expire_list(self, current:float, timeout:float, limit:int) -> List[EventEntry]:
+        "remove and rebuild settled events, by class, then by stamp order"
+        entry_list = []
+        deadline = current - timeout
+        for priority_class, queue in enumerate(self.queue_list):
+            code_array = queue.code_array
+            stamp_array = queue.stamp_array
+            slot = queue.head
+            has_advance = True
+            while slot < len(code_array) and len(entry_list) < limit:
+                if code_array[slot] == PendingQueue.code_free:
+                    pass
+                elif stamp_array[slot] < deadline:
+                    location = (slot << 2) | priority_class
+                    entry_list.append(self.entry_build(location))
+                    self.record_remove(location)
+                    if queue is not self.queue_list[priority_class]:  # store was cleared
+                        break
+                elif stamp_array[slot] > current:
+                    has_advance = False  # retry backoff entry, look past it
+                else:
+                    break  # later entries are younger
+                if has_advance:
+                    queue.head = slot + 1
+                slot += 1
+            self.queue_compact(priority_class)
+            for path, stamp, origin, code, dest_path in self.pending_spill.expire_list(
+                    priority_class, deadline, limit - len(entry_list),
+                ):
+                event = PendingCode.event_build(code, path, dest_path)
+                entry_list.append(EventEntry(stamp, origin, event, priority_class))
+        return entry_list
+
+    def oldest_stamp(self) -> Optional[float]:
+        "earliest settle stamp of pending entries, linear scan for diagnostics"
+        stamp_list = [
+            min((
+                stamp
+                for stamp, code in zip(queue.stamp_array[queue.head:], queue.code_array[queue.head:])
+                if code != PendingQueue.code_free
+            ), default=None)
+            for queue in self.queue_list
+        ]
+        stamp_list.append(self.pending_spill.oldest_stamp())
+        return min((stamp for stamp in stamp_list if stamp is not None), default=None)
+
+    def queue_compact(self, priority_class:int) -> None:
+        "reclaim free head of the queue once it dominates"
+        queue = self.queue_list[priority_class]
+        if queue.head < self.compact_minimum or queue.head * 2 < len(queue.code_array):
+            return
+        for slot in queue.compact():
+            name_dict = self.name_dict_list[queue.dir_array[slot]]
+            name_dict[queue.name_list[slot]] = (slot << 2) | priority_class
@@ -0,0 +1,344 @@
+"""
+dry run sync planner with diff report
+"""
+
+import os
+import sys
+import json
+import queue
+import logging
+import argparse
+import threading
+import itertools
+import dataclasses
+
+from dataclasses import dataclass
+from dataclasses import field
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict
+from typing import Iterator
+from typing import List
+from typing import Optional
+from typing import Tuple
+
+from file_sync_s3.config import CONFIG
+from file_sync_s3.aws_s3 import BucketOperatorS3, MetaEntryS3, SupportFuncS3
+from file_sync_s3.layout import KeyLayout
+from file_sync_s3.route import ObjectRouter
+from file_sync_s3.watcher import FolderConfig, FolderVisitor
+
+logger = logging.getLogger(__name__)
+
+frozen = dataclass(frozen=True)
+
+
+@frozen
+class PlanConfig:
+    "sync planner params"
+
+    config_entry = "folder/plan"
+
+    plan_bandwidth:int  # transfer bandwidth used for estimate, bytes per second
+    plan_latency:float  # single request round trip used for estimate, seconds
+    plan_queue_size:int  # entries buffered between tree walk, remot listing and merge
+    plan_head_verify:bool  # compare matched entries by object meta, with per object head request
+
+    @classmethod
+    def default(cls) -> "PlanConfig":
+        ""
+        section = CONFIG[cls.config_entry]
+        return PlanConfig(
+            plan_bandwidth=section['plan_bandwidth@int'],
+            plan_latency=section['plan_latency@float'],
+            plan_queue_size=section['plan_queue_size@int'],
+            plan_head_verify=section['plan_head_verify@bool'],
+        )
+
+
+class PlanAction:
+    "diff outcome for a single entry"
+
+    upload = "upload"  # local file is missing or stale in remot
+    skip = "skip"  # remot object matches local file
+    delete = "delete"  # remot object has no local file
+    conflict = "conflict"  # remot object differs and is newer than local file, upload would overwrite it
+
+    action_list = (upload, skip, delete, conflict)
+
+
+@dataclass
+class PlanReport:
+    "diff totals with estimated duration"
+
+    count_dict:Dict[str, int] = field(default_factory=lambda: dict.fromkeys(PlanAction.action_list, 0))
+    bytes_dict:Dict[str, int] = field(default_factory=lambda: dict.fromkeys(PlanAction.action_list, 0))
+    estimate_seconds:float = 0.0
+
+    def record(self, action:str, size:int) -> None:
+        self.count_dict[action] += 1
+        self.bytes_dict[action] += size
+
+    def report_json(self) -> str:
+        return json.dumps(dict(
+            count=self.count_dict,
+            bytes=self.bytes_dict,
+            estimate_seconds=round(self.estimate_seconds, 1),
+        ))
+
+    def report_text(self) -> str:
+        line_list = [f"{'action':10} {'count':>14} {'bytes':>20}"]
+        for action in PlanAction.action_list:
+            line_list.append(f"{action:10} {self.count_dict[action]:>14,} {self.bytes_dict[action]:>20,}")
+        line_list.append(f"estimate: {self.estimate_seconds:,.0f} seconds")
+        return "\n".join(line_list)
+
+
+class SupportFuncPlan:
+    "sorted streams and their merge"
+
+    stream_batch = 1024  # entries per queue transfer
+    stream_finish = object()
+
+    @classmethod
+    def sorted_walk(cls, folder_path:str, recursive:bool) -> Iterator[Tuple[str, os.stat_result]]:
+        "walk folder with scandir in remot key order: (relative key, stat)"
+        "folder is ordered as its name with trailing slash, so walk order is key order"
+        "memory is bounded by the open folder listings along a single branch"
+
+        def sorted_listing(dir_path:str) -> Iterator[Tuple[str, os.DirEntry]]:
+            try:
+                with os.scandir(dir_path) as entry_iter:
+                    entry_list = [
+                        (entry.name + "/" if entry.is_dir(follow_symlinks=False) else entry.name, entry)
+                        for entry in entry_iter
+                    ]
+            except OSError as error:
+                logger.warning(f"skip: {dir_path} {error}")
+                return iter(())
+            entry_list.sort(key=lambda pair: pair[0])
+            return iter(entry_list)
+
+        stack_list = [("", sorted_listing(folder_path))]
+        while stack_list:
+            base_key, entry_iter = stack_list[-1]
+            pair = next(entry_iter, None)
+            if pair is None:
+                stack_list.pop()
+                continue
+            name, entry = pair
+            if name.endswith("/"):
+                if recursive:
+                    stack_list.append((base_key + name, sorted_listing(entry.path)))
+            elif entry.is_file():
+                try:
+                    yield (base_key + name, entry.stat())
+                except OSError:
+                    continue
+
+    @classmethod
+    def stream_thread(cls, entry_iter:Iterator, queue_size:int, name:str) -> Iterator:
+        "produce entries on a separate thread, consume through a bounded queue"
+
+        entry_queue = queue.Queue(maxsize=max(1, queue_size // cls.stream_batch))
+
+        def produce() -> None:
+            try:
+                while True:
+                    batch_list = list(itertools.islice(entry_iter, cls.stream_batch))
+                    if not batch_list:
+                        break
+                    entry_queue.put(batch_list)
+                entry_queue.put(cls.stream_finish)
+            except BaseException as error:
+                entry_queue.put(error)
+
+        threading.Thread(target=produce, name=name, daemon=True).start()
+        while True:
+            batch_list = entry_queue.get()
+            if batch_list is cls.stream_finish:
+                return
+            if isinstance(batch_list, BaseException):
+                raise batch_list
+            yield from batch_list
+
+    @classmethod
+    def merge_join(cls,
+            local_iter:Iterator[Tuple[str, os.stat_result]],
+            remot_iter:Iterator[Tuple[str, int, "datetime"]],
+        ) -> Iterator[Tuple[str, Optional[os.stat_result], Optional[Tuple[str, int, "datetime"]]]]:
+        "full outer join of two key ordered streams: (key, local entry, remot entry)"
+        local_entry = next(local_iter, None)
+        remot_entry = next(remot_iter, None)
+        while local_entry is not None or remot_entry is not None:
+            if remot_entry is None or (local_entry is not None and local_entry[0] < remot_entry[0]):
+                yield (local_entry[0], local_entry[1], None)
+                local_entry = next(local_iter, None)
+            elif local_entry is None or remot_entry[0] < local_entry[0]:
+                yield (remot_entry[0], None, remot_entry)
+                remot_entry = next(remot_iter, None)
+            else:
+                yield (local_entry[0], local_entry[1], remot_entry)
+                local_entry = next(local_iter, None)
+                remot_entry = next(remot_iter, None)
+
+
+class SyncPlanner(FolderVisitor):
+    "compare local folder with remot listing without any transfer"
+
+    def __init__(self,
+            folder_config:FolderConfig=None,
+            bucket_operator:BucketOperatorS3=None,
+            key_layout:KeyLayout=None,
+            object_router:ObjectRouter=None,
+            plan_config:PlanConfig=None,
+            transfer_concurrency:int=1,
+        ):
+        FolderVisitor.__init__(self, folder_config)
+        self.bucket_operator = bucket_operator or BucketOperatorS3()
+        self.key_layout = key_layout or KeyLayout()
+        self.object_router = object_router or ObjectRouter()
+        self.plan_config = plan_config or PlanConfig.default()
+        self.transfer_concurrency = transfer_concurrency
+
+    def key_prefix_list(self) -> List[str]:
+        "routed key prefixes, each one is planned with its own merge"
+        return self.object_router.key_prefix_list()
+
+    def local_scan(self, key_prefix:str) -> Iterator[Tuple[str, os.stat_result]]:
+        "matching local files routed into the key prefix, in plain key order"
+        folder_path = self.folder_config.folder_path
+        for relative_key, file_stat in SupportFuncPlan.sorted_walk(folder_path, self.folder_config.watcher_recursive):
+            local_path = os.path.join(folder_path, relative_key)
+            if self.has_regex_name(local_path) and self.object_router.key_prefix(local_path) == key_prefix:
+                yield (relative_key, file_stat)
+
+    def remot_scan(self, key_prefix:str) -> Iterator[Tuple[str, int, "datetime"]]:
+        "remot objects under the key prefix, relative to it, in plain key order"
+        other_list = [prefix for prefix in self.key_prefix_list() if prefix and prefix != key_prefix]
+        for plain_key, size, last_modified in self.key_layout.remot_scan(self.bucket_operator, key_prefix):
+            if key_prefix == "" and any(plain_key.startswith(prefix) for prefix in other_list):
+                continue  # belongs to another routed prefix
+            yield (plain_key[len(key_prefix):], size, last_modified)
+
+    def plan_scan(self) -> Iterator[Tuple[str, str, int]]:
+        "diff local folder against remot listing: (action, plain key, size)"
+        queue_size = self.plan_config.plan_queue_size
+        for key_prefix in self.key_prefix_list():
+            local_iter = SupportFuncPlan.stream_thread(self.local_scan(key_prefix), queue_size, "plan_local")
+            remot_iter = SupportFuncPlan.stream_thread(self.remot_scan(key_prefix), queue_size, "plan_remot")
+            join_iter = SupportFuncPlan.merge_join(local_iter, remot_iter)
+            if self.plan_config.plan_head_verify:
+                join_iter = self.head_resolve(join_iter, key_prefix)
+            for relative_key, local_stat, remot_entry in join_iter:
+                action, size = self.entry_action(relative_key, local_stat, remot_entry)
+                if action is not None:
+                    yield (action, key_prefix + relative_key, size)
+
+    def head_resolve(self, join_iter:Iterator, key_prefix:str) -> Iterator:
+        "attach remot meta from concurrent head requests, in bounded chunks"
+
+        def resolve(join_entry:tuple) -> tuple:
+            relative_key, local_stat, remot_entry = join_entry
+            if local_stat is None or remot_entry is None:
+                return join_entry
+            remot_meta = self.bucket_operator.remot_meta(self.key_layout.remot_key(key_prefix + relative_key))
+            return (relative_key, local_stat, remot_entry + (remot_meta,))
+
+        with ThreadPoolExecutor(self.bucket_operator.config_transfer.max_concurrency) as executor:
+            while True:
+                chunk_list = list(itertools.islice(join_iter, SupportFuncPlan.stream_batch))
+                if not chunk_list:
+                    return
+                yield from executor.map(resolve, chunk_list)
+
+    def entry_action(self,
+            relative_key:str,
+            local_stat:Optional[os.stat_result],
+            remot_entry:Optional[tuple],
+        ) -> Tuple[Optional[str], int]:
+        "classify joined entry, as the service would treat it: (action, size)"
+        if remot_entry is None:
+            return (PlanAction.upload, local_stat.st_size)
+        remot_size, last_modified = remot_entry[1], remot_entry[2]
+        if local_stat is None:
+            local_path = os.path.join(self.folder_config.folder_path, relative_key)
+            if not self.has_regex_name(local_path):
+                return (None, 0)  # foreign object, service does not touch it
+            if "/" in relative_key and not self.folder_config.watcher_recursive:
+                return (None, 0)
+            return (PlanAction.delete, remot_size)
+        local_meta = MetaEntryS3(
+            length=local_stat.st_size,
+            modified=SupportFuncS3.convert_unix_time(local_stat.st_mtime),
+        )
+        local_newer = local_stat.st_mtime > last_modified.timestamp()
+        if len(remot_entry) > 3:  # head verified: same meta rule as resource_put_sync
+            remot_meta = remot_entry[3]
+            if remot_meta == local_meta:
+                return (PlanAction.skip, local_stat.st_size)
+            if not local_newer and remot_meta.length != local_meta.length:
+                return (PlanAction.conflict, local_stat.st_size)
+            return (PlanAction.upload, local_stat.st_size)
+        if local_newer:
+            return (PlanAction.upload, local_stat.st_size)  # local file changed after upload
+        if remot_size == local_meta.length:
+            return (PlanAction.skip, local_stat.st_size)
+        if self.bucket_operator.dedup_index.has_pointer() and remot_size == 0:
+            return (PlanAction.skip, local_stat.st_size)  # dedup pointer object, listing size is not content size
+        if self.bucket_operator.sparse_config.sparse_enable and remot_size < local_meta.length and \
+                remot_size <= local_stat.st_blocks * 512:
+            return (PlanAction.skip, local_stat.st_size)  # packed sparse object, listing size is data size
+        return (PlanAction.conflict, local_stat.st_size)
+
+    def plan_report(self, entry_iter:Iterator[Tuple[str, str, int]]=None) -> PlanReport:
+        "diff totals with duration estimate at configured bandwidth and concurrency"
+        plan_report = PlanReport()
+        for action, _, size in entry_iter or self.plan_scan():
+            plan_report.record(action, size)
+        transfer_bytes = plan_report.bytes_dict[PlanAction.upload] + plan_report.bytes_dict[PlanAction.conflict]
+        request_count = sum(plan_report.count_dict[action] for action in (PlanAction.upload, PlanAction.conflict, PlanAction.delete))
+        plan_report.estimate_seconds = \
+            transfer_bytes / self.plan_config.plan_bandwidth + \
+            request_count * self.plan_config.plan_latency / max(1, self.transfer_concurrency)
+        return plan_report
+
+
+def plan_main(argument_list:List[str]=None) -> int:
+    "planner invocation"
+
+    from file_sync_s3.service import setup_logger
+    from file_sync_s3.aio_s3 import EngineConfig
+
+    parser = argparse.ArgumentParser(description="dry run sync planner")
+    parser.add_argument("--json", action="store_true", help="report totals as json")
+    parser.add_argument("--entry", action="store_true", help="report every planned action")
+    parser.add_argument("--head", action="store_true", help="compare matched entries by object meta with head requests")
+    argument = parser.parse_args(argument_list)
+
+    setup_logger()
+
+    engine_config = EngineConfig.default()
+    transfer_concurrency = engine_config.engine_concurrency if engine_config.has_asyncio() else 1
+    plan_config = PlanConfig.default()
+    if argument.head:
+        plan_config = dataclasses.replace(plan_config, plan_head_verify=True)
+
+    sync_planner = SyncPlanner(plan_config=plan_config, transfer_concurrency=transfer_concurrency)
+
+    def entry_report(entry_iter:Iterator[Tuple[str, str, int]]) -> Iterator[Tuple[str, str, int]]:
+        for action, plain_key, size in entry_iter:
+            if action != PlanAction.skip:
+                print(f"{action:10} {size:>16,} {plain_key}")
+            yield (action, plain_key, size)
+
+    entry_iter = sync_planner.plan_scan()
+    if argument.entry:
+        entry_iter = entry_report(entry_iter)
+    plan_report = sync_planner.plan_report(entry_iter)
+    print(plan_report.report_json() if argument.json else plan_report.report_text())
+
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(plan_main())
@@ -0,0 +1,200 @@
+"""
+aggregated transfer progress reporting
+"""
+
+import json
+import time
+import logging
+import threading
+import contextlib
+import collections
+
+from dataclasses import dataclass
+from typing import Iterator
+from typing import List
+from typing import Optional
+
+from watchdog.utils import BaseThread
+
+from file_sync_s3.config import CONFIG
+from file_sync_s3.config import ConfigSupport
+
+logger = logging.getLogger(__name__)
+
+frozen = dataclass(frozen=True)
+
+override = lambda function : function
+
+
+@frozen
+class ProgressConfig:
+    "transfer progress params"
+
+    config_entry = "amazon/progress"
+
+    progress_mode:str  # none, text, json
+    progress_interval:float  # reporter sampling period, seconds
+
+    mode_none = "none"  # counters are kept, nothing is reported
+    mode_text = "text"  # single log line per interval
+    mode_json = "json"  # single json object per interval, for dashboards
+
+    @classmethod
+    def default(cls) -> "ProgressConfig":
+        ""
+        section = CONFIG[cls.config_entry]
+        return ProgressConfig(
+            progress_mode=section['progress_mode'],
+            progress_interval=section['progress_interval@float'],
+        )
+
+    def has_enable(self) -> bool:
+        return self.progress_mode != self.mode_none
+
+
+class ProgressCounter:
+    "byte counter of a single transfer, used as transfer callback"
+    "lock free: every thread adds into its own slot, reporter sums the slots"
+
+    __slots__ = ("transfer_name", "total_size", "slot_dict")
+
+    def __init__(self, transfer_name:str, total_size:int):
+        self.transfer_name = transfer_name
+        self.total_size = total_size
+        self.slot_dict = dict()  # thread ident -> bytes
+
+    def __call__(self, block_size:int) -> None:
+        ident = threading.get_ident()
+        self.slot_dict[ident] = self.slot_dict.get(ident, 0) + block_size
+
+    def wired_size(self) -> int:
+        return sum(list(self.slot_dict.values()))
+
+
+@frozen
+class ProgressSample:
+    "aggregated progress at sample time"
+
+    wired_bytes:int  # transferred since start
+    byte_rate:float  # bytes per second over last interval
+    active_count:int  # transfers in flight
+    finish_count:int  # transfers completed since start
+    remain_bytes:int  # left to transfer for transfers in flight
+    eta_seconds:Optional[float]  # for transfers in flight, at current rate
+
+    def report_json(self) -> str:
+        return json.dumps(dict(
+            wired_bytes=self.wired_bytes,
+            byte_rate=round(self.byte_rate, 1),
+            active_count=self.active_count,
+            finish_count=self.finish_count,
+            remain_bytes=self.remain_bytes,
+            eta_seconds=None if self.eta_seconds is None else round(self.eta_seconds, 1),
+        ))
+
+    def report_text(self) -> str:
+        eta_text = "-" if self.eta_seconds is None else f"{self.eta_seconds:,.0f}s"
+        return \
+            f"rate={self.byte_rate / 1048576:,.2f}MiB/s active={self.active_count} " \
+            f"remain={self.remain_bytes:,} eta={eta_text} " \
+            f"finish={self.finish_count} wired={self.wired_bytes:,}"
+
+
+class ProgressTracker(BaseThread):
+    "registry of transfers in flight, sampled by a single reporter thread"
+
+    def __init__(self,
+            progress_config:ProgressConfig=None,
+        ):
+        BaseThread.__init__(self)
+        self.name = "progress_tracker"
+        self.progress_config = progress_config or ProgressConfig.default()
+        self.active_dict = dict()  # counter id -> counter
+        self.finish_deque = collections.deque()  # completed counters, drained by running sampler
+        self.finish_lock = threading.Lock()
+        self.finish_bytes = 0
+        self.finish_count = 0
+        self.past_bytes = 0
+        self.past_time = time.monotonic()
+        self.start_lock = threading.Lock()
+
+    def reconfigure(self) -> List[str]:
+        "re-read configuration, report changed fields"
+        progress_config = ProgressConfig.default()
+        change_list = ConfigSupport.change_list(self.progress_config, progress_config)
+        self.progress_config = progress_config
+        return change_list
+
+    @contextlib.contextmanager
+    def transfer(self, transfer_name:str, total_size:int) -> Iterator[ProgressCounter]:
+        "track transfer for the duration of the context"
+        self.ensure_start()
+        progress_counter = ProgressCounter(transfer_name, total_size)
+        self.active_dict[id(progress_counter)] = progress_counter
+        try:
+            yield progress_counter
+        finally:
+            del self.active_dict[id(progress_counter)]
+            if self.is_alive() and not self.stopped_event.is_set():
+                self.finish_deque.append(progress_counter)
+            else:  # no sampler to drain the deque, when disabled or stopped
+                self.finish_fold(progress_counter)
+
+    def finish_fold(self, progress_counter:ProgressCounter) -> None:
+        "add completed transfer into totals"
+        with self.finish_lock:
+            self.finish_bytes += progress_counter.wired_size()
+            self.finish_count += 1
+
+    def ensure_start(self) -> None:
+        "reporter starts with the first transfer"
+        if self.is_alive() or self.stopped_event.is_set() or not self.progress_config.has_enable():
+            return
+        with self.start_lock:
+            if not self.is_alive() and not self.stopped_event.is_set():
+                self.start()
+
+    def sample(self) -> ProgressSample:
+        "aggregate counters, must be called from a single thread"
+        while self.finish_deque:
+            self.finish_fold(self.finish_deque.popleft())
+        active_list = list(self.active_dict.values())
+        active_bytes = 0
+        remain_bytes = 0
+        for progress_counter in active_list:
+            wired_size = progress_counter.wired_size()
+            active_bytes += wired_size
+            remain_bytes += max(0, progress_counter.total_size - wired_size)
+        wired_bytes = self.finish_bytes + active_bytes
+        current = time.monotonic()
+        byte_rate = (wired_bytes - self.past_bytes) / max(current - self.past_time, 1e-6)
+        self.past_bytes = wired_bytes
+        self.past_time = current
+        return ProgressSample(
+            wired_bytes=wired_bytes,
+            byte_rate=byte_rate,
+            active_count=len(active_list),
+            finish_count=self.finish_count,
+            remain_bytes=remain_bytes,
+            eta_seconds=remain_bytes / byte_rate if byte_rate > 0 else None,
+        )
+
+    def report(self, progress_sample:ProgressSample) -> None:
+        if self.progress_config.progress_mode == ProgressConfig.mode_json:
+            logger.info(progress_sample.report_json())
+        elif self.progress_config.progress_mode == ProgressConfig.mode_text:
+            logger.info(progress_sample.report_text())
+
+    @override
+    def run(self) -> None:
+        "periodic sampling, idle intervals are not reported"
+        past_sample = None
+        while not self.stopped_event.wait(self.progress_config.progress_interval):
+            try:
+                progress_sample = self.sample()
+                if past_sample is None or progress_sample.active_count or past_sample.active_count or \
+                        progress_sample.wired_bytes != past_sample.wired_bytes:
+                    self.report(progress_sample)
+                past_sample = progress_sample
+            except Exception as error:
+                logger.error(f"failure: {error}")
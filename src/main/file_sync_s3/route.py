@@ -0,0 +1,175 @@
+"""
+rule based object settings routing
+"""
+
+import re
+import logging
+import functools
+import mimetypes
+
+from dataclasses import dataclass
+from typing import Dict
+from typing import List
+from typing import Optional
+from typing import Tuple
+
+from file_sync_s3.config import CONFIG
+from file_sync_s3.config import ConfigSupport
+
+logger = logging.getLogger(__name__)
+
+frozen = dataclass(frozen=True)
+
+
+@frozen
+class RouteRule:
+    "upload settings for files matching the rule"
+
+    rule_name:str
+    regex_include_list:List[str]
+    regex_exclude_list:List[str]
+    storage_class:str  # empty for bucket default
+    content_type:str  # empty, auto (guess from file name), or explicit type
+    cache_control:str
+    sse_mode:str  # empty, AES256, aws:kms
+    sse_key_id:str  # kms key for aws:kms
+    key_prefix:str  # prepended to remot key
+
+    @classmethod
+    def from_section(cls, rule_name:str, section:dict) -> "RouteRule":
+        "produce rule from its config section, settings are optional"
+        return RouteRule(
+            rule_name=rule_name,
+            regex_include_list=section['regex_include@list'],
+            regex_exclude_list=section.get('regex_exclude@list', fallback=[]),
+            storage_class=section.get('storage_class', fallback=""),
+            content_type=section.get('content_type', fallback=""),
+            cache_control=section.get('cache_control', fallback=""),
+            sse_mode=section.get('sse_mode', fallback=""),
+            sse_key_id=section.get('sse_key_id', fallback=""),
+            key_prefix=section.get('key_prefix', fallback=""),
+        )
+
+
+@frozen
+class RouteConfig:
+    "object routing params, rules come from [amazon/route/<name>] sections in file order"
+
+    config_entry = "amazon/route"
+
+    route_cache_size:int
+    rule_list:Tuple[RouteRule, ...]
+
+    @classmethod
+    def default(cls) -> "RouteConfig":
+        ""
+        section = CONFIG[cls.config_entry]
+        rule_prefix = cls.config_entry + "/"
+        return RouteConfig(
+            route_cache_size=section['route_cache_size@int'],
+            rule_list=tuple(
+                RouteRule.from_section(name[len(rule_prefix):], CONFIG[name])
+                for name in CONFIG.sections() if name.startswith(rule_prefix)
+            ),
+        )
+
+
+class SupportFuncRoute:
+    "map between rule settings and request fields"
+
+    # boto3 argument -> http header
+    header_name_dict = {
+        "StorageClass": "x-amz-storage-class",
+        "ContentType": "content-type",
+        "CacheControl": "cache-control",
+        "ServerSideEncryption": "x-amz-server-side-encryption",
+        "SSEKMSKeyId": "x-amz-server-side-encryption-aws-kms-key-id",
+    }
+
+    @classmethod
+    def has_match(cls, file_path:str, include_list:List[re.Pattern], exclude_list:List[re.Pattern]) -> bool:
+        "match file path against include and exclude patterns"
+        if any(regex.match(file_path) for regex in exclude_list):
+            return False
+        return any(regex.match(file_path) for regex in include_list)
+
+    @classmethod
+    def content_type(cls, route_rule:RouteRule, local_path:str) -> str:
+        "resolve configured content type"
+        if route_rule.content_type == "auto":
+            content_type, _ = mimetypes.guess_type(local_path, strict=False)
+            return content_type or ""
+        return route_rule.content_type
+
+
+class ObjectRouter:
+    "select first matching rule for a file, decisions are cached per path"
+
+    def __init__(self,
+            route_config:RouteConfig=None,
+        ):
+        self.apply_config(route_config or RouteConfig.default())
+
+    def apply_config(self, route_config:RouteConfig) -> None:
+        "use route config and its regex matchers, drop cached decisions"
+        self.route_config = route_config
+        self.matcher_list = [
+            (
+                [re.compile(regex) for regex in route_rule.regex_include_list],
+                [re.compile(regex) for regex in route_rule.regex_exclude_list],
+            )
+            for route_rule in route_config.rule_list
+        ]
+        self.rule_find = functools.lru_cache(maxsize=route_config.route_cache_size)(self.rule_search)
+
+    def reconfigure(self) -> List[str]:
+        "re-read configuration, report changed fields"
+        route_config = RouteConfig.default()
+        change_list = ConfigSupport.change_list(self.route_config, route_config)
+        if change_list:
+            self.apply_config(route_config)
+        return change_list
+
+    def has_enable(self) -> bool:
+        return bool(self.route_config.rule_list)
+
+    def rule_search(self, local_path:str) -> Optional[RouteRule]:
+        "find first matching rule"
+        for route_rule, (include_list, exclude_list) in zip(self.route_config.rule_list, self.matcher_list):
+            if SupportFuncRoute.has_match(local_path, include_list, exclude_list):
+                return route_rule
+        return None
+
+    def key_prefix(self, local_path:str) -> str:
+        "remot key prefix for the file"
+        if not self.has_enable():
+            return ""
+        route_rule = self.rule_find(local_path)
+        return route_rule.key_prefix if route_rule else ""
+
+    def key_prefix_list(self) -> List[str]:
+        "every routed key prefix, with the empty one for unrouted files"
+        return sorted({""} | {route_rule.key_prefix for route_rule in self.route_config.rule_list})
+
+    def object_args(self, local_path:str) -> Dict[str, str]:
+        "upload settings for the file, as boto3 extra arguments"
+        if not self.has_enable():
+            return dict()
+        route_rule = self.rule_find(local_path)
+        if route_rule is None:
+            return dict()
+        object_args = dict(
+            StorageClass=route_rule.storage_class,
+            ContentType=SupportFuncRoute.content_type(route_rule, local_path),
+            CacheControl=route_rule.cache_control,
+            ServerSideEncryption=route_rule.sse_mode,
+            SSEKMSKeyId=route_rule.sse_key_id,
+        )
+        return {key: value for key, value in object_args.items() if value}
+
+    def object_headers(self, local_path:str) -> Dict[str, str]:
+        "upload settings for the file, as request headers"
+        return {
+            SupportFuncRoute.header_name_dict[key]: value
+            for key, value in self.object_args(local_path).items()
+        }
@@ -0,0 +1,111 @@
+"""
+priority aware transfer scheduling
+"""
+
+import heapq
+import itertools
+import logging
+import threading
+import time
+
+from dataclasses import dataclass
+from typing import Any
+from typing import List
+from typing import Optional
+from typing import Tuple
+
+from file_sync_s3.config import CONFIG
+from file_sync_s3.config import ConfigSupport
+
+logger = logging.getLogger(__name__)
+
+frozen = dataclass(frozen=True)
+
+
+class PriorityClass:
+    "transfer priority classes, lower value is served first"
+
+    live = 0  # file watcher events
+    init = 1  # initial and reconcile sync
+    keeper = 2  # keeper driven expiration
+
+    class_list = (live, init, keeper)
+
+
+@frozen
+class ScheduleConfig:
+    "transfer scheduler params"
+
+    config_entry = "folder/schedule"
+
+    schedule_aging_rate:int  # bytes per second of waiting, which offset job size
+    schedule_slice:float  # seconds of transfer work between pending event scans
+
+    @classmethod
+    def default(cls) -> "ScheduleConfig":
+        ""
+        section = CONFIG[cls.config_entry]
+        return ScheduleConfig(
+            schedule_aging_rate=section['schedule_aging_rate@int'],
+            schedule_slice=section['schedule_slice@float'],
+        )
+
+
+class TransferScheduler:
+    "per class queues with shortest-job-first and aging"
+    "job key is virtual start time: submit time + size / aging rate"
+    "so that short jobs go first, but long jobs eventually age to the front"
+
+    def __init__(self,
+            schedule_config:ScheduleConfig=None,
+        ):
+        self.schedule_config = schedule_config or ScheduleConfig.default()
+        self.queue_lock = threading.Lock()
+        self.heap_list = [list() for _ in PriorityClass.class_list]
+        self.entry_dict = dict()  # job path -> (priority class, sequence) of current job
+        self.sequence = itertools.count()
+
+    def __len__(self) -> int:
+        return len(self.entry_dict)
+
+    def reconfigure(self) -> List[str]:
+        "re-read configuration, report changed fields"
+        schedule_config = ScheduleConfig.default()
+        change_list = ConfigSupport.change_list(self.schedule_config, schedule_config)
+        self.schedule_config = schedule_config
+        return change_list
+
+    def job_key(self, job_size:int, stamp:float) -> float:
+        "virtual start time of the job"
+        return stamp + job_size / self.schedule_config.schedule_aging_rate
+
+    def submit(self,
+            job_path:str,
+            job_item:Any,
+            priority_class:int,
+            job_size:int,
+            stamp:float=None,
+        ) -> None:
+        "enqueue job, replace pending job for the same path"
+        stamp = time.time() if stamp is None else stamp
+        with self.queue_lock:
+            present = self.entry_dict.get(job_path)
+            if present is not None:
+                priority_class = min(priority_class, present[0])
+            sequence = next(self.sequence)
+            self.entry_dict[job_path] = (priority_class, sequence)
+            heapq.heappush(
+                self.heap_list[priority_class],
+                (self.job_key(job_size, stamp), sequence, job_path, job_item),
+            )
+
+    def select(self) -> Optional[Tuple[str, Any]]:
+        "dequeue next job by class, then by virtual start time"
+        with self.queue_lock:
+            for priority_class, heap in enumerate(self.heap_list):
+                while heap:
+                    _, sequence, job_path, job_item = heapq.heappop(heap)
+                    if self.entry_dict.get(job_path) == (priority_class, sequence):
+                        del self.entry_dict[job_path]
+                        return (job_path, job_item)
+        return None
@@ -9,6 +9,8 @@ import threading
 
 from file_sync_s3.watcher import WatcherOperator
 
+logger = logging.getLogger(__name__)
+
 
 def setup_logger() -> None:
 
@@ -30,24 +32,62 @@ def service_main() -> int:
     watcher_operator = WatcherOperator()
 
     signum_list = [
-        signal.SIGHUP,
         signal.SIGINT,
         signal.SIGTERM,
-        signal.SIGUSR1,
-        signal.SIGUSR2,
     ]
 
     signal_event = threading.Event()
+    reload_event = threading.Event()
+    finish_event = threading.Event()
+    dump_event = threading.Event()
+    profile_event = threading.Event()
 
     def signal_reactor(signum, frame) -> None:
+        finish_event.set()
+        signal_event.set()
+
+    def reload_reactor(signum, frame) -> None:
+        reload_event.set()
+        signal_event.set()
+
+    def dump_reactor(signum, frame) -> None:
+        dump_event.set()
+        signal_event.set()
+
+    def profile_reactor(signum, frame) -> None:
+        profile_event.set()
         signal_event.set()
 
     for signum in signum_list:
         signal.signal(signum, signal_reactor)
 
+    signal.signal(signal.SIGHUP, reload_reactor)
+    signal.signal(signal.SIGUSR1, dump_reactor)  # live state dump
+    signal.signal(signal.SIGUSR2, profile_reactor)  # time boxed sampling profile
+
     watcher_operator.initiate()
 
-    signal_event.wait()
+    while not finish_event.is_set():
+        signal_event.wait()
+        signal_event.clear()
+        if reload_event.is_set() and not finish_event.is_set():
+            reload_event.clear()
+            try:
+                watcher_operator.reconfigure()
+            except Exception as error:
+                logger.error(f"reload failure: {error}")
+        if dump_event.is_set():
+            dump_event.clear()
+            try:
+                watcher_operator.diagnose_operator.state_dump()
+            except Exception as error:
+                logger.error(f"dump failure: {error}")
+        if profile_event.is_set():
+            profile_event.clear()
+            try:
+                watcher_operator.diagnose_operator.profile_start()
+            except Exception as error:
+                logger.error(f"profile failure: {error}")
 
     watcher_operator.terminate()
 
@@ -0,0 +1,163 @@
+"""
+consistent snapshot upload support for files still being written
+"""
+
+import os
+import re
+import logging
+
+from dataclasses import dataclass
+from typing import Optional
+
+from file_sync_s3.config import CONFIG
+
+logger = logging.getLogger(__name__)
+
+frozen = dataclass(frozen=True)
+
+
+@frozen
+class SnapshotConfig:
+    "upload snapshot params"
+
+    config_entry = "amazon/snapshot"
+
+    snapshot_mode:str  # none, stat, reflink
+    snapshot_path:str  # reflink clone folder, empty for file own folder
+
+    mode_none = "none"
+    mode_stat = "stat"
+    mode_reflink = "reflink"
+
+    @classmethod
+    def default(cls) -> "SnapshotConfig":
+        ""
+        section = CONFIG[cls.config_entry]
+        return SnapshotConfig(
+            snapshot_mode=section['snapshot_mode'],
+            snapshot_path=section['snapshot_path'],
+        )
+
+    def has_enable(self) -> bool:
+        return self.snapshot_mode != self.mode_none
+
+    def has_reflink(self) -> bool:
+        return self.snapshot_mode == self.mode_reflink
+
+
+@frozen
+class SnapshotStamp:
+    "file identity and version"
+
+    length:int
+    modified_ns:int
+    inode:int
+
+
+class SnapshotChangeError(RuntimeError):
+    "file changed while being transferred, transfer result must not be published"
+
+    def __init__(self, local_path:str):
+        super().__init__(f"file changed: {local_path}")
+        self.local_path = local_path
+
+
+class SnapshotSupport:
+    "file stamp and copy-on-write clone"
+
+    # linux/fs.h: _IOW(0x94, 9, int)
+    ioctl_FICLONE = 0x40049409
+
+    clone_regex = re.compile(r"[.].+[.][0-9]+[.]snapshot\Z")
+
+    @classmethod
+    def clone_name(cls, local_path:str) -> str:
+        "hidden clone file name, unique per process"
+        return f".{os.path.basename(local_path)}.{os.getpid()}.snapshot"
+
+    @classmethod
+    def has_clone_name(cls, file_path:str) -> bool:
+        "file is a clone of another file, never user content"
+        return cls.clone_regex.match(os.path.basename(file_path)) is not None
+
+    @classmethod
+    def stamp(cls, local_path:str) -> Optional[SnapshotStamp]:
+        "produce current file stamp, none for missing file"
+        try:
+            stat = os.stat(local_path)
+        except FileNotFoundError:
+            return None
+        return SnapshotStamp(
+            length=stat.st_size,
+            modified_ns=stat.st_mtime_ns,
+            inode=stat.st_ino,
+        )
+
+    @classmethod
+    def reflink_clone(cls, source_path:str, target_path:str) -> bool:
+        "produce copy-on-write clone of the file, report if supported"
+        try:
+            import fcntl
+            with open(source_path, "rb") as source_unit, open(target_path, "wb") as target_unit:
+                fcntl.ioctl(target_unit.fileno(), cls.ioctl_FICLONE, source_unit.fileno())
+            return True
+        except (ImportError, OSError) as error:
+            logger.info(f"no reflink: {error}")
+            if os.path.exists(target_path):
+                os.remove(target_path)
+            return False
+
+
+class SnapshotGuard:
+    "keep upload source consistent: clone the file or verify its stamp before publish"
+
+    def __init__(self,
+            snapshot_config:SnapshotConfig,
+            local_path:str,
+        ):
+        self.snapshot_config = snapshot_config
+        self.local_path = local_path
+        self.clone_path = None
+        self.stamp = None
+        if snapshot_config.has_enable():
+            self.stamp = SnapshotSupport.stamp(local_path)
+
+    def __enter__(self) -> "SnapshotGuard":
+        return self
+
+    def __exit__(self, *args) -> None:
+        self.close()
+
+    def has_verify(self) -> bool:
+        "transfer must call verify before it publishes the object"
+        return self.snapshot_config.has_enable() and self.clone_path is None
+
+    def source_path(self) -> str:
+        "provide upload source: immutable clone when supported, original file otherwise"
+        if not self.snapshot_config.has_reflink() or self.clone_path is not None:
+            return self.clone_path or self.local_path
+        folder_path = self.snapshot_config.snapshot_path or os.path.dirname(self.local_path)
+        os.makedirs(folder_path, exist_ok=True)
+        clone_path = os.path.join(folder_path, SnapshotSupport.clone_name(self.local_path))
+        if SnapshotSupport.reflink_clone(self.local_path, clone_path):
+            self.clone_path = clone_path
+            try:
+                self.verify_stamp()  # clone is consistent only when taken between equal stamps
+            except:
+                self.close()
+                raise
+        return self.clone_path or self.local_path
+
+    def verify(self) -> None:
+        "raise when the original file changed since the stamp, no-op for a clone"
+        if self.has_verify():
+            self.verify_stamp()
+
+    def verify_stamp(self) -> None:
+        if SnapshotSupport.stamp(self.local_path) != self.stamp:
+            raise SnapshotChangeError(self.local_path)
+
+    def close(self) -> None:
+        if self.clone_path is not None:
+            os.remove(self.clone_path)
+            self.clone_path = None
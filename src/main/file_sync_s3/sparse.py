@@ -0,0 +1,176 @@
+"""
+sparse file support: data extent discovery, packed upload body, hole preserving restore
+"""
+
+import io
+import os
+import bisect
+import errno
+import logging
+
+from dataclasses import dataclass
+from typing import List
+from typing import Optional
+from typing import Tuple
+
+from file_sync_s3.config import CONFIG
+
+logger = logging.getLogger(__name__)
+
+frozen = dataclass(frozen=True)
+
+override = lambda function : function
+
+
+@frozen
+class SparseConfig:
+    "sparse file params"
+
+    config_entry = "amazon/sparse"
+
+    sparse_enable:bool  # upload only data extents of files with holes, restore holes on download
+    sparse_minimum:int  # smallest total hole size, which makes file sparse, bytes
+    sparse_extent_limit:int  # most data extents kept in object meta, more extents fall back to dense
+
+    @classmethod
+    def default(cls) -> "SparseConfig":
+        ""
+        section = CONFIG[cls.config_entry]
+        return SparseConfig(
+            sparse_enable=section['sparse_enable@bool'],
+            sparse_minimum=section['sparse_minimum@int'],
+            sparse_extent_limit=section['sparse_extent_limit@int'],
+        )
+
+
+class SupportFuncSparse:
+    "data extent discovery"
+
+    @classmethod
+    def has_seek_data(cls) -> bool:
+        return hasattr(os, "SEEK_DATA") and hasattr(os, "SEEK_HOLE")
+
+    @classmethod
+    def extent_scan(cls, local_path:str, total_size:int) -> Optional[List[Tuple[int, int]]]:
+        "discover data extents: [(start, length)], none when file system does not report holes"
+        if not cls.has_seek_data():
+            return None
+        extent_list = []
+        with open(local_path, "rb") as file_unit:
+            file_fd = file_unit.fileno()
+            position = 0
+            while position < total_size:
+                try:
+                    start = os.lseek(file_fd, position, os.SEEK_DATA)
+                except OSError as error:
+                    if error.errno == errno.ENXIO:
+                        break  # only hole remains up to the end
+                    if error.errno == errno.EINVAL:
+                        return None
+                    raise
+                if start >= total_size:
+                    break
+                finish = min(os.lseek(file_fd, start, os.SEEK_HOLE), total_size)
+                extent_list.append((start, finish - start))
+                position = finish
+        return extent_list
+
+
+class SparseExtentMap:
+    "data extents of a file and their positions in the packed body"
+    "meta form: hex start+length pairs, terminated by zero length extent at total size"
+
+    def __init__(self, extent_list:List[Tuple[int, int]], total_size:int):
+        self.extent_list = [(start, length) for start, length in extent_list if length > 0]
+        self.total_size = total_size
+        self.packed_list = []  # extent index -> packed body offset
+        data_size = 0
+        for _, length in self.extent_list:
+            self.packed_list.append(data_size)
+            data_size += length
+        self.data_size = data_size
+
+    def __eq__(self, other:object) -> bool:
+        return isinstance(other, SparseExtentMap) and \
+            (self.extent_list, self.total_size) == (other.extent_list, other.total_size)
+
+    def hole_size(self) -> int:
+        return self.total_size - self.data_size
+
+    def encode(self) -> str:
+        return ",".join(
+            f"{start:x}+{length:x}" for start, length in self.extent_list + [(self.total_size, 0)]
+        )
+
+    @classmethod
+    def decode(cls, meta_text:str) -> "SparseExtentMap":
+        extent_list = []
+        for entry in meta_text.split(","):
+            start, _, length = entry.partition("+")
+            extent_list.append((int(start, 16), int(length, 16)))
+        total_size, _ = extent_list.pop()
+        return SparseExtentMap(extent_list, total_size)
+
+    def file_range_list(self, offset:int, length:int) -> List[Tuple[int, int]]:
+        "map packed body range into file ranges: [(file offset, length)]"
+        range_list = []
+        index = bisect.bisect_right(self.packed_list, offset) - 1
+        while length > 0 and 0 <= index < len(self.extent_list):
+            start, extent_length = self.extent_list[index]
+            skip = offset - self.packed_list[index]
+            size = min(length, extent_length - skip)
+            if size <= 0:
+                break  # range starts past packed body
+            range_list.append((start + skip, size))
+            offset += size
+            length -= size
+            index += 1
+        return range_list
+
+
+class SparseReader(io.RawIOBase):
+    "seekable file-like packed body: data extents back to back, holes left out"
+
+    def __init__(self, local_path:str, sparse_map:SparseExtentMap):
+        self.file_unit = open(local_path, "rb")
+        self.sparse_map = sparse_map
+        self.position = 0
+
+    @override
+    def readable(self) -> bool:
+        return True
+
+    @override
+    def seekable(self) -> bool:
+        return True
+
+    @override
+    def tell(self) -> int:
+        return self.position
+
+    @override
+    def seek(self, offset:int, whence:int=io.SEEK_SET) -> int:
+        if whence == io.SEEK_CUR:
+            offset += self.position
+        elif whence == io.SEEK_END:
+            offset += self.sparse_map.data_size
+        self.position = max(0, offset)
+        return self.position
+
+    @override
+    def readinto(self, buffer) -> int:
+        buffer_view = memoryview(buffer).cast("B")
+        length = min(len(buffer_view), self.sparse_map.data_size - self.position)
+        done = 0
+        for file_offset, size in self.sparse_map.file_range_list(self.position, length):
+            block_size = os.preadv(self.file_unit.fileno(), [buffer_view[done:done + size]], file_offset)
+            if block_size != size:
+                raise RuntimeError(f"file shrunk: {self.file_unit.name}")
+            done += size
+        self.position += done
+        return done
+
+    @override
+    def close(self) -> None:
+        self.file_unit.close()
+        super().close()
@@ -0,0 +1,138 @@
+"""
+parallel local metadata sweep
+"""
+
+import os
+import stat
+import logging
+
+from concurrent.futures import FIRST_COMPLETED
+from concurrent.futures import ThreadPoolExecutor
+from concurrent.futures import wait
+from dataclasses import dataclass
+from typing import Iterator
+from typing import List
+from typing import Tuple
+
+from file_sync_s3.config import CONFIG
+from file_sync_s3.config import ConfigSupport
+
+logger = logging.getLogger(__name__)
+
+frozen = dataclass(frozen=True)
+
+
+@frozen
+class SweepConfig:
+    "local metadata sweep params"
+
+    config_entry = "folder/sweep"
+
+    sweep_threads:int  # concurrent directory listings and stats, 1 for in place walk
+
+    @classmethod
+    def default(cls) -> "SweepConfig":
+        ""
+        section = CONFIG[cls.config_entry]
+        return SweepConfig(
+            sweep_threads=section['sweep_threads@int'],
+        )
+
+
+class MetaRecord:
+    "compact regular file meta, from a single stat"
+
+    __slots__ = ("path", "size", "mtime_ns", "inode", "ctime_ns")
+
+    def __init__(self, path:str, size:int, mtime_ns:int, inode:int, ctime_ns:int):
+        self.path = path
+        self.size = size
+        self.mtime_ns = mtime_ns
+        self.inode = inode
+        self.ctime_ns = ctime_ns
+
+    def __repr__(self) -> str:
+        return f"MetaRecord({self.path!r}, {self.size}, {self.mtime_ns}, {self.inode}, {self.ctime_ns})"
+
+    def __eq__(self, other:object) -> bool:
+        return isinstance(other, MetaRecord) and \
+            (self.path, self.size, self.mtime_ns, self.inode, self.ctime_ns) == \
+            (other.path, other.size, other.mtime_ns, other.inode, other.ctime_ns)
+
+    def mtime(self) -> float:
+        "modification time, unix seconds"
+        return self.mtime_ns / 1e9
+
+    def ctime(self) -> float:
+        "inode change time, unix seconds, moves on any write or utime and can not be set back"
+        return self.ctime_ns / 1e9
+
+
+class MetaSweeper:
+    "tree walk with directory listings and file stats spread over a thread pool"
+    "stat releases the interpreter lock, so that round trips of network file systems overlap"
+    "records stream as directories complete, memory is bounded by directories in flight"
+
+    def __init__(self,
+            sweep_config:SweepConfig=None,
+        ):
+        self.sweep_config = sweep_config or SweepConfig.default()
+
+    def reconfigure(self) -> List[str]:
+        "re-read configuration, report changed fields"
+        sweep_config = SweepConfig.default()
+        change_list = ConfigSupport.change_list(self.sweep_config, sweep_config)
+        self.sweep_config = sweep_config
+        return change_list
+
+    @classmethod
+    def folder_scan(cls, folder_path:str, recursive:bool) -> Tuple[List[MetaRecord], List[str]]:
+        "list one directory: (regular file records, sub directories to descend)"
+        "like os.walk: symlink to directory is not descended, symlink to file is reported"
+        record_list = []
+        folder_list = []
+        try:
+            entry_iter = os.scandir(folder_path)
+        except OSError:
+            return (record_list, folder_list)
+        with entry_iter:
+            for entry in entry_iter:
+                try:
+                    if entry.is_dir():
+                        if recursive and not entry.is_symlink():
+                            folder_list.append(entry.path)
+                        continue
+                    entry_stat = entry.stat()
+                except OSError:
+                    continue  # removed meanwhile, or broken symlink
+                if stat.S_ISREG(entry_stat.st_mode):
+                    record_list.append(MetaRecord(
+                        entry.path, entry_stat.st_size, entry_stat.st_mtime_ns, entry_stat.st_ino, entry_stat.st_ctime_ns,
+                    ))
+        return (record_list, folder_list)
+
+    def sweep(self, folder_path:str, recursive:bool=True) -> Iterator[MetaRecord]:
+        "report regular files of the tree, in no particular order"
+        sweep_threads = self.sweep_config.sweep_threads
+        folder_list = [folder_path]
+        if sweep_threads <= 1:
+            while folder_list:
+                record_list, dir_list = self.folder_scan(folder_list.pop(), recursive)
+                folder_list.extend(dir_list)
+                yield from record_list
+            return
+        executor = ThreadPoolExecutor(sweep_threads, thread_name_prefix="meta_sweep")
+        try:
+            future_set = set()
+            while folder_list or future_set:
+                while folder_list and len(future_set) < 2 * sweep_threads:
+                    future_set.add(executor.submit(self.folder_scan, folder_list.pop(), recursive))
+                done_set, future_set = wait(future_set, return_when=FIRST_COMPLETED)
+                for future in done_set:
+                    record_list, dir_list = future.result()
+                    folder_list.extend(dir_list)
+                    yield from record_list
+        finally:
+            for future in future_set:
+                future.cancel()  # abandoned sweep, python 3.8 shutdown has no cancel_futures
+            executor.shutdown(wait=True)
@@ -0,0 +1,480 @@
+"""
+watchdog event trace recorder and replay load generator
+"""
+
+import os
+import sys
+import json
+import time
+import logging
+import argparse
+import threading
+import dataclasses
+
+from dataclasses import dataclass
+from dataclasses import field
+from typing import BinaryIO
+from typing import Dict
+from typing import Iterator
+from typing import List
+from typing import Optional
+from typing import Tuple
+
+from watchdog import events
+from watchdog.events import FileSystemEvent
+from watchdog.events import FileSystemEventHandler
+from watchdog.events import EVENT_TYPE_DELETED
+from watchdog.events import EVENT_TYPE_MOVED
+
+from file_sync_s3.config import CONFIG
+from file_sync_s3.aws_s3 import BucketOperatorS3
+from file_sync_s3.dedup import DedupConfig, DedupIndex
+from file_sync_s3.fanin import FaninConfig, FolderFanin
+from file_sync_s3.watcher import EventReactor, FolderConfig
+
+logger = logging.getLogger(__name__)
+
+frozen = dataclass(frozen=True)
+
+override = lambda function : function
+
+
+@frozen
+class TraceConfig:
+    "event trace and replay params"
+
+    config_entry = "folder/trace"
+
+    trace_path:str  # recorder output file, empty to disable recording
+    replay_bandwidth:int  # simulated transfer bandwidth, bytes per second
+    replay_latency:float  # simulated request round trip, seconds
+
+    @classmethod
+    def default(cls) -> "TraceConfig":
+        ""
+        section = CONFIG[cls.config_entry]
+        return TraceConfig(
+            trace_path=section['trace_path'],
+            replay_bandwidth=section['replay_bandwidth@int'],
+            replay_latency=section['replay_latency@float'],
+        )
+
+    def has_record(self) -> bool:
+        return bool(self.trace_path)
+
+
+class TraceCode:
+    "compact trace encoding"
+    "file: magic, varint start time in microseconds, folder path, then records"
+    "record: code 0 defines next path id: varint length, utf-8 path"
+    "record: event code, varint time delta in microseconds, src path id, dest path id + 1 or 0, size"
+
+    magic = b"FSS3TRACE\x01"
+
+    path_code = 0
+
+    class_list = tuple(
+        getattr(events, name) for name in (
+            "FileCreatedEvent",
+            "FileModifiedEvent",
+            "FileDeletedEvent",
+            "FileMovedEvent",
+            "FileOpenedEvent",
+            "FileClosedEvent",
+            "FileClosedNoWriteEvent",
+            "DirCreatedEvent",
+            "DirModifiedEvent",
+            "DirDeletedEvent",
+            "DirMovedEvent",
+        ) if hasattr(events, name)
+    )
+
+    code_dict = {event_class: code for code, event_class in enumerate(class_list, 1)}
+
+    @classmethod
+    def varint_pack(cls, value:int) -> bytes:
+        "unsigned little endian base 128"
+        buffer = bytearray()
+        while value >= 0x80:
+            buffer.append((value & 0x7F) | 0x80)
+            value >>= 7
+        buffer.append(value)
+        return bytes(buffer)
+
+    @classmethod
+    def varint_read(cls, file_unit:BinaryIO) -> int:
+        value = 0
+        shift = 0
+        while True:
+            octet = file_unit.read(1)
+            if not octet:
+                raise EOFError("truncated trace")
+            value |= (octet[0] & 0x7F) << shift
+            if octet[0] < 0x80:
+                return value
+            shift += 7
+
+    @classmethod
+    def text_pack(cls, text:str) -> bytes:
+        data = text.encode("utf-8", "surrogateescape")
+        return cls.varint_pack(len(data)) + data
+
+    @classmethod
+    def text_read(cls, file_unit:BinaryIO) -> str:
+        size = cls.varint_read(file_unit)
+        return file_unit.read(size).decode("utf-8", "surrogateescape")
+
+    @classmethod
+    def event_build(cls, code:int, src_path:str, dest_path:Optional[str]) -> FileSystemEvent:
+        "rebuild watchdog event from trace code"
+        event_class = cls.class_list[code - 1]
+        if event_class.event_type == EVENT_TYPE_MOVED:
+            return event_class(src_path, dest_path)
+        return event_class(src_path)
+
+
+@frozen
+class TraceEntry:
+    "single traced event"
+
+    stamp:float  # arrival time, unix seconds
+    event:FileSystemEvent
+    size:int  # file size at arrival, zero when unknown
+
+
+class TraceRecorder(FileSystemEventHandler):
+    "append raw observer event stream to trace file"
+    "attached next to event reactor on the same watch, so it sees events before any filter"
+
+    def __init__(self, trace_path:str, folder_path:str):
+        self.record_lock = threading.Lock()
+        self.file_unit = open(trace_path, "wb")
+        self.path_dict = dict()  # path -> path id
+        self.past_us = time.time_ns() // 1000
+        self.file_unit.write(TraceCode.magic)
+        self.file_unit.write(TraceCode.varint_pack(self.past_us))
+        self.file_unit.write(TraceCode.text_pack(folder_path))
+
+    def path_id(self, path:str) -> int:
+        "intern path, emit its definition on first use"
+        path_id = self.path_dict.get(path)
+        if path_id is None:
+            path_id = len(self.path_dict)
+            self.path_dict[path] = path_id
+            self.file_unit.write(bytes((TraceCode.path_code,)) + TraceCode.text_pack(path))
+        return path_id
+
+    def event_size(self, event:FileSystemEvent) -> int:
+        if event.event_type == EVENT_TYPE_DELETED or event.is_directory:
+            return 0
+        try:
+            return os.stat(getattr(event, "dest_path", None) or event.src_path).st_size
+        except OSError:
+            return 0
+
+    @override
+    def on_any_event(self, event:FileSystemEvent) -> None:
+        code = TraceCode.code_dict.get(type(event))
+        if code is None:
+            return
+        size = self.event_size(event)
+        dest_path = getattr(event, "dest_path", None)
+        with self.record_lock:
+            if self.file_unit.closed:
+                return
+            current_us = max(self.past_us, time.time_ns() // 1000)
+            src_id = self.path_id(event.src_path)
+            dest_code = self.path_id(dest_path) + 1 if dest_path else 0
+            self.file_unit.write(
+                bytes((code,)) +
+                TraceCode.varint_pack(current_us - self.past_us) +
+                TraceCode.varint_pack(src_id) +
+                TraceCode.varint_pack(dest_code) +
+                TraceCode.varint_pack(size)
+            )
+            self.past_us = current_us
+
+    def close(self) -> None:
+        with self.record_lock:
+            self.file_unit.close()
+
+
+class TraceReader:
+    "stream traced events in recorded order"
+
+    def __init__(self, trace_path:str):
+        self.trace_path = trace_path
+        with open(trace_path, "rb") as file_unit:
+            self.header_read(file_unit)
+
+    def header_read(self, file_unit:BinaryIO) -> None:
+        if file_unit.read(len(TraceCode.magic)) != TraceCode.magic:
+            raise ValueError(f"not a trace file: {self.trace_path}")
+        self.start_us = TraceCode.varint_read(file_unit)
+        self.folder_path = TraceCode.text_read(file_unit)
+
+    def __iter__(self) -> Iterator[TraceEntry]:
+        path_list = []
+        with open(self.trace_path, "rb", buffering=1 << 16) as file_unit:
+            self.header_read(file_unit)
+            stamp_us = self.start_us
+            while True:
+                octet = file_unit.read(1)
+                if not octet:
+                    return
+                code = octet[0]
+                try:
+                    if code == TraceCode.path_code:
+                        path_list.append(TraceCode.text_read(file_unit))
+                        continue
+                    stamp_us += TraceCode.varint_read(file_unit)
+                    src_path = path_list[TraceCode.varint_read(file_unit)]
+                    dest_code = TraceCode.varint_read(file_unit)
+                    size = TraceCode.varint_read(file_unit)
+                except EOFError:
+                    logger.warning(f"truncated: {self.trace_path}")  # recorder was not closed
+                    return
+                dest_path = path_list[dest_code - 1] if dest_code else None
+                yield TraceEntry(stamp_us / 1e6, TraceCode.event_build(code, src_path, dest_path), size)
+
+
+@dataclass
+class ReplayReport:
+    "scheduler behavior under a replayed workload, times are in trace seconds"
+
+    trace_count:int = 0  # events read from trace
+    event_count:int = 0  # events which passed the regex filter into the reactor
+    put_count:int = 0
+    delete_count:int = 0
+    put_bytes:int = 0
+    trace_seconds:float = 0.0  # span of the recorded workload
+    replay_seconds:float = 0.0  # wall time of replay, including drain
+    speed:float = 1.0
+    pending_peak:int = 0  # largest pending store size
+    schedule_peak:int = 0  # largest transfer scheduler backlog
+    delay_list:List[float] = field(default_factory=list)  # first unserved arrival to transfer start
+
+    def operation_count(self) -> int:
+        return self.put_count + self.delete_count
+
+    def coalesce_ratio(self) -> float:
+        "events per bucket operation"
+        return self.event_count / max(1, self.operation_count())
+
+    def delay_quantile(self, quantile:float) -> float:
+        if not self.delay_list:
+            return 0.0
+        delay_list = sorted(self.delay_list)
+        return delay_list[min(len(delay_list) - 1, int(quantile * len(delay_list)))]
+
+    def report_dict(self) -> Dict[str, object]:
+        trace_span = max(self.replay_seconds * self.speed, 1e-6)
+        return dict(
+            trace_count=self.trace_count,
+            event_count=self.event_count,
+            put_count=self.put_count,
+            delete_count=self.delete_count,
+            put_bytes=self.put_bytes,
+            coalesce_ratio=round(self.coalesce_ratio(), 3),
+            delay_p50=round(self.delay_quantile(0.50), 3),
+            delay_p90=round(self.delay_quantile(0.90), 3),
+            delay_p99=round(self.delay_quantile(0.99), 3),
+            operation_rate=round(self.operation_count() / trace_span, 1),
+            byte_rate=round(self.put_bytes / trace_span, 1),
+            pending_peak=self.pending_peak,
+            schedule_peak=self.schedule_peak,
+            trace_seconds=round(self.trace_seconds, 3),
+            replay_seconds=round(self.replay_seconds, 3),
+            speed=self.speed,
+        )
+
+    def report_json(self) -> str:
+        return json.dumps(self.report_dict())
+
+    def report_text(self) -> str:
+        return "\n".join(f"{key:16} {value:>16,}" for key, value in self.report_dict().items())
+
+
+class ReplayOperatorS3(BucketOperatorS3):
+    "bucket stand-in: transfers take simulated time, nothing leaves the host"
+
+    def __init__(self,
+            trace_config:TraceConfig,
+            replay_report:ReplayReport,
+            size_dict:Dict[str, int],
+        ):
+        super().__init__(
+            dedup_index=DedupIndex(DedupConfig(dedup_mode=DedupConfig.mode_none, index_path=":memory:")),
+        )
+        self.trace_config = trace_config
+        self.replay_report = replay_report
+        self.size_dict = size_dict  # local path -> last traced size
+        self.report_lock = threading.Lock()
+
+    def transfer_sleep(self, size:int) -> None:
+        duration = self.trace_config.replay_latency + size / self.trace_config.replay_bandwidth
+        time.sleep(duration / self.replay_report.speed)
+
+    @override
+    def resource_put_sync(self, local_path:str, remot_path:str, use_check:bool=True) -> None:
+        size = self.size_dict.get(local_path, 0)
+        self.transfer_sleep(size)
+        with self.report_lock:
+            self.replay_report.put_count += 1
+            self.replay_report.put_bytes += size
+
+    @override
+    def resource_delete_sync(self, remot_path:str) -> None:
+        self.transfer_sleep(0)
+        with self.report_lock:
+            self.replay_report.delete_count += 1
+
+    @override
+    def remot_scan(self, prefix:str) -> Iterator[Tuple[str, int, float]]:
+        return iter(())
+
+
+class ReplayReactor(EventReactor):
+    "event reactor with traced file sizes and queueing delay measurement"
+
+    def __init__(self,
+            replay_report:ReplayReport,
+            size_dict:Dict[str, int],
+            **reactor_dict,
+        ):
+        self.replay_report = replay_report
+        self.size_dict = size_dict
+        self.arrival_dict = dict()  # path -> first unserved arrival, wall time
+        EventReactor.__init__(self, **reactor_dict)
+
+    @override
+    def on_any_event(self, event:FileSystemEvent) -> None:
+        with self.event_lock:
+            self.arrival_dict.setdefault(event.src_path, time.time())
+        self.replay_report.event_count += 1
+        EventReactor.on_any_event(self, event)
+
+    @override
+    def event_size(self, event:FileSystemEvent) -> int:
+        if event.event_type == EVENT_TYPE_DELETED:
+            return 0
+        return self.size_dict.get(getattr(event, "dest_path", None) or event.src_path, 0)
+
+    @override
+    def process_event(self, event:FileSystemEvent) -> None:
+        with self.event_lock:
+            arrival = self.arrival_dict.pop(event.src_path, None)
+        if arrival is not None:
+            self.replay_report.delay_list.append((time.time() - arrival) * self.replay_report.speed)
+        EventReactor.process_event(self, event)
+
+
+class TraceReplay:
+    "feed traced events into event reactor at recorded or accelerated pace"
+    "acceleration divides arrival gaps, settle timeout and simulated transfer time alike"
+
+    def __init__(self,
+            trace_path:str,
+            speed:float=1.0,
+            trace_config:TraceConfig=None,
+            folder_config:FolderConfig=None,
+            **reactor_dict,
+        ):
+        self.trace_reader = TraceReader(trace_path)
+        self.trace_config = trace_config or TraceConfig.default()
+        self.replay_report = ReplayReport(speed=speed)
+        self.size_dict = dict()
+        folder_config = folder_config or FolderConfig.default()
+        folder_config = dataclasses.replace(folder_config,
+            folder_path=self.trace_reader.folder_path,
+            watcher_timeout=folder_config.watcher_timeout / speed,
+            watcher_settle_limit=folder_config.watcher_settle_limit / speed,
+        )
+        reactor_dict.setdefault("bucket_operator", ReplayOperatorS3(self.trace_config, self.replay_report, self.size_dict))
+        reactor_dict.setdefault("folder_fanin", FolderFanin(dataclasses.replace(FaninConfig.default(), fanin_enable=False)))  # fan-in diffs the disk
+        self.event_reactor = ReplayReactor(
+            self.replay_report,
+            self.size_dict,
+            folder_config=folder_config,
+            **reactor_dict,
+        )
+        self.feed_done = threading.Event()
+
+    def perform_feed(self) -> None:
+        "observer stand-in: dispatch events at their scaled arrival time"
+        replay_report = self.replay_report
+        start_time = time.time()
+        first_stamp = None
+        for trace_entry in self.trace_reader:
+            if first_stamp is None:
+                first_stamp = trace_entry.stamp
+            delay = start_time + (trace_entry.stamp - first_stamp) / replay_report.speed - time.time()
+            if delay > 0:
+                time.sleep(delay)
+            event = trace_entry.event
+            if not event.is_directory and event.event_type != EVENT_TYPE_DELETED:
+                self.size_dict[getattr(event, "dest_path", None) or event.src_path] = trace_entry.size
+            replay_report.trace_count += 1
+            replay_report.trace_seconds = trace_entry.stamp - first_stamp
+            self.event_reactor.dispatch(event)
+        self.feed_done.set()
+
+    def has_backlog(self) -> bool:
+        event_reactor = self.event_reactor
+        return len(event_reactor.pending_store) > 0 or len(event_reactor.transfer_scheduler) > 0
+
+    def perform_replay(self) -> ReplayReport:
+        "run reactor cycle until trace is consumed and backlog is drained"
+        event_reactor = self.event_reactor
+        replay_report = self.replay_report
+        feed_thread = threading.Thread(target=self.perform_feed, name="trace_feed", daemon=True)
+        start_time = time.time()
+        feed_thread.start()
+        while not self.feed_done.is_set() or self.has_backlog():
+            replay_report.pending_peak = max(replay_report.pending_peak, len(event_reactor.pending_store))
+            replay_report.schedule_peak = max(replay_report.schedule_peak, len(event_reactor.transfer_scheduler))
+            event_reactor.perform_expire()
+            if event_reactor.perform_schedule():
+                continue
+            time.sleep(1 / replay_report.speed)  # reactor cycle period
+        feed_thread.join()
+        replay_report.replay_seconds = time.time() - start_time
+        return replay_report
+
+
+def trace_main(argument_list:List[str]=None) -> int:
+    "trace inspection and replay invocation"
+
+    from file_sync_s3.service import setup_logger
+
+    parser = argparse.ArgumentParser(description="event trace inspection and replay")
+    command_parser = parser.add_subparsers(dest="command", required=True)
+    show_parser = command_parser.add_parser("show", help="print traced events")
+    show_parser.add_argument("trace_path")
+    replay_parser = command_parser.add_parser("replay", help="replay trace against simulated bucket")
+    replay_parser.add_argument("trace_path")
+    replay_parser.add_argument("--speed", type=float, default=1.0, help="time acceleration factor")
+    replay_parser.add_argument("--json", action="store_true", help="report as json")
+    argument = parser.parse_args(argument_list)
+
+    if argument.command == "show":
+        trace_reader = TraceReader(argument.trace_path)
+        print(f"folder: {trace_reader.folder_path}")
+        for trace_entry in trace_reader:
+            event = trace_entry.event
+            dest_path = getattr(event, "dest_path", "")
+            print(f"{trace_entry.stamp:.6f} {type(event).__name__:24} {trace_entry.size:>14,} {event.src_path} {dest_path}")
+        return 0
+
+    setup_logger()
+    logging.getLogger("file_sync_s3").setLevel(logging.WARNING)  # per transfer lines drown the report
+
+    trace_replay = TraceReplay(argument.trace_path, argument.speed)
+    replay_report = trace_replay.perform_replay()
+    print(replay_report.report_json() if argument.json else replay_report.report_text())
+
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(trace_main())
@@ -6,12 +6,14 @@ import re
 import os
 import time
 import logging
+import threading
+import dataclasses
 
 from dataclasses import dataclass
 from datetime import datetime, timezone, timedelta
-from typing import List, Tuple, Callable
+from typing import List, Tuple, Callable, Iterator, Optional, TYPE_CHECKING
 
-from watchdog.events import FileSystemEvent, FileModifiedEvent
+from watchdog.events import FileSystemEvent, FileModifiedEvent, FileDeletedEvent
 from watchdog.events import EVENT_TYPE_CREATED
 from watchdog.events import EVENT_TYPE_MODIFIED
 from watchdog.events import EVENT_TYPE_DELETED
@@ -21,7 +23,21 @@ from watchdog.observers import Observer
 from watchdog.utils import BaseThread
 
 from file_sync_s3.config import CONFIG
-from file_sync_s3.aws_s3 import BucketOperatorS3, SupportFuncS3
+from file_sync_s3.config import ConfigSupport
+from file_sync_s3.aws_s3 import BucketOperatorS3, MetaEntryS3, SupportFuncS3
+from file_sync_s3.diagnose import DiagnoseConfig, DiagnoseOperator, StageTimer
+from file_sync_s3.fanin import FaninConfig, FolderFanin
+from file_sync_s3.keeper import KeeperConfig, SupportFuncKeeper
+from file_sync_s3.layout import KeyLayout, LayoutConfig
+from file_sync_s3.partition import PartitionConfig, PartitionLease
+from file_sync_s3.pending import EventEntry, PendingConfig, PendingStore
+from file_sync_s3.route import ObjectRouter, RouteConfig
+from file_sync_s3.schedule import PriorityClass, ScheduleConfig, TransferScheduler
+from file_sync_s3.snapshot import SnapshotChangeError, SnapshotSupport
+from file_sync_s3.sweep import MetaRecord, MetaSweeper, SweepConfig
+
+if TYPE_CHECKING:  # asyncio engine is imported only when configured
+    from file_sync_s3.aio_s3 import EngineLoopAio
 
 logger = logging.getLogger(__name__)
 
@@ -44,6 +60,9 @@ class FolderConfig:
     keeper_expire:bool
     keeper_diem_span:int
     keeper_scan_period:timedelta
+    watcher_settle_limit:int = 60
+    watcher_retry_delay:float = 1.0
+    watcher_retry_limit:float = 300.0
 
     @classmethod
     def default(cls) -> "FolderConfig":
@@ -58,6 +77,9 @@ class FolderConfig:
             keeper_expire=section['keeper_expire@bool'],
             keeper_diem_span=section['keeper_diem_span@int'],
             keeper_scan_period=section['keeper_scan_period@timedelta'],
+            watcher_settle_limit=section['watcher_settle_limit@int'],
+            watcher_retry_delay=section['watcher_retry_delay@float'],
+            watcher_retry_limit=section['watcher_retry_limit@float'],
         )
 
 
@@ -66,22 +88,31 @@ class FolderVisitor:
 
     def __init__(self,
             folder_config:FolderConfig=None,
+            meta_sweeper:MetaSweeper=None,
         ):
-        self.folder_config = folder_config or FolderConfig.default()
-        self.regex_include_list = [re.compile(regex) for regex in self.folder_config.regex_include_list]
-        self.regex_exclude_list = [re.compile(regex) for regex in self.folder_config.regex_exclude_list]
+        self.meta_sweeper = meta_sweeper or MetaSweeper()
+        self.apply_config(folder_config or FolderConfig.default())
+
+    def apply_config(self, folder_config:FolderConfig) -> None:
+        "use folder config and its regex matcher"
+        self.regex_include_list = [re.compile(regex) for regex in folder_config.regex_include_list]
+        self.regex_exclude_list = [re.compile(regex) for regex in folder_config.regex_exclude_list]
+        self.folder_config = folder_config
 
-    def visit_store(self, visit_action:Callable) -> None:
-        "apply action to local storage"
-        folder_root = self.folder_config.folder_path
-        for base, dir_list, file_list in os.walk(folder_root):
-            for file in file_list:
-                file_path = f"{base}/{file}"
-                visit_action(file_path)
+    def visit_store(self, visit_action:Callable[[MetaRecord], None]) -> None:
+        "apply action to every regular file of local storage"
+        for meta_record in self.meta_sweeper.sweep(self.folder_config.folder_path):
+            visit_action(meta_record)
 
     def has_regex_match(self, file_path:str) -> bool:
-        "match file path against configured patterns"
-        if not os.path.isfile(file_path):
+        "match file path against configured patterns, stat only for matching names"
+        if not self.has_regex_name(file_path):
+            return False
+        return os.path.isfile(file_path)
+
+    def has_regex_name(self, file_path:str) -> bool:
+        "match file path against configured patterns, file may not exist"
+        if SnapshotSupport.has_clone_name(file_path):
             return False
         if any(regex.match(file_path) for regex in self.regex_exclude_list):
             return False
@@ -95,122 +126,464 @@ class FolderKeeper(BaseThread, FolderVisitor):
 
     def __init__(self,
             folder_config:FolderConfig=None,
+            expire_notice:Callable=None,
+            stage_timer:StageTimer=None,
         ):
         BaseThread.__init__(self)
         FolderVisitor.__init__(self, folder_config)
+        self.name = "folder_keeper"
+        self.expire_notice = expire_notice or (lambda file_path: None)
+        self.stage_timer = stage_timer or StageTimer()
+        self.wakeup_event = threading.Event()
+
+    @override
+    def on_thread_stop(self) -> None:
+        self.wakeup_event.set()
+
+    @override
+    def apply_config(self, folder_config:FolderConfig) -> None:
+        "use folder config, restart scan period"
+        FolderVisitor.apply_config(self, folder_config)
+        if hasattr(self, "wakeup_event"):
+            self.wakeup_event.set()
 
     @override
     def run(self) -> None:
         while self.should_keep_running():
-            logger.info(f"process expirations")
-            try:
-                self.visit_store(self.perform_expire)
-            except Exception as error:
-                logger.error(f"failure: {error}")
-            time.sleep(self.folder_config.keeper_scan_period.total_seconds())
-
-    def perform_expire(self, file_path:str) -> None:
+            if self.folder_config.keeper_expire:
+                logger.info(f"process expirations")
+                try:
+                    with self.stage_timer.stage("keeper"):
+                        self.visit_store(self.perform_expire)
+                except Exception as error:
+                    logger.error(f"failure: {error}")
+            self.wakeup_event.wait(self.folder_config.keeper_scan_period.total_seconds())
+            self.wakeup_event.clear()
+
+    def perform_expire(self, meta_record:MetaRecord) -> None:
         "expire matching local file"
-        if not self.has_regex_match(file_path):
+        file_path = meta_record.path
+        if not self.has_regex_name(file_path):
             logger.info(f"no match: {file_path}")
             return
         current = datetime.now().astimezone(timezone.utc)
-        modified = SupportFuncS3.convert_unix_time(os.path.getmtime(file_path))
+        modified = SupportFuncS3.convert_unix_time(meta_record.mtime())
         delta_time = current - modified
         delta_days = delta_time.days
         if  delta_days >= self.folder_config.keeper_diem_span:
             logger.info(f"expire: {file_path} delta_days={delta_days}")
+            self.expire_notice(file_path)
             os.remove(file_path)
         else:
             logger.info(f"retain: {file_path} delta_days={delta_days}")
 
 
-@frozen
-class EventEntry:
-    "postponed file event"
-
-    stamp:float  # event fire time
-    event:FileSystemEvent  # original event
-
-
 class EventReactor(BaseThread, FolderVisitor, RegexMatchingEventHandler):
     "file watch change event handler"
 
     def __init__(self,
             folder_config:FolderConfig=None,
             bucket_operator:BucketOperatorS3=None,
+            transfer_scheduler:TransferScheduler=None,
+            event_engine:"EngineLoopAio"=None,
+            pending_store:PendingStore=None,
+            folder_fanin:FolderFanin=None,
+            keeper_config:KeeperConfig=None,
+            object_router:ObjectRouter=None,
+            key_layout:KeyLayout=None,
+            partition_lease:PartitionLease=None,
+            stage_timer:StageTimer=None,
         ):
-        self.event_dict = dict()
+        self.pending_store = pending_store or PendingStore()
+        self.folder_fanin = folder_fanin or FolderFanin()
+        self.keeper_config = keeper_config or KeeperConfig.default()
+        self.object_router = object_router or ObjectRouter()
+        self.key_layout = key_layout or KeyLayout()
+        self.keeper_remot_list = []  # (local path, remot key) of expired files, for batched remote action
+        self.event_engine = event_engine
+        self.event_lock = threading.Lock()
+        self.keeper_path_set = set()
+        self.retired_path_list = []
+        self.retry_dict = dict()  # path -> failed attempt count
         self.folder_config = folder_config or FolderConfig.default()
         self.bucket_operator = bucket_operator or BucketOperatorS3()
+        self.partition_lease = partition_lease or PartitionLease(bucket_operator=self.bucket_operator)
+        self.partition_lease.rebalance_notice = self.rebalance_notice
+        self.transfer_scheduler = transfer_scheduler or TransferScheduler()
+        self.stage_timer = stage_timer or StageTimer()
         BaseThread.__init__(self)
+        self.name = "event_reactor"
         FolderVisitor.__init__(self,
             self.folder_config,
         )
+
+    @override
+    def apply_config(self, folder_config:FolderConfig) -> None:
+        "use folder config, keep pending events of previous folder"
+        past_config = getattr(self, "folder_config", None)
+        if past_config and past_config.folder_path != folder_config.folder_path:
+            self.retired_path_list.append(past_config.folder_path)
+        FolderVisitor.apply_config(self, folder_config)
         RegexMatchingEventHandler.__init__(self,
             ignore_directories=True,
-            regexes=self.folder_config.regex_include_list,
-            ignore_regexes=self.folder_config.regex_exclude_list,
+            regexes=folder_config.regex_include_list,
+            ignore_regexes=folder_config.regex_exclude_list,
          )
 
     @override
     def on_any_event(self, event:FileSystemEvent) -> None:
         "postpone event processing to settle file changes"
-        self.event_dict[event.src_path] = EventEntry(
-            stamp=time.time(),
-            event=event,
+        if SnapshotSupport.has_clone_name(event.src_path):
+            return  # upload snapshot clone, not user content
+        priority_class = PriorityClass.live
+        if event.event_type == EVENT_TYPE_DELETED and event.src_path in self.keeper_path_set:
+            self.keeper_path_set.discard(event.src_path)
+            if not self.keeper_config.has_event():
+                return  # remote side follows keeper mode
+            priority_class = PriorityClass.keeper
+        if self.folder_fanin.has_enable():
+            with self.event_lock:
+                if self.folder_fanin.observe(event.src_path, getattr(event, "dest_path", None), time.time()):
+                    return  # dirty subtree is diffed once settled
+        self.register_event(event, priority_class)
+
+    def register_event(self, event:FileSystemEvent, priority_class:int, delay:float=0) -> None:
+        "postpone event processing to settle file changes"
+        current = time.time()
+        stamp = current + delay
+        origin = current
+        with self.event_lock:
+            pending_state = self.pending_store.lookup(event.src_path)
+            if pending_state:
+                past_stamp, origin, past_class = pending_state
+                priority_class = min(priority_class, past_class)
+                if current - origin >= self.folder_config.watcher_settle_limit and priority_class == past_class:
+                    stamp = max(past_stamp, current + delay) if delay else past_stamp  # stop postponing growing file
+                # class change moves record to another queue tail, fresh stamp keeps that queue ordered
+            self.pending_store.store(event, stamp, origin, priority_class)
+
+    def expire_notice(self, file_path:str) -> None:
+        "keeper is about to remove this file"
+        self.keeper_path_set.add(file_path)
+        if self.keeper_config.keeper_remote not in (KeeperConfig.mode_delete, KeeperConfig.mode_transition):
+            return
+        if self.has_lifecycle() or not self.has_owner(file_path):
+            return
+        with self.event_lock:
+            self.keeper_remot_list.append((file_path, self.remot_path(file_path)))
+
+    def lifecycle_refusal(self) -> Optional[str]:
+        "reason why the lifecycle rule is not installed, none when it is allowed"
+        dedup_index = getattr(self.bucket_operator, "dedup_index", None)
+        return SupportFuncKeeper.lifecycle_refusal(
+            self.remot_prefix(self.folder_config.folder_path),
+            dedup_index is not None and dedup_index.has_pointer(),
         )
 
+    def has_lifecycle(self) -> bool:
+        "bucket lifecycle rule does the remote work, otherwise per object requests"
+        return self.keeper_config.has_lifecycle() and self.lifecycle_refusal() is None
+
+    def keeper_install(self) -> None:
+        "install bucket lifecycle rule equivalent to keeper expiration"
+        if not (self.folder_config.keeper_expire and self.keeper_config.has_lifecycle()):
+            return
+        refusal = self.lifecycle_refusal()
+        if refusal:
+            logger.warning(f"no lifecycle rule, using per object requests: {refusal}")
+            return
+        rule = SupportFuncKeeper.lifecycle_rule(
+            self.keeper_config,
+            self.remot_prefix(self.folder_config.folder_path),
+            self.folder_config.keeper_diem_span,
+        )
+        try:
+            self.bucket_operator.lifecycle_install(rule)
+        except Exception as error:
+            logger.error(f"failure: {error}")
+
+    def keeper_reconfigure(self) -> List[str]:
+        "re-read keeper configuration, report changed fields"
+        keeper_config = KeeperConfig.default()
+        change_list = ConfigSupport.change_list(self.keeper_config, keeper_config)
+        self.keeper_config = keeper_config
+        return change_list
+
+    def perform_keeper(self) -> None:
+        "apply remote side of keeper expiration in batches"
+        if not self.keeper_remot_list:
+            return
+        with self.event_lock:
+            path_list, self.keeper_remot_list = self.keeper_remot_list, []
+        if self.keeper_config.keeper_remote == KeeperConfig.mode_delete:
+            self.bucket_operator.remot_delete_batch([remot_path for _, remot_path in path_list])
+        elif self.keeper_config.keeper_remote == KeeperConfig.mode_transition:
+            self.bucket_operator.remot_transition_batch(path_list, self.keeper_config.keeper_storage_class)
+
     @override
     def run(self) -> None:
         "periodic verification for settled file changes"
-        self.populate_init()
+        self.populate_start()
+        self.keeper_install()
         while self.should_keep_running():
             try:
-                self.perform_expire()
+                with self.stage_timer.stage("expire"):
+                    self.perform_expire()
+                with self.stage_timer.stage("fanin"):
+                    self.perform_fanin()
+                with self.stage_timer.stage("keeper_remote"):
+                    self.perform_keeper()
+                with self.stage_timer.stage("schedule"):
+                    has_remain = self.perform_schedule()
+                if has_remain:
+                    continue
             except Exception as error:
                 logger.error(f"failure: {error}")
             time.sleep(1)
 
+    def populate_start(self) -> None:
+        "initial scan runs alongside live events"
+        populate_thread = threading.Thread(
+            target=self.populate_init,
+            name="populate_init",
+            daemon=True,
+        )
+        populate_thread.start()
+
     def populate_init(self) -> None:
         logger.info("sync initial state")
-        self.visit_store(self.perform_register)
+        try:
+            with self.stage_timer.stage("populate"):
+                self.visit_store(self.perform_register)
+        except Exception as error:
+            logger.error(f"failure: {error}")
 
-    def perform_register(self, file_path:str) -> None:
-        if self.has_regex_match(file_path):
-            event = FileModifiedEvent(file_path)
-            self.on_any_event(event)
+    def perform_register(self, meta_record:MetaRecord) -> None:
+        if self.has_regex_name(meta_record.path):
+            event = FileModifiedEvent(meta_record.path)
+            self.register_event(event, PriorityClass.init)
 
     def perform_expire(self) -> None:
-        "check for settled file changes after a timeout"
-        if not self.event_dict:
+        "move settled file changes into transfer scheduler after a timeout"
+        "scheduler backlog is limited, so that pending events stay in compact form"
+        if not len(self.pending_store):
             return
-        current = time.time()
-        timeout = self.folder_config.watcher_timeout
-        for file_path in list(self.event_dict.keys()):
-            event_entry = self.event_dict[file_path]
-            if event_entry.stamp + timeout < current:
-                del self.event_dict[file_path]
-                self.process_event(event_entry.event)
+        room = self.pending_store.pending_config.pending_handover - len(self.transfer_scheduler)
+        if room <= 0:
+            return
+        with self.event_lock:
+            entry_list = self.pending_store.expire_list(time.time(), self.folder_config.watcher_timeout, room)
+        for event_entry in entry_list:
+            self.transfer_scheduler.submit(
+                    job_path=event_entry.event.src_path,
+                    job_item=event_entry.event,
+                    priority_class=event_entry.priority_class,
+                    job_size=self.event_size(event_entry.event),
+                    stamp=event_entry.stamp,
+                )
+
+    def perform_fanin(self) -> None:
+        "diff settled dirty subtrees in background"
+        if not len(self.folder_fanin):
+            return
+        with self.event_lock:
+            settled_list = self.folder_fanin.settled_list(time.time(), self.folder_config.watcher_timeout)
+        if settled_list:
+            self.reconcile_start(settled_list)
+
+    def rebalance_notice(self, node_list:List[str]) -> None:
+        "key ownership moved between nodes, diff the whole folder for newly owned keys"
+        logger.info(f"rebalance: {len(node_list)} nodes")
+        self.reconcile_start([self.folder_config.folder_path])
+
+    def reconcile_start(self, folder_list:List[str]) -> None:
+        reconcile_thread = threading.Thread(
+            target=self.reconcile_list,
+            args=(folder_list,),
+            name="reconcile",
+            daemon=True,
+        )
+        reconcile_thread.start()
 
-    def process_event(self, event:FileSystemEvent) -> None:
-        "apply pending file change event"
+    def reconcile_list(self, folder_list:List[str]) -> None:
+        for folder_path in folder_list:
+            try:
+                with self.stage_timer.stage("reconcile"):
+                    self.perform_reconcile(folder_path)
+            except Exception as error:
+                logger.error(f"failure: {error}")
+
+    def perform_reconcile(self, folder_path:str) -> None:
+        "single scan based diff of the subtree against remot listing, register only the difference"
+        "every routed key prefix is listed on its own, keys compare as (key prefix, folder relative path)"
+        remot_prefix = self.remot_prefix(folder_path)
+        prefix_list = self.object_router.key_prefix_list()
+        remot_dict = dict()  # (key prefix, relative path) -> (size, upload time)
+        for key_prefix in prefix_list:
+            other_list = [prefix for prefix in prefix_list if prefix and prefix != key_prefix]
+            for plain_key, remot_entry in self.key_layout.remot_list(self.bucket_operator, key_prefix + remot_prefix).items():
+                if key_prefix == "" and any(plain_key.startswith(prefix) for prefix in other_list):
+                    continue  # belongs to another routed prefix
+                remot_dict[(key_prefix, plain_key[len(key_prefix):])] = remot_entry
+        change_count = 0
+        for meta_record in self.scan_tree(folder_path):
+            local_key = (self.object_router.key_prefix(meta_record.path), self.relative_path(meta_record.path))
+            if self.has_reconcile_change(meta_record, remot_dict.pop(local_key, None)):
+                self.register_event(FileModifiedEvent(meta_record.path), PriorityClass.live)
+                change_count += 1
+        for (key_prefix, relative_key), (_, last_modified) in remot_dict.items():
+            if self.partition_lease.has_lease_key(key_prefix + relative_key):
+                continue
+            remot_name = relative_key[len(remot_prefix):]
+            if "/" in remot_name and not self.folder_config.watcher_recursive:
+                continue
+            if self.folder_config.keeper_expire and self.keeper_config.has_retain() and \
+                    SupportFuncKeeper.has_retired(last_modified, self.folder_config.keeper_diem_span):
+                continue  # remote copy of expired file
+            file_path = os.path.join(folder_path, remot_name)
+            if self.object_router.key_prefix(file_path) != key_prefix:
+                continue  # delete event would address the key of the present route, not this one
+            if self.has_regex_name(file_path) and not os.path.exists(file_path):
+                self.register_event(FileDeletedEvent(file_path), PriorityClass.live)
+                change_count += 1
+        logger.info(f"reconcile: {folder_path} changes={change_count}")
+
+    def has_reconcile_change(self, meta_record:MetaRecord, remot_entry:Optional[Tuple[int, datetime]]) -> bool:
+        "listing decides for a file untouched since upload, stored entry meta decides otherwise"
+        "listing size of sparse and dedup pointer objects is not the file size, and a rewrite"
+        "with preserved mtime (rsync -a, cp -p) still moves the inode change time"
+        if remot_entry is None:
+            return True
+        size, last_modified = remot_entry
+        if size == meta_record.size and meta_record.ctime() <= last_modified.timestamp():
+            return False
+        local_meta = MetaEntryS3(
+            length=meta_record.size,
+            modified=SupportFuncS3.convert_unix_time(meta_record.mtime()),
+        )
+        return self.bucket_operator.remot_meta(self.remot_path(meta_record.path)) != local_meta
+
+    def scan_tree(self, folder_path:str) -> Iterator[MetaRecord]:
+        "walk folder with parallel sweep, report matching files with their meta"
+        for meta_record in self.meta_sweeper.sweep(folder_path, self.folder_config.watcher_recursive):
+            if self.has_regex_name(meta_record.path):
+                yield meta_record
+
+    def event_size(self, event:FileSystemEvent) -> int:
+        "estimate transfer volume of the event"
+        if event.event_type == EVENT_TYPE_DELETED:
+            return 0
+        local_path = getattr(event, "dest_path", None) or event.src_path
+        try:
+            return os.stat(local_path).st_size
+        except OSError:
+            return 0
+
+    def perform_schedule(self) -> bool:
+        "process scheduled transfers for one time slice, report if work remains"
+        time_limit = time.time() + self.transfer_scheduler.schedule_config.schedule_slice
+        while time.time() < time_limit and self.should_keep_running():
+            job = self.transfer_scheduler.select()
+            if job is None:
+                return False
+            _, event = job
+            self.dispatch_event(event)
+            if self.event_engine and not self.event_engine.await_capacity(time_limit - time.time()):
+                return True
+        return len(self.transfer_scheduler) > 0
+
+    def dispatch_event(self, event:FileSystemEvent) -> None:
+        "apply pending file change event in place or on the transfer engine"
+        if self.event_engine is None:
+            self.process_event(event)
+        else:
+            self.event_engine.submit(event.src_path, lambda: self.process_event_aio(event))
+
+    def event_action_list(self, event:FileSystemEvent) -> List[Tuple[str, ...]]:
+        "map file change event into bucket operations owned by this node: (put, local, remot) or (delete, remot)"
         event_type = event.event_type
         local_path = event.src_path
-        remot_path = os.path.relpath(local_path, self.folder_config.folder_path)
+        remot_path = self.remot_path(local_path)
         if event_type == EVENT_TYPE_CREATED:
-            self.bucket_operator.resource_put_sync(local_path, remot_path)
+            action_list = [(local_path, ("put", local_path, remot_path))]
         elif event_type == EVENT_TYPE_MODIFIED:
-            self.bucket_operator.resource_put_sync(local_path, remot_path)
+            action_list = [(local_path, ("put", local_path, remot_path))]
         elif event_type == EVENT_TYPE_DELETED:
-            self.bucket_operator.resource_delete_sync(remot_path)
+            action_list = [(local_path, ("delete", remot_path))]
         elif event_type == EVENT_TYPE_MOVED:
-            self.bucket_operator.resource_delete_sync(remot_path)
-            local_path = event.dest_path
-            remot_path = os.path.relpath(local_path, self.folder_config.folder_path)
-            self.bucket_operator.resource_put_sync(local_path, remot_path)
+            action_list = [
+                (local_path, ("delete", remot_path)),
+                (event.dest_path, ("put", event.dest_path, self.remot_path(event.dest_path))),
+            ]
         else:
             logger.error(f"no event type: {event_type}")
+            return []
+        return [action for owner_path, action in action_list if self.has_owner(owner_path)]
+
+    def has_owner(self, local_path:str) -> bool:
+        "this node is responsible for the file"
+        return self.partition_lease.has_owner(self.plain_path(local_path))
+
+    def process_event(self, event:FileSystemEvent) -> None:
+        "apply pending file change event"
+        try:
+            with self.stage_timer.stage("transfer"):
+                for action in self.event_action_list(event):
+                    if action[0] == "put":
+                        self.bucket_operator.resource_put_sync(*action[1:])
+                    else:
+                        self.bucket_operator.resource_delete_sync(*action[1:])
+        except SnapshotChangeError as error:
+            self.perform_retry(event, error)
+            return
+        self.retry_dict.pop(event.src_path, None)
+
+    async def process_event_aio(self, event:FileSystemEvent) -> None:
+        "apply pending file change event on the event loop"
+        try:
+            with self.stage_timer.stage("transfer"):
+                for action in self.event_action_list(event):
+                    if action[0] == "put":
+                        await self.bucket_operator.resource_put(*action[1:])
+                    else:
+                        await self.bucket_operator.resource_delete(*action[1:])
+        except SnapshotChangeError as error:
+            self.perform_retry(event, error)
+            return
+        self.retry_dict.pop(event.src_path, None)
+
+    def perform_retry(self, event:FileSystemEvent, error:SnapshotChangeError) -> None:
+        "file changed during transfer: postpone the event again with exponential backoff"
+        with self.event_lock:
+            attempt = self.retry_dict.get(event.src_path, 0) + 1
+            self.retry_dict[event.src_path] = attempt
+        delay = min(
+            self.folder_config.watcher_retry_delay * 2 ** (attempt - 1),
+            self.folder_config.watcher_retry_limit,
+        )
+        logger.warning(f"retry: {error.local_path} attempt={attempt} delay={delay:.1f}")
+        self.register_event(event, PriorityClass.live, delay)
+
+    def remot_path(self, local_path:str) -> str:
+        "map local path into stored remot key, according to key layout"
+        return self.key_layout.remot_key(self.plain_path(local_path))
+
+    def plain_path(self, local_path:str) -> str:
+        "map local path into plain key, relative to the owning folder, with routed key prefix"
+        return self.object_router.key_prefix(local_path) + self.relative_path(local_path)
+
+    def relative_path(self, local_path:str) -> str:
+        "map local path into path relative to the owning folder"
+        folder_path = self.folder_config.folder_path
+        for retired_path in self.retired_path_list:
+            if local_path.startswith(retired_path + os.sep):
+                folder_path = retired_path
+        return os.path.relpath(local_path, folder_path)
+
+    def remot_prefix(self, folder_path:str) -> str:
+        "map local folder into remot key prefix"
+        relative_path = self.relative_path(folder_path)
+        return "" if relative_path == "." else relative_path + "/"
 
 
 class WatcherOperator:
@@ -224,28 +597,137 @@ class WatcherOperator:
         ""
         self.folder_config = folder_config or FolderConfig.default()
         self.folder_keeper = folder_keeper or FolderKeeper(self.folder_config)
+        self.event_engine = None
+        if bucket_operator is None:
+            from file_sync_s3.aio_s3 import EngineConfig
+            engine_config = EngineConfig.default()
+            if engine_config.has_asyncio():
+                from file_sync_s3.aio_s3 import BucketOperatorAio, EngineLoopAio
+                bucket_operator = BucketOperatorAio(engine_config=engine_config)
+                self.event_engine = EngineLoopAio(engine_config)
         self.bucket_operator = bucket_operator or BucketOperatorS3()
         self.event_reactor = EventReactor(
-            folder_config=folder_config,
-            bucket_operator=bucket_operator,
+            folder_config=self.folder_config,
+            bucket_operator=self.bucket_operator,
+            event_engine=self.event_engine,
         )
+        self.folder_keeper.expire_notice = self.event_reactor.expire_notice
+        self.folder_keeper.stage_timer = self.event_reactor.stage_timer
+        self.folder_keeper.meta_sweeper = self.event_reactor.meta_sweeper
+        self.diagnose_operator = DiagnoseOperator(self)
         self.folder_observer = Observer(
             timeout=self.folder_config.watcher_timeout,
         )
-        self.folder_observer.schedule(
+        self.folder_watch = self.folder_observer.schedule(
             event_handler=self.event_reactor,
             path=self.folder_config.folder_path,
             recursive=self.folder_config.watcher_recursive,
         )
+        self.trace_recorder = None
+        from file_sync_s3.trace import TraceConfig, TraceRecorder
+        trace_config = TraceConfig.default()
+        if trace_config.has_record():
+            logger.info(f"trace: {trace_config.trace_path}")
+            self.trace_recorder = TraceRecorder(trace_config.trace_path, self.folder_config.folder_path)
+            self.folder_observer.add_handler_for_watch(self.trace_recorder, self.folder_watch)
 
     def initiate(self) -> None:
         logger.info("start service threads")
+        self.folder_observer.start()  # capture events before anything else
+        if self.event_engine:
+            self.event_engine.start()
+        if self.event_reactor.partition_lease.has_enable():
+            self.event_reactor.partition_lease.start()
         self.event_reactor.start()
         self.folder_keeper.start()
-        self.folder_observer.start()
 
     def terminate(self) -> None:
         logger.info("stop service threads")
         self.folder_observer.stop()
         self.folder_keeper.stop()
         self.event_reactor.stop()
+        if self.event_engine:
+            self.event_engine.stop()
+        self.event_reactor.partition_lease.stop()
+        progress_tracker = getattr(self.bucket_operator, "progress_tracker", None)
+        if progress_tracker:
+            progress_tracker.stop()
+        if self.trace_recorder:
+            self.trace_recorder.close()
+        self.diagnose_operator.terminate()
+
+    def config_verify(self) -> None:
+        "parse every reloadable section before any of them is applied, raise on first failure"
+        folder_config = FolderConfig.default()
+        for regex in folder_config.regex_include_list + folder_config.regex_exclude_list:
+            re.compile(regex)
+        for config_class in [
+                ScheduleConfig, PendingConfig, FaninConfig, LayoutConfig,
+                SweepConfig, PartitionConfig, DiagnoseConfig, KeeperConfig,
+            ]:
+            config_class.default()
+        ObjectRouter(RouteConfig.default())  # rule patterns compile
+        if hasattr(self.bucket_operator, "config_verify"):
+            self.bucket_operator.config_verify()
+
+    def reconfigure(self) -> None:
+        "re-read configuration and apply changes in place, keep pending events"
+        "new configuration is applied as a whole or not at all"
+
+        logger.info("reload configuration")
+        config_parser = CONFIG.config()
+        CONFIG.reload()
+        try:
+            self.config_verify()
+        except:
+            CONFIG.restore(config_parser)
+            raise
+
+        change_list = self.event_reactor.transfer_scheduler.reconfigure()
+        change_list += self.event_reactor.pending_store.reconfigure()
+        change_list += self.event_reactor.folder_fanin.reconfigure()
+        change_list += self.event_reactor.object_router.reconfigure()
+        change_list += self.event_reactor.key_layout.reconfigure()
+        change_list += self.event_reactor.meta_sweeper.reconfigure()
+        change_list += self.event_reactor.partition_lease.reconfigure()
+        change_list += self.diagnose_operator.reconfigure()
+        keeper_change_list = self.event_reactor.keeper_reconfigure()
+        change_list += keeper_change_list
+        if hasattr(self.bucket_operator, "reconfigure"):
+            change_list += self.bucket_operator.reconfigure()
+
+        folder_config = FolderConfig.default()
+        if folder_config.watcher_timeout != self.folder_config.watcher_timeout:
+            logger.warning(f"watcher_timeout change ignored until restart: observer takes it on start")
+            folder_config = dataclasses.replace(folder_config, watcher_timeout=self.folder_config.watcher_timeout)
+        folder_change_list = ConfigSupport.change_list(self.folder_config, folder_config)
+        change_list += folder_change_list
+        logger.info(f"changes: {change_list}")
+        if not folder_change_list:
+            if keeper_change_list:
+                self.event_reactor.keeper_install()
+            return
+
+        self.folder_config = folder_config
+        self.folder_keeper.apply_config(folder_config)
+        self.event_reactor.apply_config(folder_config)
+
+        watch_change_set = {"folder_path", "watcher_recursive"}
+        if watch_change_set.intersection(folder_change_list):
+            logger.info(f"reschedule: {folder_config.folder_path}")
+            self.folder_observer.unschedule(self.folder_watch)
+            self.folder_watch = self.folder_observer.schedule(
+                event_handler=self.event_reactor,
+                path=folder_config.folder_path,
+                recursive=folder_config.watcher_recursive,
+            )
+            if self.trace_recorder:
+                self.folder_observer.add_handler_for_watch(self.trace_recorder, self.folder_watch)
+
+        populate_change_set = watch_change_set | {"regex_include_list", "regex_exclude_list"}
+        if populate_change_set.intersection(folder_change_list):
+            self.event_reactor.populate_start()
+
+        lifecycle_change_set = {"folder_path", "keeper_expire", "keeper_diem_span"}
+        if keeper_change_list or lifecycle_change_set.intersection(folder_change_list):
+            self.event_reactor.keeper_install()
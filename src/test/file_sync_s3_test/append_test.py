@@ -0,0 +1,133 @@
+"""
+"""
+
+from file_sync_s3.append import *
+from file_sync_s3.aws_s3 import BucketOperatorS3, SupportFuncS3
+from file_sync_s3.dedup import DedupConfig, DedupIndex
+
+import os
+import tempfile
+
+MiB = 1024 * 1024
+
+
+class FakeClientS3:
+
+    def __init__(self):
+        self.object_dict = dict()
+        self.upload_dict = dict()
+        self.sent_size = 0
+
+    def head_object(self, Bucket, Key):
+        body, meta_data = self.object_dict[Key]
+        return dict(Metadata=meta_data, ETag=f"etag-{len(body)}")
+
+    def upload_file(self, Bucket, Filename, Key, ExtraArgs, Config, Callback):
+        with open(Filename, "rb") as file_unit:
+            body = file_unit.read()
+        self.sent_size += len(body)
+        self.object_dict[Key] = (body, dict(ExtraArgs['Metadata']))
+
+    def create_multipart_upload(self, Bucket, Key, Metadata, **kwargs):
+        self.upload_dict["upload-1"] = (Metadata, dict())
+        return dict(UploadId="upload-1")
+
+    def upload_part_copy(self, Bucket, Key, UploadId, PartNumber, CopySource, CopySourceIfMatch, CopySourceRange):
+        body, _ = self.object_dict[CopySource['Key']]
+        assert CopySourceIfMatch == f"etag-{len(body)}"
+        start, finish = map(int, CopySourceRange[len("bytes="):].split("-"))
+        self.upload_dict[UploadId][1][PartNumber] = body[start:finish + 1]
+        return dict(CopyPartResult=dict(ETag=f"part-{PartNumber}"))
+
+    def upload_part(self, Bucket, Key, UploadId, PartNumber, Body):
+        self.sent_size += len(Body)
+        self.upload_dict[UploadId][1][PartNumber] = Body
+        return dict(ETag=f"part-{PartNumber}")
+
+    def complete_multipart_upload(self, Bucket, Key, UploadId, MultipartUpload):
+        meta_data, part_dict = self.upload_dict.pop(UploadId)
+        number_list = [part['PartNumber'] for part in MultipartUpload['Parts']]
+        body = b"".join(part_dict[number] for number in number_list)
+        self.object_dict[Key] = (body, dict(meta_data))
+
+    def put_object(self, Bucket, Key, Body, Metadata, **kwargs):
+        self.object_dict[Key] = (Body, dict(Metadata))
+
+
+class FakeOperatorS3(BucketOperatorS3):
+
+    def __init__(self, dedup_mode:str="none"):
+        super().__init__(
+            dedup_index=DedupIndex(DedupConfig(dedup_mode=dedup_mode, index_path=":memory:")),
+            append_config=AppendConfig(append_enable=True, append_minimum=5 * MiB),
+        )
+        self.fake_client = FakeClientS3()
+
+    def client_s3(self):
+        return self.fake_client
+
+
+def test_part_plan():
+    print()
+
+    copy_list, tail_list = AppendSupport.part_plan(20 * MiB, 23 * MiB, 8 * MiB)
+    assert copy_list == [(0, 8 * MiB), (8 * MiB, 20 * MiB)]
+    assert tail_list == [(20 * MiB, 23 * MiB)]
+
+    assert not AppendSupport.has_append(1 * MiB, 2 * MiB, 0)
+    assert not AppendSupport.has_append(8 * MiB, 8 * MiB, 0)
+    assert AppendSupport.has_append(8 * MiB, 9 * MiB, 0)
+
+
+def test_digest_split():
+    print()
+
+    with tempfile.TemporaryDirectory() as base_dir:
+        file_path = os.path.join(base_dir, "file")
+        with open(file_path, "wb") as file_unit:
+            file_unit.write(b"head" + b"tail")
+        split_digest, total_digest = SupportFuncS3.digest_file_split(file_path, 4)
+        assert total_digest == SupportFuncS3.digest_file(file_path)
+        assert split_digest == SupportFuncS3.digest_file(file_path, 4)
+
+
+def test_append_put():
+    print()
+
+    bucket_operator = FakeOperatorS3()
+    fake_client = bucket_operator.fake_client
+    with tempfile.TemporaryDirectory() as base_dir:
+        file_path = os.path.join(base_dir, "file.log")
+        with open(file_path, "wb") as file_unit:
+            file_unit.write(os.urandom(6 * MiB))
+        bucket_operator.resource_put_sync(file_path, "file.log")
+        assert fake_client.sent_size == 6 * MiB
+        with open(file_path, "ab") as file_unit:
+            file_unit.write(os.urandom(1 * MiB))
+        bucket_operator.resource_put_sync(file_path, "file.log")
+        assert fake_client.sent_size == 7 * MiB
+        with open(file_path, "rb") as file_unit:
+            assert fake_client.object_dict["file.log"][0] == file_unit.read()
+
+
+def test_append_pointer():
+    print()
+
+    bucket_operator = FakeOperatorS3("pointer")
+    fake_client = bucket_operator.fake_client
+    with tempfile.TemporaryDirectory() as base_dir:
+        path_one = os.path.join(base_dir, "one.log")
+        path_two = os.path.join(base_dir, "two.log")
+        body = os.urandom(6 * MiB)
+        for file_path in [path_one, path_two]:
+            with open(file_path, "wb") as file_unit:
+                file_unit.write(body)
+        bucket_operator.resource_put_sync(path_one, "one.log")
+        bucket_operator.resource_put_sync(path_two, "two.log")
+        assert fake_client.object_dict["two.log"][0] == b""  # pointer has no body to copy from
+        with open(path_two, "ab") as file_unit:
+            file_unit.write(os.urandom(1 * MiB))
+        bucket_operator.resource_put_sync(path_two, "two.log")
+        assert fake_client.sent_size == 13 * MiB
+        with open(path_two, "rb") as file_unit:
+            assert fake_client.object_dict["two.log"][0] == file_unit.read()
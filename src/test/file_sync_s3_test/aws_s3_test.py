@@ -1,3 +1,14 @@
 """
 """
 
+import os
+import sys
+import subprocess
+
+
+def test_lazy_import():
+    print()
+
+    script = "import sys, file_sync_s3.watcher; assert 'boto3' not in sys.modules"
+    env = dict(os.environ, PYTHONPATH=os.pathsep.join(sys.path))
+    subprocess.run([sys.executable, "-c", script], env=env, check=True)
@@ -0,0 +1,165 @@
+"""
+"""
+
+from file_sync_s3.body import *
+from file_sync_s3.aws_s3 import AuthBucketS3, BucketOperatorS3
+from file_sync_s3.dedup import DedupConfig, DedupIndex
+
+import os
+import tempfile
+import threading
+
+from http.server import BaseHTTPRequestHandler
+from http.server import ThreadingHTTPServer
+from urllib.parse import parse_qsl, urlsplit
+
+MiB = 1024 * 1024
+
+
+class LocalHandlerS3(BaseHTTPRequestHandler):
+    "minimal s3 stand-in: object put and multipart upload"
+
+    protocol_version = "HTTP/1.1"
+    object_dict = dict()
+    part_dict = dict()
+
+    def log_message(self, *args):
+        pass
+
+    def read_body(self) -> bytes:
+        body = self.rfile.read(int(self.headers.get("content-length", 0)))
+        if "aws-chunked" in self.headers.get("content-encoding", ""):
+            plain = bytearray()
+            while True:
+                size_line, _, body = body.partition(b"\r\n")
+                size = int(size_line.split(b";")[0], 16)
+                if size == 0:
+                    break
+                plain += body[:size]
+                body = body[size + 2:]
+            body = bytes(plain)
+        return body
+
+    def reply(self, body:bytes=b"", header_dict:dict=None) -> None:
+        self.send_response(200)
+        for key, value in (header_dict or dict()).items():
+            self.send_header(key, value)
+        self.send_header("content-length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def do_PUT(self):
+        url_part = urlsplit(self.path)
+        query = dict(parse_qsl(url_part.query))
+        body = self.read_body()
+        if "partNumber" in query:
+            self.part_dict[int(query["partNumber"])] = body
+            self.reply(header_dict={"etag": f'"part-{query["partNumber"]}"'})
+        else:
+            self.object_dict[url_part.path] = body
+            self.reply(header_dict={"etag": '"object"'})
+
+    def do_POST(self):
+        url_part = urlsplit(self.path)
+        self.read_body()
+        if url_part.query == "uploads":
+            self.part_dict.clear()
+            self.reply(b"<InitiateMultipartUploadResult><UploadId>upload-1</UploadId></InitiateMultipartUploadResult>")
+        else:
+            self.object_dict[url_part.path] = b"".join(self.part_dict[key] for key in sorted(self.part_dict))
+            self.reply(b"<CompleteMultipartUploadResult><ETag>\"object\"</ETag></CompleteMultipartUploadResult>")
+
+    def do_HEAD(self):
+        self.send_response(404)
+        self.send_header("content-length", "0")
+        self.end_headers()
+
+
+class LocalOperatorS3(BucketOperatorS3):
+
+    def __init__(self, endpoint_url:str):
+        from boto3.s3.transfer import TransferConfig
+        super().__init__(
+            config_access=AuthBucketS3("us-east-1", "bucket", "private", "access", "secret"),
+            config_transfer=TransferConfig(multipart_chunksize=5 * MiB, max_concurrency=4),
+            dedup_index=DedupIndex(DedupConfig(dedup_mode="none", index_path=":memory:")),
+            body_config=BodyConfig(upload_mode="mmap"),
+        )
+        self.endpoint_url = endpoint_url
+
+    def client_s3(self):
+        if self.client_value is None:
+            import boto3
+            import botocore.config
+            self.client_value = boto3.session.Session().client(
+                's3',
+                region_name="us-east-1",
+                endpoint_url=self.endpoint_url,
+                aws_access_key_id="access",
+                aws_secret_access_key="secret",
+                config=botocore.config.Config(s3=dict(addressing_style="path")),
+            )
+        return self.client_value
+
+
+def test_body_provider():
+    print()
+
+    with tempfile.TemporaryDirectory() as base_dir:
+        file_path = os.path.join(base_dir, "file")
+        body = os.urandom(3 * mmap.PAGESIZE + 100)
+        with open(file_path, "wb") as file_unit:
+            file_unit.write(body)
+        with BodyProviderMmap(file_path, len(body)) as body_provider:
+            part_reader = body_provider.part_reader(100, 2 * mmap.PAGESIZE)
+            assert len(part_reader) == 2 * mmap.PAGESIZE
+            assert bytes(part_reader.read(10)) == body[100:110]
+            part_reader.seek(0)
+            assert bytes(part_reader.read()) == body[100:100 + 2 * mmap.PAGESIZE]
+            assert len(part_reader.read(10)) == 0
+            assert SupportFuncBody.content_md5(part_reader.part_view) == \
+                base64.b64encode(hashlib.md5(body[100:100 + 2 * mmap.PAGESIZE]).digest()).decode()
+            part_reader.close()
+            body_provider.part_release(100, 2 * mmap.PAGESIZE)
+        empty_path = os.path.join(base_dir, "empty")
+        open(empty_path, "wb").close()
+        with BodyProviderMmap(empty_path, 0) as body_provider:
+            assert len(body_provider.part_reader(0, 0)) == 0
+
+
+def test_body_read():
+    print()
+
+    with tempfile.TemporaryDirectory() as base_dir:
+        file_path = os.path.join(base_dir, "file")
+        body = os.urandom(3 * mmap.PAGESIZE)
+        with open(file_path, "wb") as file_unit:
+            file_unit.write(body)
+        with BodyProviderRead(file_path, len(body)) as body_provider:
+            assert bytes(body_provider.part_reader(100, mmap.PAGESIZE).read()) == body[100:100 + mmap.PAGESIZE]
+            os.truncate(file_path, mmap.PAGESIZE)
+            try:
+                body_provider.part_view(mmap.PAGESIZE, mmap.PAGESIZE)
+                assert False
+            except SnapshotChangeError as error:
+                assert error.local_path == file_path
+
+
+def test_mmap_put():
+    print()
+
+    server = ThreadingHTTPServer(("127.0.0.1", 0), LocalHandlerS3)
+    server_thread = threading.Thread(target=server.serve_forever, daemon=True)
+    server_thread.start()
+    try:
+        bucket_operator = LocalOperatorS3(f"http://127.0.0.1:{server.server_address[1]}")
+        with tempfile.TemporaryDirectory() as base_dir:
+            for name, size in [("small", 1000), ("large", 12 * MiB)]:
+                file_path = os.path.join(base_dir, name)
+                body = os.urandom(size)
+                with open(file_path, "wb") as file_unit:
+                    file_unit.write(body)
+                bucket_operator.resource_put_sync(file_path, name)
+                assert LocalHandlerS3.object_dict[f"/bucket/{name}"] == body
+    finally:
+        server.shutdown()
@@ -7,3 +7,34 @@ def test_config():
     print()
     
     print(CONFIG)
+
+
+def test_change_list():
+    print()
+
+    import dataclasses
+
+    @dataclasses.dataclass(frozen=True)
+    class Sample:
+        one:int
+        two:str
+
+    assert ConfigSupport.change_list(Sample(1, "a"), Sample(1, "a")) == []
+    assert ConfigSupport.change_list(Sample(1, "a"), Sample(2, "a")) == ["one"]
+
+
+def test_produce_bool():
+    print()
+
+    config_parser = ConfigParser(interpolation=EnvironmentInterpolation())
+    config_parser.read_string(
+        "[sample]\n"
+        "one@bool = no\n"
+        "two@bool = yes\n"
+        "three@bool = off\n"
+    )
+    section = config_parser['sample']
+    assert section['one@bool'] is False  # plain bool() of non empty text would be true
+    assert section['two@bool'] is True
+    assert section['three@bool'] is False
+    assert CONFIG['amazon/append']['append_enable@bool'] is False
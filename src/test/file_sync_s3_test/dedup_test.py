@@ -0,0 +1,140 @@
+"""
+"""
+
+from file_sync_s3.dedup import *
+from file_sync_s3.aws_s3 import BucketOperatorS3, SupportFuncS3
+from file_sync_s3.route import ObjectRouter, RouteConfig, RouteRule
+
+import os
+import tempfile
+
+
+def route_args(extra_args:dict) -> dict:
+    return {key: value for key, value in extra_args.items() if key in SupportFuncS3.route_key_list}
+
+
+class FakeClientS3:
+
+    def __init__(self):
+        self.object_dict = dict()
+        self.upload_count = 0
+
+    def head_object(self, Bucket, Key):
+        _, meta, route_args = self.object_dict[Key]
+        return dict(route_args, Metadata=meta)
+
+    def upload_file(self, Bucket, Filename, Key, ExtraArgs, Config, Callback):
+        self.upload_count += 1
+        with open(Filename, "rb") as file_unit:
+            self.object_dict[Key] = (file_unit.read(), dict(ExtraArgs['Metadata']), route_args(ExtraArgs))
+
+    def copy(self, CopySource, Bucket, Key, ExtraArgs, Config):
+        body = self.object_dict[CopySource['Key']][0]
+        self.object_dict[Key] = (body, dict(ExtraArgs['Metadata']), route_args(ExtraArgs))
+
+    def put_object(self, Bucket, Key, Body, Metadata, **kwargs):
+        self.object_dict[Key] = (Body, dict(Metadata), route_args(kwargs))
+
+    def delete_object(self, Bucket, Key):
+        del self.object_dict[Key]
+
+
+class FakeOperatorS3(BucketOperatorS3):
+
+    def __init__(self, dedup_mode, object_router=None):
+        super().__init__(
+            dedup_index=DedupIndex(DedupConfig(dedup_mode=dedup_mode, index_path=":memory:")),
+            object_router=object_router or ObjectRouter(RouteConfig(route_cache_size=16, rule_list=())),
+        )
+        self.fake_client = FakeClientS3()
+
+    def client_s3(self):
+        return self.fake_client
+
+
+def produce_file(base_dir, name, body):
+    file_path = os.path.join(base_dir, name)
+    with open(file_path, "wb") as file_unit:
+        file_unit.write(body)
+    return file_path
+
+
+def test_dedup_index():
+    print()
+
+    dedup_index = DedupIndex(DedupConfig(dedup_mode="copy", index_path=":memory:"))
+    assert dedup_index.digest_lookup("abc") is None
+    dedup_index.digest_record("abc", "a/one")
+    dedup_index.digest_record("abc", "b/one", "a/one")
+    assert dedup_index.digest_lookup("abc") == "a/one"
+    assert dedup_index.referrer_list("a/one") == ["b/one"]
+    dedup_index.remot_rebase("a/one", "b/one")
+    dedup_index.remot_forget("a/one")
+    assert dedup_index.digest_lookup("abc") == "b/one"
+    assert dedup_index.referrer_list("a/one") == []
+
+
+def test_dedup_copy():
+    print()
+
+    bucket_operator = FakeOperatorS3("copy")
+    with tempfile.TemporaryDirectory() as base_dir:
+        path_one = produce_file(base_dir, "one", b"payload")
+        path_two = produce_file(base_dir, "two", b"payload")
+        bucket_operator.resource_put_sync(path_one, "a/one")
+        bucket_operator.resource_put_sync(path_two, "b/two")
+
+    fake_client = bucket_operator.fake_client
+    assert fake_client.upload_count == 1
+    assert fake_client.object_dict["b/two"][0] == b"payload"
+
+
+def test_dedup_pointer():
+    print()
+
+    bucket_operator = FakeOperatorS3("pointer")
+    with tempfile.TemporaryDirectory() as base_dir:
+        path_one = produce_file(base_dir, "one", b"payload")
+        path_two = produce_file(base_dir, "two", b"payload")
+        bucket_operator.resource_put_sync(path_one, "a/one")
+        bucket_operator.resource_put_sync(path_two, "b/two")
+
+    fake_client = bucket_operator.fake_client
+    assert fake_client.upload_count == 1
+    assert fake_client.object_dict["b/two"][1][SupportFuncS3.key_entry_pointer] == "a/one"
+
+    with tempfile.TemporaryDirectory() as base_dir:
+        path_one = produce_file(base_dir, "one", b"payload")
+        os.utime(path_one, (1000, 1000))
+        bucket_operator.resource_put_sync(path_one, "a/one")  # same content, new time
+    assert fake_client.upload_count == 2
+    assert fake_client.object_dict["b/two"][1][SupportFuncS3.key_entry_pointer] == "a/one"
+
+    bucket_operator.resource_delete_sync("a/one")
+    assert fake_client.object_dict["b/two"][0] == b"payload"
+    assert SupportFuncS3.key_entry_pointer not in fake_client.object_dict["b/two"][1]
+
+
+def test_dedup_promote_route():
+    print()
+
+    route_rule = RouteRule(
+        rule_name="cold",
+        regex_include_list=[".+/two\\Z"],
+        regex_exclude_list=[],
+        storage_class="GLACIER_IR",
+        content_type="application/x-tar",
+        cache_control="",
+        sse_mode="AES256",
+        sse_key_id="",
+        key_prefix="",
+    )
+    bucket_operator = FakeOperatorS3("pointer", ObjectRouter(RouteConfig(route_cache_size=16, rule_list=(route_rule,))))
+    with tempfile.TemporaryDirectory() as base_dir:
+        bucket_operator.resource_put_sync(produce_file(base_dir, "one", b"payload"), "a/one")
+        bucket_operator.resource_put_sync(produce_file(base_dir, "two", b"payload"), "b/two")
+
+    bucket_operator.resource_delete_sync("a/one")
+    body, meta, route_args = bucket_operator.fake_client.object_dict["b/two"]
+    assert body == b"payload" and SupportFuncS3.key_entry_pointer not in meta
+    assert route_args == dict(StorageClass="GLACIER_IR", ContentType="application/x-tar", ServerSideEncryption="AES256")
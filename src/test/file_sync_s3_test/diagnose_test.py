@@ -0,0 +1,110 @@
+"""
+"""
+
+from file_sync_s3.diagnose import *
+from file_sync_s3.aws_s3 import BucketOperatorS3
+from file_sync_s3.dedup import DedupConfig, DedupIndex
+from file_sync_s3.watcher import FolderConfig, WatcherOperator, FileModifiedEvent
+
+import tempfile
+import dataclasses
+
+from datetime import timedelta
+
+
+def produce_config(diagnose_path:str) -> DiagnoseConfig:
+    return DiagnoseConfig(diagnose_path=diagnose_path, profile_duration=0.3, profile_interval=0.01, inflight_limit=2)
+
+
+def test_stage_timer():
+    print()
+
+    stage_timer = StageTimer()
+    with stage_timer.stage("expire"):
+        pass
+    with stage_timer.stage("schedule"):
+        time.sleep(0.05)
+        report = stage_timer.report_dict()
+        assert [entry['stage'] for entry in report['active']] == ["schedule"]
+    with stage_timer.stage("schedule"):
+        pass
+    report = stage_timer.report_dict()
+    assert report['active'] == []
+    assert report['total']['expire']['count'] == 1
+    assert report['total']['schedule']['count'] == 2
+    assert report['total']['schedule']['longest'] >= 0.05
+
+
+def test_sampling_profiler():
+    print()
+
+    def stalled_worker(finish_event:threading.Event) -> None:
+        finish_event.wait()
+
+    with tempfile.TemporaryDirectory() as base_dir:
+        finish_event = threading.Event()
+        worker = threading.Thread(target=stalled_worker, args=(finish_event,), name="stalled", daemon=True)
+        worker.start()
+        profile_path = os.path.join(base_dir, "profile.txt")
+        sampling_profiler = SamplingProfiler(profile_path, 0.2, 0.01)
+        sampling_profiler.start()
+        sampling_profiler.join()
+        finish_event.set()
+        assert sampling_profiler.sample_count > 5
+        with open(profile_path) as file_unit:
+            line_list = file_unit.read().splitlines()
+        stalled_list = [line for line in line_list if line.startswith("stalled;")]
+        assert len(stalled_list) == 1
+        assert "stalled_worker" in stalled_list[0]
+        assert int(stalled_list[0].rsplit(" ", 1)[1]) == sampling_profiler.sample_count
+        assert not any(line.startswith("sampling_profiler;") for line in line_list)
+
+
+def test_state_dump():
+    print()
+
+    with tempfile.TemporaryDirectory() as base_dir:
+        folder_config = FolderConfig(
+            folder_path=base_dir,
+            watcher_timeout=5,
+            watcher_recursive=False,
+            regex_include_list=[".+[.]gz"],
+            regex_exclude_list=[],
+            keeper_expire=False,
+            keeper_diem_span=3,
+            keeper_scan_period=timedelta(hours=1),
+        )
+        bucket_operator = BucketOperatorS3(dedup_index=DedupIndex(DedupConfig(dedup_mode="none", index_path=":memory:")))
+        watcher_operator = WatcherOperator(folder_config=folder_config, bucket_operator=bucket_operator)
+        diagnose_operator = DiagnoseOperator(watcher_operator, produce_config(os.path.join(base_dir, "diagnose")))
+        event_reactor = watcher_operator.event_reactor
+        before = time.time()
+        event_reactor.on_any_event(FileModifiedEvent(f"{base_dir}/one.gz"))
+        event_reactor.on_any_event(FileModifiedEvent(f"{base_dir}/two.gz"))
+
+        progress_tracker = bucket_operator.progress_tracker
+        with progress_tracker.transfer("small.gz", 10), progress_tracker.transfer("large.gz", 1000) as progress_counter:
+            with progress_tracker.transfer("medium.gz", 100):
+                progress_counter(300)
+                with event_reactor.stage_timer.stage("schedule"):
+                    state_path = diagnose_operator.state_dump()
+
+        with open(state_path) as file_unit:
+            state = json.load(file_unit)
+        assert state['pending']['count'] == 2
+        assert before + 5 <= state['pending']['oldest_deadline'] <= time.time() + 5
+        assert state['pending']['overdue'] < 0
+        assert state['inflight']['count'] == 3
+        assert state['inflight']['transfer'] == [
+            dict(name="large.gz", total=1000, wired=300),
+            dict(name="medium.gz", total=100, wired=0),
+        ]
+        assert state['pool']['pool_busy'] == 3
+        assert state['stage']['active'][0]['stage'] == "schedule"
+        assert state['engine'] is None
+
+        diagnose_operator.diagnose_config = dataclasses.replace(diagnose_operator.diagnose_config, profile_duration=10.0)
+        profile_path = diagnose_operator.profile_start()
+        assert diagnose_operator.profile_start() == profile_path  # single profiler at a time
+        diagnose_operator.terminate()
+        assert os.path.exists(profile_path)
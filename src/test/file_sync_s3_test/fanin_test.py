@@ -0,0 +1,188 @@
+"""
+"""
+
+from file_sync_s3.fanin import *
+from file_sync_s3.aws_s3 import MetaEntryS3, SupportFuncS3
+from file_sync_s3.route import ObjectRouter, RouteConfig, RouteRule
+from file_sync_s3.watcher import EventReactor, FolderConfig
+
+import time
+import tempfile
+
+from datetime import datetime, timedelta, timezone
+
+
+class ListOperator:
+
+    def __init__(self, object_dict:dict, meta_dict:dict=None):
+        self.object_dict = object_dict
+        self.meta_dict = meta_dict or dict()  # key -> stored entry meta
+        self.prefix_list = []
+        self.head_list = []
+
+    def remot_list(self, prefix):
+        self.prefix_list.append(prefix)
+        return {key: value for key, value in self.object_dict.items() if key.startswith(prefix)}
+
+    def remot_meta(self, key):
+        self.head_list.append(key)
+        return self.meta_dict.get(key, SupportFuncS3.meta_nothing())
+
+
+def test_folder_fanin():
+    print()
+
+    folder_fanin = FolderFanin(FaninConfig(fanin_enable=True, fanin_rate=3))
+    assert not folder_fanin.observe("/base/tree/one.gz", None, 10.1)
+    assert not folder_fanin.observe("/base/tree/two.gz", None, 10.2)
+    assert not folder_fanin.observe("/base/tree/one.gz", None, 11.0)  # new window
+    assert not folder_fanin.observe("/base/tree/one.gz", None, 11.1)
+    assert folder_fanin.observe("/base/tree/one.gz", None, 11.2)  # rate reached
+    assert folder_fanin.observe("/base/tree/deep/six.gz", None, 11.3)
+    assert not folder_fanin.observe("/base/tree/one.gz", "/base/away/one.gz", 11.4)
+    assert not folder_fanin.observe("/base/other/one.gz", None, 11.5)
+    assert len(folder_fanin) == 1
+
+    assert folder_fanin.settled_list(12.0, 1.0) == []
+    assert folder_fanin.settled_list(12.5, 1.0) == ["/base/tree"]
+    assert len(folder_fanin) == 0
+
+
+def test_reconcile():
+    print()
+
+    with tempfile.TemporaryDirectory() as base_dir:
+        tree_dir = os.path.join(base_dir, "tree")
+        os.makedirs(os.path.join(tree_dir, "deep"))
+        for name, body in [("same.gz", b"same"), ("grown.gz", b"grown"), ("fresh.gz", b"fresh"), ("deep/skip.txt", b"skip")]:
+            with open(os.path.join(tree_dir, name), "wb") as file_unit:
+                file_unit.write(body)
+        future = datetime.now(timezone.utc) + timedelta(hours=1)
+        bucket_operator = ListOperator({
+            "tree/same.gz": (4, future),
+            "tree/grown.gz": (4, future),
+            "tree/gone.gz": (4, future),
+            "tree/deep/gone.gz": (4, future),
+            "tree/gone.txt": (4, future),
+            "other/gone.gz": (4, future),
+        })
+        folder_config = FolderConfig(
+            folder_path=base_dir,
+            watcher_timeout=1,
+            watcher_recursive=True,
+            regex_include_list=[".+[.]gz"],
+            regex_exclude_list=[],
+            keeper_expire=False,
+            keeper_diem_span=3,
+            keeper_scan_period=timedelta(hours=1),
+        )
+        event_reactor = EventReactor(
+            folder_config=folder_config,
+            bucket_operator=bucket_operator,
+            folder_fanin=FolderFanin(FaninConfig(fanin_enable=True, fanin_rate=1)),
+        )
+        event_reactor.perform_reconcile(tree_dir)
+        assert bucket_operator.prefix_list == ["tree/"]
+
+        entry_list = event_reactor.pending_store.expire_list(time.time() + 10, 1, 100)
+        assert sorted((entry.event.event_type, event_reactor.remot_path(entry.event.src_path)) for entry in entry_list) == [
+            ("deleted", "tree/deep/gone.gz"),
+            ("deleted", "tree/gone.gz"),
+            ("modified", "tree/fresh.gz"),
+            ("modified", "tree/grown.gz"),
+        ]
+
+
+def test_reconcile_route():
+    print()
+
+    with tempfile.TemporaryDirectory() as base_dir:
+        os.makedirs(os.path.join(base_dir, "deep"))
+        for name, body in [("same.gz", b"same"), ("deep/kept.tar", b"kept")]:
+            with open(os.path.join(base_dir, name), "wb") as file_unit:
+                file_unit.write(body)
+        future = datetime.now(timezone.utc) + timedelta(hours=1)
+        bucket_operator = ListOperator({
+            "same.gz": (4, future),
+            "archive/deep/kept.tar": (4, future),
+            "archive/gone.tar": (4, future),
+        })
+        folder_config = FolderConfig(
+            folder_path=base_dir,
+            watcher_timeout=1,
+            watcher_recursive=True,
+            regex_include_list=[".+[.]gz", ".+[.]tar"],
+            regex_exclude_list=[],
+            keeper_expire=False,
+            keeper_diem_span=3,
+            keeper_scan_period=timedelta(hours=1),
+        )
+        route_rule = RouteRule(
+            rule_name="archive",
+            regex_include_list=[".+[.]tar\\Z"],
+            regex_exclude_list=[],
+            storage_class="",
+            content_type="",
+            cache_control="",
+            sse_mode="",
+            sse_key_id="",
+            key_prefix="archive/",
+        )
+        event_reactor = EventReactor(
+            folder_config=folder_config,
+            bucket_operator=bucket_operator,
+            object_router=ObjectRouter(RouteConfig(route_cache_size=16, rule_list=(route_rule,))),
+        )
+        event_reactor.perform_reconcile(base_dir)
+        assert sorted(bucket_operator.prefix_list) == ["", "archive/"]
+
+        entry_list = event_reactor.pending_store.expire_list(time.time() + 10, 1, 100)
+        assert [(entry.event.event_type, event_reactor.remot_path(entry.event.src_path)) for entry in entry_list] == [
+            ("deleted", "archive/gone.tar"),
+        ]
+
+
+def test_reconcile_meta():
+    print()
+
+    with tempfile.TemporaryDirectory() as base_dir:
+        for name, body in [("sparse.gz", b"sparse"), ("pointer.gz", b"pointer"), ("copied.gz", b"copied"), ("plain.gz", b"plain")]:
+            with open(os.path.join(base_dir, name), "wb") as file_unit:
+                file_unit.write(body)
+        os.utime(os.path.join(base_dir, "copied.gz"), (1000, 1000))  # preserved mtime of an older copy
+
+        def stored_meta(name):
+            file_stat = os.stat(os.path.join(base_dir, name))
+            return MetaEntryS3(length=file_stat.st_size, modified=SupportFuncS3.convert_unix_time(file_stat.st_mtime))
+
+        future = datetime.now(timezone.utc) + timedelta(hours=1)
+        past = datetime.now(timezone.utc) - timedelta(hours=1)
+        bucket_operator = ListOperator(
+            {
+                "sparse.gz": (2, future),  # packed data extents
+                "pointer.gz": (0, future),  # dedup pointer
+                "copied.gz": (6, past),
+                "plain.gz": (5, future),
+            },
+            {
+                "sparse.gz": stored_meta("sparse.gz"),
+                "pointer.gz": stored_meta("pointer.gz"),
+                "copied.gz": MetaEntryS3(length=6, modified=SupportFuncS3.convert_unix_time(2000)),
+            },
+        )
+        folder_config = FolderConfig(
+            folder_path=base_dir,
+            watcher_timeout=1,
+            watcher_recursive=True,
+            regex_include_list=[".+[.]gz"],
+            regex_exclude_list=[],
+            keeper_expire=False,
+            keeper_diem_span=3,
+            keeper_scan_period=timedelta(hours=1),
+        )
+        event_reactor = EventReactor(folder_config=folder_config, bucket_operator=bucket_operator)
+        event_reactor.perform_reconcile(base_dir)
+        assert sorted(bucket_operator.head_list) == ["copied.gz", "pointer.gz", "sparse.gz"]  # listing decides for plain
+
+        entry_list = event_reactor.pending_store.expire_list(time.time() + 10, 1, 100)
+        assert [event_reactor.remot_path(entry.event.src_path) for entry in entry_list] == ["copied.gz"]
@@ -0,0 +1,164 @@
+"""
+"""
+
+from file_sync_s3.keeper import *
+from file_sync_s3.aws_s3 import BucketOperatorS3
+from file_sync_s3.dedup import DedupConfig, DedupIndex
+from file_sync_s3.route import ObjectRouter, RouteConfig, RouteRule
+from file_sync_s3.schedule import PriorityClass
+from file_sync_s3.watcher import EventReactor, FolderConfig, FileDeletedEvent
+
+from botocore.exceptions import ClientError
+
+
+class KeeperClientS3:
+
+    def __init__(self):
+        self.delete_list = []
+        self.copy_list = []
+        self.rule_list = None
+
+    def delete_objects(self, Bucket, Delete):
+        assert len(Delete['Objects']) <= 1000
+        self.delete_list.append([entry['Key'] for entry in Delete['Objects']])
+        return dict()
+
+    def copy(self, CopySource, Bucket, Key, ExtraArgs, Config):
+        assert CopySource['Key'] == Key
+        self.copy_list.append((Key, ExtraArgs))
+
+    def get_bucket_lifecycle_configuration(self, Bucket):
+        if self.rule_list is None:
+            raise ClientError(dict(Error=dict(Code="NoSuchLifecycleConfiguration")), "GetBucketLifecycleConfiguration")
+        return dict(Rules=self.rule_list)
+
+    def put_bucket_lifecycle_configuration(self, Bucket, LifecycleConfiguration):
+        self.rule_list = LifecycleConfiguration['Rules']
+
+
+class KeeperOperatorS3(BucketOperatorS3):
+
+    def __init__(self, object_router:ObjectRouter=None, dedup_mode:str="none"):
+        super().__init__(
+            dedup_index=DedupIndex(DedupConfig(dedup_mode=dedup_mode, index_path=":memory:")),
+            object_router=object_router or ObjectRouter(RouteConfig(route_cache_size=16, rule_list=())),
+        )
+        self.fake_client = KeeperClientS3()
+
+    def client_s3(self):
+        return self.fake_client
+
+
+def produce_reactor(keeper_remote:str, keeper_lifecycle:bool, object_router:ObjectRouter=None, dedup_mode:str="none") -> EventReactor:
+    folder_config = FolderConfig(
+        folder_path="/base",
+        watcher_timeout=1,
+        watcher_recursive=True,
+        regex_include_list=[".+[.]gz"],
+        regex_exclude_list=[],
+        keeper_expire=True,
+        keeper_diem_span=30,
+        keeper_scan_period=timedelta(hours=1),
+    )
+    keeper_config = KeeperConfig(
+        keeper_remote=keeper_remote,
+        keeper_storage_class="GLACIER_IR",
+        keeper_lifecycle=keeper_lifecycle,
+        keeper_rule_id="file_sync_s3-keeper",
+    )
+    return EventReactor(
+        folder_config=folder_config,
+        bucket_operator=KeeperOperatorS3(object_router, dedup_mode),
+        keeper_config=keeper_config,
+    )
+
+
+def test_keeper_delete():
+    print()
+
+    event_reactor = produce_reactor("delete", False)
+    for index in range(2500):
+        event_reactor.expire_notice(f"/base/data/file-{index}.gz")
+    event_reactor.on_any_event(FileDeletedEvent("/base/data/file-0.gz"))
+    assert len(event_reactor.pending_store) == 0
+
+    event_reactor.perform_keeper()
+    delete_list = event_reactor.bucket_operator.fake_client.delete_list
+    assert [len(batch) for batch in delete_list] == [1000, 1000, 500]
+    assert delete_list[0][0] == "data/file-0.gz"
+    assert event_reactor.keeper_remot_list == []
+
+
+def test_keeper_transition():
+    print()
+
+    route_rule = RouteRule(
+        rule_name="secret",
+        regex_include_list=[".+/secret/.+"],
+        regex_exclude_list=[],
+        storage_class="STANDARD_IA",
+        content_type="",
+        cache_control="",
+        sse_mode="aws:kms",
+        sse_key_id="key-1",
+        key_prefix="",
+    )
+    object_router = ObjectRouter(RouteConfig(route_cache_size=16, rule_list=(route_rule,)))
+    event_reactor = produce_reactor("transition", False, object_router)
+    event_reactor.expire_notice("/base/secret/file.gz")
+    event_reactor.expire_notice("/base/plain/file.gz")
+
+    event_reactor.perform_keeper()
+    copy_dict = dict(event_reactor.bucket_operator.fake_client.copy_list)
+    assert copy_dict["secret/file.gz"] == dict(
+        ACL=event_reactor.bucket_operator.config_access.object_mode,
+        StorageClass="GLACIER_IR",
+        ServerSideEncryption="aws:kms",
+        SSEKMSKeyId="key-1",
+        MetadataDirective="COPY",
+    )
+    assert "ServerSideEncryption" not in copy_dict["plain/file.gz"]
+    assert event_reactor.keeper_remot_list == []
+
+
+def test_keeper_event():
+    print()
+
+    event_reactor = produce_reactor("event", False)
+    event_reactor.expire_notice("/base/file.gz")
+    event_reactor.on_any_event(FileDeletedEvent("/base/file.gz"))
+    assert event_reactor.pending_store.lookup("/base/file.gz")[2] == PriorityClass.keeper
+    assert event_reactor.keeper_remot_list == []
+
+
+def test_keeper_lifecycle():
+    print()
+
+    event_reactor = produce_reactor("transition", True)
+    bucket_operator = event_reactor.bucket_operator
+    fake_client = bucket_operator.fake_client
+
+    event_reactor.keeper_install()  # folder maps to bucket root
+    assert fake_client.rule_list is None
+    event_reactor.expire_notice("/base/file.gz")
+    assert event_reactor.keeper_remot_list == [("/base/file.gz", "file.gz")]  # per object requests instead
+
+    keeper_config = event_reactor.keeper_config
+    assert SupportFuncKeeper.lifecycle_refusal("data/", True)
+    assert SupportFuncKeeper.lifecycle_refusal("data/", False) is None
+    rule = SupportFuncKeeper.lifecycle_rule(keeper_config, "data/", 30)
+    bucket_operator.lifecycle_install(rule)
+    assert fake_client.rule_list == [dict(
+        ID="file_sync_s3-keeper",
+        Filter=dict(Prefix="data/"),
+        Status="Enabled",
+        Transitions=[dict(Days=30, StorageClass="GLACIER_IR")],
+    )]
+
+    fake_client.rule_list.insert(0, dict(ID="foreign"))
+    bucket_operator.lifecycle_install(rule)
+    assert [rule['ID'] for rule in fake_client.rule_list] == ["foreign", "file_sync_s3-keeper"]
+
+    event_reactor = produce_reactor("delete", True, dedup_mode="pointer")
+    event_reactor.keeper_install()
+    assert event_reactor.bucket_operator.fake_client.rule_list is None
@@ -0,0 +1,199 @@
+"""
+"""
+
+from file_sync_s3.layout import *
+from file_sync_s3.aws_s3 import BucketOperatorS3, SupportFuncS3
+from file_sync_s3.dedup import DedupConfig, DedupIndex
+from file_sync_s3.watcher import EventReactor, FolderConfig
+
+import tempfile
+import threading
+
+from datetime import datetime, timedelta, timezone
+
+
+class LayoutPaginator:
+
+    def __init__(self, object_dict:dict):
+        self.object_dict = object_dict
+
+    def paginate(self, Bucket, Prefix):
+        yield dict(Contents=[
+            dict(Key=key, Size=len(entry['Body']), LastModified=entry['LastModified'])
+            for key, entry in sorted(self.object_dict.items()) if key.startswith(Prefix)
+        ])
+
+
+class LayoutClientS3:
+
+    def __init__(self):
+        self.object_dict = dict()
+        self.object_lock = threading.Lock()
+        self.list_count = 0
+
+    def get_paginator(self, name):
+        with self.object_lock:
+            self.list_count += 1
+        return LayoutPaginator(self.object_dict)
+
+    def head_object(self, Bucket, Key):
+        entry = self.object_dict[Key]
+        return dict(entry['RouteArgs'], ContentLength=len(entry['Body']), Metadata=entry['Metadata'])
+
+    def put_object(self, Bucket, Key, Body, ACL, Metadata, **kwargs):
+        with self.object_lock:
+            self.object_dict[Key] = dict(Body=Body, Metadata=Metadata, LastModified=datetime.now(timezone.utc), RouteArgs=kwargs)
+
+    def copy(self, CopySource, Bucket, Key, ExtraArgs, Config):
+        assert ExtraArgs['MetadataDirective'] == "COPY"
+        route_args = {key: value for key, value in ExtraArgs.items() if key in SupportFuncS3.route_key_list}
+        with self.object_lock:
+            self.object_dict[Key] = dict(self.object_dict[CopySource['Key']], RouteArgs=route_args)  # class and encryption are not copied
+
+    def delete_objects(self, Bucket, Delete):
+        with self.object_lock:
+            for entry in Delete['Objects']:
+                self.object_dict.pop(entry['Key'])
+        return dict()
+
+
+class LayoutOperatorS3(BucketOperatorS3):
+
+    def __init__(self, dedup_mode:str="none"):
+        super().__init__(
+            dedup_index=DedupIndex(DedupConfig(dedup_mode=dedup_mode, index_path=":memory:")),
+        )
+        self.fake_client = LayoutClientS3()
+
+    def client_s3(self):
+        return self.fake_client
+
+
+def test_key_layout():
+    print()
+
+    flat_layout = KeyLayout(LayoutConfig(layout_mode="flat", shard_width=2))
+    assert flat_layout.remot_key("tree/file.gz") == "tree/file.gz"
+    assert flat_layout.prefix_list("tree/") == ["tree/"]
+
+    shard_layout = KeyLayout(LayoutConfig(layout_mode="shard", shard_width=2))
+    remot_key = shard_layout.remot_key("tree/file.gz")
+    assert remot_key == shard_layout.remot_key("tree/file.gz")
+    assert remot_key.endswith("/tree/file.gz") and len(remot_key.split("/")[0]) == 2
+    assert shard_layout.plain_key(remot_key) == "tree/file.gz"
+    assert shard_layout.plain_key("zz/tree/file.gz") is None
+    assert len(shard_layout.prefix_list("tree/")) == 256
+
+    shard_set = {shard_layout.remot_key(f"file-{index}.gz")[:2] for index in range(10000)}
+    assert len(shard_set) == 256
+
+
+def test_layout_migrate():
+    print()
+
+    bucket_operator = LayoutOperatorS3("pointer")
+    fake_client = bucket_operator.fake_client
+    for index in range(50):
+        fake_client.put_object("", f"tree/file-{index}.gz", b"data", "", dict())
+    fake_client.put_object("", "tree/pointer.gz", b"", "", {SupportFuncS3.key_entry_pointer: "tree/file-0.gz"})
+    bucket_operator.dedup_index.digest_record("digest", "tree/file-0.gz")
+    bucket_operator.dedup_index.digest_record("digest", "tree/pointer.gz", "tree/file-0.gz")
+
+    flat_layout = KeyLayout(LayoutConfig(layout_mode="flat", shard_width=1))
+    shard_layout = KeyLayout(LayoutConfig(layout_mode="shard", shard_width=1))
+    layout_migrator = LayoutMigrator(bucket_operator, flat_layout, shard_layout)
+    assert layout_migrator.migrate("tree/") == 51
+
+    assert sorted(shard_layout.remot_list(bucket_operator, "tree/")) == sorted(
+        [f"tree/file-{index}.gz" for index in range(50)] + ["tree/pointer.gz"]
+    )
+    assert not any(key.startswith("tree/") for key in fake_client.object_dict)
+
+    origin_key = shard_layout.remot_key("tree/file-0.gz")
+    pointer_head = fake_client.head_object("", shard_layout.remot_key("tree/pointer.gz"))
+    assert SupportFuncS3.meta_pointer(pointer_head) == origin_key
+    assert bucket_operator.dedup_index.digest_lookup("digest") == origin_key
+    assert bucket_operator.dedup_index.referrer_list(origin_key) == [shard_layout.remot_key("tree/pointer.gz")]
+
+    assert LayoutMigrator(bucket_operator, shard_layout, shard_layout).migrate("tree/") == 0
+
+
+def test_layout_migrate_rerun():
+    print()
+
+    bucket_operator = LayoutOperatorS3("none")
+    fake_client = bucket_operator.fake_client
+    for index in range(20):
+        fake_client.put_object("", f"tree/file-{index}.gz", b"data", "", dict())
+    fake_client.put_object("", ".file_sync_s3/lease/node-1", b"", "", dict())
+    route_args = dict(StorageClass="GLACIER_IR", ServerSideEncryption="aws:kms", SSEKMSKeyId="key-1")
+    fake_client.put_object("", "tree/file-0.gz", b"data", "", dict(), **route_args)
+
+    flat_layout = KeyLayout(LayoutConfig(layout_mode="flat", shard_width=2))
+    shard_layout = KeyLayout(LayoutConfig(layout_mode="shard", shard_width=2))
+    layout_migrator = LayoutMigrator(bucket_operator, flat_layout, shard_layout, [".file_sync_s3/lease/"])
+    assert layout_migrator.migrate("tree/", keep_source=True) == 20  # interrupted run, sources remain
+    fake_client.put_object("", "tree/file-20.gz", b"data", "", dict())
+    key_set = set(fake_client.object_dict)
+
+    assert layout_migrator.migrate("") == 21  # flat sources, not the already sharded keys
+    assert ".file_sync_s3/lease/node-1" in fake_client.object_dict
+    assert sorted(fake_client.object_dict) == sorted(
+        [".file_sync_s3/lease/node-1"] + [shard_layout.remot_key(f"tree/file-{index}.gz") for index in range(21)]
+    )
+    assert key_set - set(fake_client.object_dict) == {f"tree/file-{index}.gz" for index in range(21)}
+    assert layout_migrator.migrate("") == 0
+    assert fake_client.head_object("", shard_layout.remot_key("tree/file-0.gz")) == dict(
+        route_args, ContentLength=4, Metadata=dict(),
+    )
+
+
+def test_layout_reactor():
+    print()
+
+    bucket_operator = LayoutOperatorS3()
+    folder_config = FolderConfig(
+        folder_path="/base",
+        watcher_timeout=1,
+        watcher_recursive=True,
+        regex_include_list=[".+"],
+        regex_exclude_list=[],
+        keeper_expire=False,
+        keeper_diem_span=3,
+        keeper_scan_period=timedelta(hours=1),
+    )
+    event_reactor = EventReactor(
+        folder_config=folder_config,
+        bucket_operator=bucket_operator,
+        key_layout=KeyLayout(LayoutConfig(layout_mode="shard", shard_width=1)),
+    )
+    remot_path = event_reactor.remot_path("/base/tree/file.gz")
+    assert remot_path == SupportFuncLayout.shard_name("tree/file.gz", 1) + "/tree/file.gz"
+    assert event_reactor.plain_path("/base/tree/file.gz") == "tree/file.gz"
+
+    bucket_operator.fake_client.put_object("", remot_path, b"data", "", dict())
+    remot_dict = event_reactor.key_layout.remot_list(bucket_operator, "tree/")
+    assert list(remot_dict) == ["tree/file.gz"]
+    assert bucket_operator.fake_client.list_count == 16
+
+
+def test_layout_reconfigure():
+    print()
+
+    key_layout = KeyLayout(LayoutConfig(layout_mode="flat", shard_width=2))
+    home_dir = os.environ.get('HOME')
+    with tempfile.TemporaryDirectory() as base_dir:
+        with open(os.path.join(base_dir, ".file_sync_s3.ini"), "w") as file_unit:
+            file_unit.write(
+                "[amazon/layout]\n"
+                "layout_mode = shard\n"
+            )
+        try:
+            os.environ['HOME'] = base_dir
+            CONFIG.reload()
+            assert key_layout.reconfigure() == []
+        finally:
+            os.environ['HOME'] = home_dir
+            CONFIG.reload()
+    assert not key_layout.has_shard()  # live keys stay where they are
+    assert key_layout.remot_key("tree/file.gz") == "tree/file.gz"
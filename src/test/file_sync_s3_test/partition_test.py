@@ -0,0 +1,225 @@
+"""
+"""
+
+from file_sync_s3.partition import *
+from file_sync_s3.aws_s3 import AuthBucketS3, BucketOperatorS3
+from file_sync_s3.dedup import DedupConfig, DedupIndex
+from file_sync_s3.watcher import EventReactor, FolderConfig, FileModifiedEvent
+
+from watchdog.events import FileMovedEvent
+
+import hashlib
+import itertools
+import threading
+
+from datetime import timedelta
+from email.utils import format_datetime
+from http.server import BaseHTTPRequestHandler
+from http.server import ThreadingHTTPServer
+from urllib.parse import parse_qsl, unquote, urlsplit
+from xml.sax.saxutils import escape
+
+
+class LeaseHandlerS3(BaseHTTPRequestHandler):
+    "minimal s3 stand-in: conditional put, head, delete, list"
+
+    protocol_version = "HTTP/1.1"
+    object_dict = dict()  # key -> (body, etag, last modified)
+    object_lock = threading.Lock()
+    sequence = itertools.count()
+
+    def log_message(self, *args):
+        pass
+
+    def read_body(self) -> bytes:
+        body = self.rfile.read(int(self.headers.get("content-length", 0)))
+        if "aws-chunked" in self.headers.get("content-encoding", ""):
+            plain = bytearray()
+            while True:
+                size_line, _, body = body.partition(b"\r\n")
+                size = int(size_line.split(b";")[0], 16)
+                if size == 0:
+                    break
+                plain += body[:size]
+                body = body[size + 2:]
+            body = bytes(plain)
+        return body
+
+    def reply(self, status:int, body:bytes=b"", header_dict:dict=None) -> None:
+        self.send_response(status)
+        for key, value in (header_dict or dict()).items():
+            self.send_header(key, value)
+        self.send_header("content-length", str(len(body)))
+        self.end_headers()
+        if self.command != "HEAD":
+            self.wfile.write(body)
+
+    def object_key(self) -> str:
+        return unquote(urlsplit(self.path).path).split("/", 2)[2]
+
+    def do_PUT(self):
+        object_key = self.object_key()
+        body = self.read_body()
+        with self.object_lock:
+            entry = self.object_dict.get(object_key)
+            if_none_match = self.headers.get("if-none-match")
+            if_match = self.headers.get("if-match")
+            if (if_none_match == "*" and entry) or (if_match and (not entry or entry[1] != if_match)):
+                return self.reply(412, b"<Error><Code>PreconditionFailed</Code></Error>")
+            etag = '"' + hashlib.md5(body + str(next(self.sequence)).encode()).hexdigest() + '"'
+            self.object_dict[object_key] = (body, etag, datetime.now(timezone.utc))
+        self.reply(200, header_dict={"etag": etag})
+
+    def do_HEAD(self):
+        entry = self.object_dict.get(self.object_key())
+        if entry is None:
+            return self.reply(404)
+        self.reply(200, header_dict={
+            "etag": entry[1],
+            "last-modified": format_datetime(entry[2], usegmt=True),
+        })
+
+    def do_DELETE(self):
+        with self.object_lock:
+            self.object_dict.pop(self.object_key(), None)
+        self.reply(204)
+
+    def do_GET(self):
+        query = dict(parse_qsl(urlsplit(self.path).query))
+        prefix = query.get("prefix", "")
+        content = "".join(
+            f"<Contents><Key>{escape(key)}</Key><Size>{len(body)}</Size><ETag>{escape(etag)}</ETag>"
+            f"<LastModified>{last_modified.strftime('%Y-%m-%dT%H:%M:%S.000Z')}</LastModified></Contents>"
+            for key, (body, etag, last_modified) in sorted(self.object_dict.items()) if key.startswith(prefix)
+        )
+        self.reply(200, (
+            f"<ListBucketResult><Name>bucket</Name><Prefix>{escape(prefix)}</Prefix>"
+            f"<IsTruncated>false</IsTruncated>{content}</ListBucketResult>"
+        ).encode())
+
+
+class LeaseOperatorS3(BucketOperatorS3):
+
+    def __init__(self, endpoint_url:str):
+        super().__init__(
+            config_access=AuthBucketS3("us-east-1", "bucket", "private", "access", "secret"),
+            dedup_index=DedupIndex(DedupConfig(dedup_mode="none", index_path=":memory:")),
+        )
+        self.endpoint_url = endpoint_url
+
+    def client_s3(self):
+        if self.client_value is None:
+            import boto3
+            import botocore.config
+            self.client_value = boto3.session.Session().client(
+                's3',
+                region_name="us-east-1",
+                endpoint_url=self.endpoint_url,
+                aws_access_key_id="access",
+                aws_secret_access_key="secret",
+                config=botocore.config.Config(s3=dict(addressing_style="path")),
+            )
+        return self.client_value
+
+
+def produce_lease(bucket_operator:BucketOperatorS3, node_name:str) -> PartitionLease:
+    return PartitionLease(
+        PartitionConfig(
+            partition_enable=True,
+            node_name=node_name,
+            lease_prefix=".file_sync_s3/lease/",
+            lease_duration=60.0,
+            lease_renew=1.0,
+            ring_replica=128,
+        ),
+        bucket_operator,
+    )
+
+
+def test_hash_ring():
+    print()
+
+    key_list = [f"tree/file-{index}.gz" for index in range(20000)]
+    ring_three = HashRing(["one", "two", "three"], 128)
+    owner_three = [ring_three.owner(key) for key in key_list]
+    for node_name in ["one", "two", "three"]:
+        assert 0.25 < owner_three.count(node_name) / len(key_list) < 0.42
+
+    ring_four = HashRing(["one", "two", "three", "four"], 128)
+    owner_four = [ring_four.owner(key) for key in key_list]
+    move_list = [(past, next) for past, next in zip(owner_three, owner_four) if past != next]
+    assert all(next == "four" for _, next in move_list)  # only keys of the new node move
+    assert 0.18 < len(move_list) / len(key_list) < 0.32
+
+    assert HashRing([], 128).owner("file.gz") is None
+
+
+def test_partition_lease():
+    print()
+
+    LeaseHandlerS3.object_dict.clear()
+    server = ThreadingHTTPServer(("127.0.0.1", 0), LeaseHandlerS3)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    try:
+        bucket_operator = LeaseOperatorS3(f"http://127.0.0.1:{server.server_address[1]}")
+        lease_one = produce_lease(bucket_operator, "one")
+        lease_two = produce_lease(bucket_operator, "two")
+        assert lease_one.member_refresh() == (["one"], True)
+        assert lease_two.member_refresh() == (["one", "two"], True)
+        assert lease_one.member_refresh() == (["one", "two"], True)
+        assert lease_one.member_refresh() == (["one", "two"], False)  # renewal with own version
+
+        key_list = [f"tree/file-{index}.gz" for index in range(1000)]
+        owner_one = {key for key in key_list if lease_one.has_owner(key)}
+        owner_two = {key for key in key_list if lease_two.has_owner(key)}
+        assert owner_one and owner_two
+        assert owner_one.isdisjoint(owner_two) and owner_one | owner_two == set(key_list)
+
+        lease_copy = produce_lease(bucket_operator, "one")
+        assert not lease_copy.lease_renew()  # live lease is not taken over
+
+        lease_key = lease_two.lease_key("two")
+        body, etag, _ = LeaseHandlerS3.object_dict[lease_key]
+        LeaseHandlerS3.object_dict[lease_key] = (body, etag, datetime.now(timezone.utc) - timedelta(minutes=5))
+        node_list, changed = lease_one.member_refresh()
+        assert (node_list, changed) == (["one"], True)
+        assert all(lease_one.has_owner(key) for key in key_list)
+
+        lease_again = produce_lease(bucket_operator, "two")
+        assert lease_again.lease_renew()  # expired lease is taken over
+        assert not lease_two.lease_renew()  # past holder lost it
+
+        lease_again.lease_release()
+        assert lease_key not in LeaseHandlerS3.object_dict
+    finally:
+        server.shutdown()
+
+
+def test_partition_reactor():
+    print()
+
+    partition_lease = produce_lease(None, "one")
+    partition_lease.hash_ring = HashRing(["one", "two"], 128)
+    folder_config = FolderConfig(
+        folder_path="/base",
+        watcher_timeout=1,
+        watcher_recursive=True,
+        regex_include_list=[".+"],
+        regex_exclude_list=[],
+        keeper_expire=False,
+        keeper_diem_span=3,
+        keeper_scan_period=timedelta(hours=1),
+    )
+    event_reactor = EventReactor(
+        folder_config=folder_config,
+        bucket_operator=BucketOperatorS3(dedup_index=DedupIndex(DedupConfig(dedup_mode="none", index_path=":memory:"))),
+        partition_lease=partition_lease,
+    )
+    owner_list = [f"/base/file-{index}.gz" for index in range(100)]
+    owner_one = [path for path in owner_list if partition_lease.hash_ring.owner(path[len("/base/"):]) == "one"]
+    owner_two = [path for path in owner_list if path not in owner_one]
+    assert event_reactor.event_action_list(FileModifiedEvent(owner_one[0])) == \
+        [("put", owner_one[0], event_reactor.remot_path(owner_one[0]))]
+    assert event_reactor.event_action_list(FileModifiedEvent(owner_two[0])) == []
+    assert event_reactor.event_action_list(FileMovedEvent(owner_two[0], owner_one[0])) == \
+        [("put", owner_one[0], event_reactor.remot_path(owner_one[0]))]
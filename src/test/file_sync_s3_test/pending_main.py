@@ -0,0 +1,86 @@
+"""
+pending event store benchmark: memory per pending path during event storm
+"""
+
+import gc
+import os
+import sys
+import time
+import resource
+import subprocess
+
+from file_sync_s3_test import *
+
+from file_sync_s3.pending import *
+
+from watchdog.events import FileModifiedEvent
+
+logger = logging.getLogger(__name__)
+
+folder_size = 1000  # files per folder
+
+
+def produce_path(index:int) -> str:
+    return f"/data/storm/folder-{index // folder_size:06d}/file-{index:09d}.binary"
+
+
+def resident_size() -> int:
+    "current resident memory, bytes"
+    with open("/proc/self/statm") as statm_unit:
+        return int(statm_unit.read().split()[1]) * resource.getpagesize()
+
+
+def measure_store(layout:str, count:int) -> None:
+    "register count events into the layout, report memory and time"
+
+    gc.collect()
+    memory_start = resident_size()
+    time_start = time.perf_counter()
+
+    if layout == "dict":  # former layout: path -> entry with full event object
+        event_dict = dict()
+        for index in range(count):
+            path = produce_path(index)
+            event_dict[path] = EventEntry(
+                stamp=time.time(), origin=time.time(), event=FileModifiedEvent(path), priority_class=1,
+            )
+        store_size = len(event_dict)
+    else:
+        spill_limit = count if layout == "compact" else count // 10
+        pending_store = PendingStore(PendingConfig(
+            pending_spill_limit=spill_limit,
+            pending_spill_path="",
+            pending_handover=10000,
+        ))
+        for index in range(count):
+            current = time.time()
+            pending_store.store(FileModifiedEvent(produce_path(index)), current, current, 1)
+        store_size = len(pending_store)
+
+    time_finish = time.perf_counter()
+    gc.collect()
+    memory_finish = resident_size()
+
+    memory_delta = memory_finish - memory_start
+    logger.info(
+        f"{layout:8s} count={store_size:>12,} memory={memory_delta / 2**20:10,.1f} MiB "
+        f"per_path={memory_delta / store_size:7.1f} B time={time_finish - time_start:7.1f} s"
+    )
+
+
+def pending_main():
+    "each measurement runs in a fresh interpreter"
+    logger.info(f"INITIATE")
+    count_list = [int(count) for count in sys.argv[1:]] or [1_000_000, 10_000_000]
+    env = dict(os.environ, PYTHONPATH=os.pathsep.join(sys.path))
+    for count in count_list:
+        for layout in ("dict", "compact", "spill"):
+            subprocess.run(
+                [sys.executable, "-c", f"from file_sync_s3_test.pending_main import *; measure_store('{layout}', {count})"],
+                env=env, check=True,
+            )
+    logger.info(f"TERMINATE")
+
+
+if __name__ == "__main__":
+    pending_main()
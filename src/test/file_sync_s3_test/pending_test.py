@@ -0,0 +1,92 @@
+"""
+"""
+
+from file_sync_s3.pending import *
+
+from watchdog.events import FileCreatedEvent, FileModifiedEvent, FileMovedEvent
+
+
+def produce_store(spill_limit:int=1000) -> PendingStore:
+    return PendingStore(PendingConfig(
+        pending_spill_limit=spill_limit,
+        pending_spill_path="",
+        pending_handover=100,
+    ))
+
+
+def test_pending_store():
+    print()
+
+    pending_store = produce_store()
+    pending_store.store(FileCreatedEvent("/base/one/a.gz"), 10.0, 10.0, PriorityClass.init)
+    pending_store.store(FileMovedEvent("/base/one/b.gz", "/base/two/b.gz"), 11.0, 11.0, PriorityClass.live)
+    pending_store.store(FileModifiedEvent("/base/two/c.gz"), 12.0, 12.0, PriorityClass.live)
+    assert len(pending_store) == 3
+    assert pending_store.dir_list == ["/base/one", "/base/two"]
+    assert "/base/one/a.gz" in pending_store
+    assert "/base/one/c.gz" not in pending_store
+    assert pending_store.lookup("/base/one/a.gz") == (10.0, 10.0, PriorityClass.init)
+
+    # same stamp: in place, new stamp: moved to queue tail
+    pending_store.store(FileModifiedEvent("/base/one/a.gz"), 10.0, 10.0, PriorityClass.init)
+    pending_store.store(FileModifiedEvent("/base/one/b.gz"), 13.0, 11.0, PriorityClass.live)
+    assert len(pending_store) == 3
+
+    # settled entries: live class first, then by stamp, younger entries stay
+    entry_list = pending_store.expire_list(current=14.0, timeout=1.5, limit=10)
+    assert [(entry.event.event_type, entry.event.src_path) for entry in entry_list] == [
+        ("modified", "/base/two/c.gz"),
+        ("modified", "/base/one/a.gz"),
+    ]
+    assert entry_list[0].priority_class == PriorityClass.live
+    assert len(pending_store) == 1
+
+    event_entry = pending_store.pop("/base/one/b.gz")
+    assert (event_entry.stamp, event_entry.origin) == (13.0, 11.0)
+    assert pending_store.pop("/base/one/b.gz") is None
+    assert len(pending_store) == 0 and pending_store.dir_list == []
+
+
+def test_pending_order():
+    print()
+
+    pending_store = produce_store()
+    pending_store.compact_minimum = 2
+    pending_store.store(FileMovedEvent("/base/move.gz", "/base/dest.gz"), 1.0, 1.0, PriorityClass.live)
+    pending_store.store(FileModifiedEvent("/base/retry.gz"), 50.0, 1.0, PriorityClass.live)  # backoff
+    for index in range(10):
+        pending_store.store(FileModifiedEvent(f"/base/file-{index}.gz"), 2.0 + index, 2.0, PriorityClass.live)
+
+    entry_list = pending_store.expire_list(current=10.0, timeout=1.0, limit=5)
+    assert entry_list[0].event.dest_path == "/base/dest.gz"
+    assert [entry.event.src_path for entry in entry_list[1:]] == [f"/base/file-{index}.gz" for index in range(4)]
+
+    entry_list = pending_store.expire_list(current=10.0, timeout=1.0, limit=5)
+    assert [entry.event.src_path for entry in entry_list] == [f"/base/file-{index}.gz" for index in range(4, 7)]
+    assert pending_store.lookup("/base/file-9.gz") == (11.0, 2.0, PriorityClass.live)
+
+    entry_list = pending_store.expire_list(current=60.0, timeout=1.0, limit=5)
+    assert sorted(entry.event.src_path for entry in entry_list) == \
+        ["/base/file-7.gz", "/base/file-8.gz", "/base/file-9.gz", "/base/retry.gz"]
+
+
+def test_pending_spill():
+    print()
+
+    pending_store = produce_store(spill_limit=2)
+    for index in range(5):
+        pending_store.store(FileModifiedEvent(f"/base/file-{index}.gz"), 1.0 + index, 1.0, PriorityClass.init)
+    assert pending_store.memory_count() == 2
+    assert len(pending_store) == 5
+    assert pending_store.lookup("/base/file-4.gz") == (5.0, 1.0, PriorityClass.init)
+
+    pending_store.store(FileModifiedEvent("/base/file-4.gz"), 0.5, 1.0, PriorityClass.init)
+    assert len(pending_store) == 5
+    assert pending_store.pop("/base/file-3.gz").stamp == 4.0
+
+    entry_list = pending_store.expire_list(current=10.0, timeout=1.0, limit=10)
+    assert [entry.event.src_path for entry in entry_list] == [
+        "/base/file-0.gz", "/base/file-1.gz", "/base/file-4.gz", "/base/file-2.gz",
+    ]
+    assert len(pending_store) == 0
+    assert pending_store.pending_spill.connection is None
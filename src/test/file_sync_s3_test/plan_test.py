@@ -0,0 +1,181 @@
+"""
+"""
+
+from file_sync_s3.plan import *
+from file_sync_s3.dedup import DedupConfig, DedupIndex
+from file_sync_s3.layout import LayoutConfig
+from file_sync_s3.route import RouteConfig, RouteRule
+
+import time
+import tempfile
+import tracemalloc
+
+from datetime import datetime, timedelta, timezone
+
+
+class PlanPaginator:
+
+    def __init__(self, object_dict:dict):
+        self.object_dict = object_dict
+
+    def paginate(self, Bucket, Prefix):
+        key_list = sorted(key for key in self.object_dict if key.startswith(Prefix))
+        for index in range(0, len(key_list), 2):  # small pages
+            yield dict(Contents=[
+                dict(Key=key, Size=self.object_dict[key][0], LastModified=self.object_dict[key][1])
+                for key in key_list[index:index + 2]
+            ])
+
+
+class PlanClientS3:
+
+    def __init__(self, object_dict:dict):
+        self.object_dict = object_dict
+
+    def get_paginator(self, name):
+        return PlanPaginator(self.object_dict)
+
+
+class PlanOperatorS3(BucketOperatorS3):
+
+    def __init__(self, object_dict:dict):
+        super().__init__(
+            dedup_index=DedupIndex(DedupConfig(dedup_mode="none", index_path=":memory:")),
+        )
+        self.fake_client = PlanClientS3(object_dict)
+
+    def client_s3(self):
+        return self.fake_client
+
+
+def produce_planner(base_dir:str, object_dict:dict, layout_mode:str="flat", rule_list:tuple=()) -> SyncPlanner:
+    folder_config = FolderConfig(
+        folder_path=base_dir,
+        watcher_timeout=1,
+        watcher_recursive=True,
+        regex_include_list=[".+[.]gz"],
+        regex_exclude_list=[],
+        keeper_expire=False,
+        keeper_diem_span=3,
+        keeper_scan_period=timedelta(hours=1),
+    )
+    key_layout = KeyLayout(LayoutConfig(layout_mode=layout_mode, shard_width=1))
+    return SyncPlanner(
+        folder_config=folder_config,
+        bucket_operator=PlanOperatorS3({key_layout.remot_key(key): entry for key, entry in object_dict.items()}),
+        key_layout=key_layout,
+        object_router=ObjectRouter(RouteConfig(route_cache_size=16, rule_list=rule_list)),
+        plan_config=PlanConfig(plan_bandwidth=1000, plan_latency=0.5, plan_queue_size=4, plan_head_verify=False),
+        transfer_concurrency=2,
+    )
+
+
+def produce_tree(base_dir:str) -> None:
+    past_time = time.time() - 3600
+    for name, body in [
+            ("a-b.gz", b"new"),
+            ("a/same.gz", b"same"),
+            ("a/stale.gz", b"stale"),
+            ("a/clash.gz", b"clash"),
+            ("a0.gz", b"fresh"),
+            ("skip.txt", b"skip"),
+        ]:
+        file_path = os.path.join(base_dir, name)
+        os.makedirs(os.path.dirname(file_path), exist_ok=True)
+        with open(file_path, "wb") as file_unit:
+            file_unit.write(body)
+        os.utime(file_path, (past_time, past_time))
+    os.utime(os.path.join(base_dir, "a/stale.gz"))  # changed after upload
+
+
+def produce_listing() -> dict:
+    upload_time = datetime.now(timezone.utc) - timedelta(minutes=30)
+    return {
+        "a/same.gz": (4, upload_time),
+        "a/stale.gz": (5, upload_time),
+        "a/clash.gz": (9, upload_time),
+        "a/gone.gz": (7, upload_time),
+        "a/foreign.bin": (7, upload_time),
+    }
+
+
+def test_sorted_walk():
+    print()
+
+    with tempfile.TemporaryDirectory() as base_dir:
+        produce_tree(base_dir)
+        key_list = [key for key, _ in SupportFuncPlan.sorted_walk(base_dir, True)]
+        assert key_list == sorted(key_list)
+        assert key_list == ["a-b.gz", "a/clash.gz", "a/same.gz", "a/stale.gz", "a0.gz", "skip.txt"]
+        assert [key for key, _ in SupportFuncPlan.sorted_walk(base_dir, False)] == ["a-b.gz", "a0.gz", "skip.txt"]
+
+
+def test_plan_scan():
+    print()
+
+    for layout_mode in ["flat", "shard"]:
+        with tempfile.TemporaryDirectory() as base_dir:
+            produce_tree(base_dir)
+            sync_planner = produce_planner(base_dir, produce_listing(), layout_mode)
+            assert list(sync_planner.plan_scan()) == [
+                ("upload", "a-b.gz", 3),
+                ("conflict", "a/clash.gz", 5),
+                ("delete", "a/gone.gz", 7),
+                ("skip", "a/same.gz", 4),
+                ("upload", "a/stale.gz", 5),
+                ("upload", "a0.gz", 5),
+            ]
+            plan_report = sync_planner.plan_report()
+            assert plan_report.count_dict == dict(upload=3, skip=1, delete=1, conflict=1)
+            assert plan_report.bytes_dict == dict(upload=13, skip=4, delete=7, conflict=5)
+            assert plan_report.estimate_seconds == (13 + 5) / 1000 + 5 * 0.5 / 2
+            assert json.loads(plan_report.report_json())['count']['upload'] == 3
+
+
+def test_plan_route():
+    print()
+
+    with tempfile.TemporaryDirectory() as base_dir:
+        produce_tree(base_dir)
+        route_rule = RouteRule(
+            rule_name="archive",
+            regex_include_list=[".+/a/.+"],
+            regex_exclude_list=[],
+            storage_class="",
+            content_type="",
+            cache_control="",
+            sse_mode="",
+            sse_key_id="",
+            key_prefix="archive/",
+        )
+        object_dict = {"archive/" + key: entry for key, entry in produce_listing().items()}
+        object_dict["a0.gz"] = (5, datetime.now(timezone.utc))
+        sync_planner = produce_planner(base_dir, object_dict, rule_list=(route_rule,))
+        assert sorted(sync_planner.plan_scan()) == [
+            ("conflict", "archive/a/clash.gz", 5),
+            ("delete", "archive/a/gone.gz", 7),
+            ("skip", "a0.gz", 5),
+            ("skip", "archive/a/same.gz", 4),
+            ("upload", "a-b.gz", 3),
+            ("upload", "archive/a/stale.gz", 5),
+        ]
+
+
+def test_merge_memory():
+    print()
+
+    entry_count = 200_000
+    stamp = datetime.now(timezone.utc)
+    local_iter = ((f"key-{index:08d}", None) for index in range(0, entry_count, 2))
+    remot_iter = ((f"key-{index:08d}", 0, stamp) for index in range(0, entry_count, 3))
+    tracemalloc.start()
+    join_count = 0
+    for _ in SupportFuncPlan.merge_join(
+            SupportFuncPlan.stream_thread(local_iter, 4096, "local"),
+            SupportFuncPlan.stream_thread(remot_iter, 4096, "remot"),
+        ):
+        join_count += 1
+    _, peak_size = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    assert join_count == len(set(range(0, entry_count, 2)) | set(range(0, entry_count, 3)))
+    assert peak_size < 8 * 1024 * 1024
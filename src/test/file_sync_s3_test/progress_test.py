@@ -0,0 +1,72 @@
+"""
+"""
+
+from file_sync_s3.progress import *
+
+from concurrent.futures import ThreadPoolExecutor
+
+
+def test_progress_counter():
+    print()
+
+    progress_counter = ProgressCounter("file.gz", 64 * 1000)
+    with ThreadPoolExecutor(8) as executor:
+        for _ in executor.map(lambda _: [progress_counter(1) for _ in range(1000)], range(64)):
+            pass
+    assert progress_counter.wired_size() == 64 * 1000
+
+
+def test_progress_sample():
+    print()
+
+    progress_tracker = ProgressTracker(ProgressConfig(progress_mode="none", progress_interval=1.0))
+
+    with progress_tracker.transfer("empty.gz", 0) as progress_counter:
+        progress_counter(0)  # empty file has nothing to divide
+
+    with progress_tracker.transfer("one.gz", 1000) as one_counter:
+        with progress_tracker.transfer("two.gz", 3000) as two_counter:
+            one_counter(400)
+            two_counter(1000)
+            progress_sample = progress_tracker.sample()
+            assert progress_sample.active_count == 2
+            assert progress_sample.wired_bytes == 1400
+            assert progress_sample.remain_bytes == 2600
+            assert progress_sample.byte_rate > 0
+            assert progress_sample.eta_seconds == 2600 / progress_sample.byte_rate
+        one_counter(600)
+
+    progress_sample = progress_tracker.sample()
+    assert progress_sample.active_count == 0
+    assert progress_sample.finish_count == 3
+    assert progress_sample.wired_bytes == 2000
+    assert progress_sample.remain_bytes == 0
+    assert progress_sample.eta_seconds == 0
+
+    assert not progress_tracker.is_alive()  # nothing to report, reporter is not started
+    assert len(progress_tracker.finish_deque) == 0  # totals are folded in place
+
+    report = json.loads(progress_sample.report_json())
+    assert report['active_count'] == 0 and report['wired_bytes'] == 2000
+
+
+def test_progress_report():
+    print()
+
+    progress_tracker = ProgressTracker(ProgressConfig(progress_mode="json", progress_interval=0.01))
+    report_list = []
+    progress_tracker.report = report_list.append
+    with progress_tracker.transfer("file.gz", 100) as progress_counter:
+        progress_counter(100)
+        time.sleep(0.1)
+    time.sleep(0.1)
+    progress_tracker.stop()
+    progress_tracker.join()
+    assert report_list[0].active_count == 1
+    assert report_list[-1].active_count == 0 and report_list[-1].finish_count == 1
+    assert len(report_list) < 20  # idle intervals are not reported
+
+    with progress_tracker.transfer("late.gz", 100) as progress_counter:
+        progress_counter(100)
+    assert len(progress_tracker.finish_deque) == 0  # stopped reporter does not drain
+    assert progress_tracker.finish_count == 2
@@ -0,0 +1,113 @@
+"""
+"""
+
+from file_sync_s3.route import *
+from file_sync_s3.aws_s3 import BucketOperatorS3
+from file_sync_s3.dedup import DedupConfig, DedupIndex
+from file_sync_s3.watcher import EventReactor, FolderConfig
+
+import os
+import tempfile
+
+from datetime import timedelta
+
+
+class RouteClientS3:
+
+    def __init__(self):
+        self.extra_args_dict = dict()
+
+    def head_object(self, Bucket, Key):
+        raise KeyError(Key)
+
+    def upload_file(self, Bucket, Filename, Key, ExtraArgs, Config, Callback):
+        self.extra_args_dict[Key] = ExtraArgs
+
+
+class RouteOperatorS3(BucketOperatorS3):
+
+    def __init__(self, object_router:ObjectRouter):
+        super().__init__(
+            dedup_index=DedupIndex(DedupConfig(dedup_mode="none", index_path=":memory:")),
+            object_router=object_router,
+        )
+        self.fake_client = RouteClientS3()
+
+    def client_s3(self):
+        return self.fake_client
+
+
+def produce_router() -> ObjectRouter:
+    with tempfile.TemporaryDirectory() as base_dir:
+        home_dir = os.environ.get('HOME')
+        with open(os.path.join(base_dir, ".file_sync_s3.ini"), "w") as file_unit:
+            file_unit.write(
+                "[amazon/route/archive]\n"
+                "regex_include@list = .+[.]zst\\Z,\n"
+                "regex_exclude@list = .+/scratch/.+,\n"
+                "storage_class = GLACIER_IR\n"
+                "sse_mode = AES256\n"
+                "key_prefix = archive/\n"
+                "[amazon/route/html]\n"
+                "regex_include@list = .+[.]html\\Z,\n"
+                "content_type = auto\n"
+                "cache_control = max-age=300\n"
+            )
+        try:
+            os.environ['HOME'] = base_dir
+            CONFIG.reload()
+            return ObjectRouter()
+        finally:
+            os.environ['HOME'] = home_dir
+            CONFIG.reload()
+
+
+def test_object_router():
+    print()
+
+    object_router = produce_router()
+    assert [rule.rule_name for rule in object_router.route_config.rule_list] == ["archive", "html"]
+
+    assert object_router.object_args("/base/data.zst") == dict(StorageClass="GLACIER_IR", ServerSideEncryption="AES256")
+    assert object_router.key_prefix("/base/data.zst") == "archive/"
+    assert object_router.object_args("/base/scratch/data.zst") == dict()
+    assert object_router.object_headers("/base/page.html") == {"content-type": "text/html", "cache-control": "max-age=300"}
+    assert object_router.key_prefix("/base/page.html") == ""
+
+    object_router.key_prefix("/base/data.zst")
+    assert object_router.rule_find.cache_info().hits >= 2
+
+    assert not ObjectRouter(RouteConfig(route_cache_size=16, rule_list=())).has_enable()
+
+
+def test_route_put():
+    print()
+
+    object_router = produce_router()
+    bucket_operator = RouteOperatorS3(object_router)
+    with tempfile.TemporaryDirectory() as base_dir:
+        folder_config = FolderConfig(
+            folder_path=base_dir,
+            watcher_timeout=1,
+            watcher_recursive=True,
+            regex_include_list=[".+"],
+            regex_exclude_list=[],
+            keeper_expire=False,
+            keeper_diem_span=3,
+            keeper_scan_period=timedelta(hours=1),
+        )
+        event_reactor = EventReactor(
+            folder_config=folder_config,
+            bucket_operator=bucket_operator,
+            object_router=object_router,
+        )
+        file_path = os.path.join(base_dir, "data.zst")
+        with open(file_path, "wb") as file_unit:
+            file_unit.write(b"data")
+        remot_path = event_reactor.remot_path(file_path)
+        assert remot_path == "archive/data.zst"
+        bucket_operator.resource_put_sync(file_path, remot_path)
+        extra_args = bucket_operator.fake_client.extra_args_dict[remot_path]
+        assert extra_args['StorageClass'] == "GLACIER_IR"
+        assert extra_args['ServerSideEncryption'] == "AES256"
+        assert extra_args['ACL'] == bucket_operator.config_access.object_mode
@@ -0,0 +1,51 @@
+"""
+"""
+
+from file_sync_s3.schedule import *
+
+schedule_config = ScheduleConfig(
+    schedule_aging_rate=1000,
+    schedule_slice=1.0,
+)
+
+
+def select_all(scheduler:TransferScheduler) -> list:
+    result = []
+    while True:
+        job = scheduler.select()
+        if job is None:
+            return result
+        result.append(job[0])
+
+
+def test_priority_class():
+    print()
+
+    scheduler = TransferScheduler(schedule_config)
+    scheduler.submit("keeper", None, PriorityClass.keeper, 0, stamp=0)
+    scheduler.submit("init", None, PriorityClass.init, 0, stamp=0)
+    scheduler.submit("live", None, PriorityClass.live, 10 ** 9, stamp=100)
+    assert select_all(scheduler) == ["live", "init", "keeper"]
+
+
+def test_shortest_job_aging():
+    print()
+
+    scheduler = TransferScheduler(schedule_config)
+    scheduler.submit("large-old", None, PriorityClass.init, 5000, stamp=0)  # key 5
+    scheduler.submit("small-new", None, PriorityClass.init, 1000, stamp=2)  # key 3
+    scheduler.submit("small-late", None, PriorityClass.init, 1000, stamp=9)  # key 10
+    assert select_all(scheduler) == ["small-new", "large-old", "small-late"]
+
+
+def test_replace_promote():
+    print()
+
+    scheduler = TransferScheduler(schedule_config)
+    scheduler.submit("path", "first", PriorityClass.init, 0, stamp=0)
+    scheduler.submit("other", "other", PriorityClass.live, 0, stamp=0)
+    scheduler.submit("path", "second", PriorityClass.live, 0, stamp=1)
+    assert len(scheduler) == 2
+    assert scheduler.select() == ("other", "other")
+    assert scheduler.select() == ("path", "second")
+    assert scheduler.select() is None
@@ -0,0 +1,201 @@
+"""
+"""
+
+from file_sync_s3.snapshot import *
+from file_sync_s3.aws_s3 import BucketOperatorS3
+from file_sync_s3.body import BodyConfig
+from file_sync_s3.dedup import DedupConfig, DedupIndex
+from file_sync_s3.watcher import EventReactor, FolderConfig, FileModifiedEvent
+
+import time
+import tempfile
+
+from boto3.s3.transfer import TransferConfig
+from datetime import timedelta
+
+MiB = 1024 * 1024
+
+
+class GrowingClientS3:
+    "fake client, source file grows while parts are being sent"
+
+    def __init__(self, local_path:str):
+        self.local_path = local_path
+        self.object_dict = dict()
+        self.abort_count = 0
+
+    def head_object(self, Bucket, Key):
+        raise KeyError(Key)
+
+    def put_object(self, Bucket, Key, Body, ContentMD5, **kwargs):
+        self.object_dict[Key] = bytes(Body.read())
+
+    def create_multipart_upload(self, Bucket, Key, **kwargs):
+        return dict(UploadId="upload-1")
+
+    def upload_part(self, Bucket, Key, UploadId, PartNumber, Body, ContentMD5):
+        with open(self.local_path, "ab") as file_unit:
+            file_unit.write(b"tail")
+        return dict(ETag=f"part-{PartNumber}")
+
+    def complete_multipart_upload(self, Bucket, Key, UploadId, MultipartUpload):
+        self.object_dict[Key] = b"torn"
+
+    def abort_multipart_upload(self, Bucket, Key, UploadId):
+        self.abort_count += 1
+
+
+class TruncatingClientS3(GrowingClientS3):
+    "fake client, source file is cut short while parts are being sent"
+
+    def upload_part(self, Bucket, Key, UploadId, PartNumber, Body, ContentMD5):
+        os.truncate(self.local_path, MiB)
+        return dict(ETag=f"part-{PartNumber}")
+
+
+class GrowingOperatorS3(BucketOperatorS3):
+
+    def __init__(self, local_path:str, snapshot_mode:str, client_class=GrowingClientS3):
+        super().__init__(
+            config_transfer=TransferConfig(multipart_chunksize=5 * MiB, max_concurrency=2),
+            dedup_index=DedupIndex(DedupConfig(dedup_mode="none", index_path=":memory:")),
+            body_config=BodyConfig(upload_mode="managed"),
+            snapshot_config=SnapshotConfig(snapshot_mode=snapshot_mode, snapshot_path=""),
+        )
+        self.fake_client = client_class(local_path)
+
+    def client_s3(self):
+        return self.fake_client
+
+
+class ChangeOperator:
+
+    def __init__(self):
+        self.attempt_count = 0
+
+    def resource_put_sync(self, local_path, remot_path):
+        self.attempt_count += 1
+        raise SnapshotChangeError(local_path)
+
+
+def test_snapshot_guard():
+    print()
+
+    with tempfile.TemporaryDirectory() as base_dir:
+        file_path = os.path.join(base_dir, "file.gz")
+        with open(file_path, "wb") as file_unit:
+            file_unit.write(b"head")
+
+        with SnapshotGuard(SnapshotConfig("stat", ""), file_path) as snapshot_guard:
+            assert snapshot_guard.source_path() == file_path
+            snapshot_guard.verify()
+            with open(file_path, "ab") as file_unit:
+                file_unit.write(b"tail")
+            try:
+                snapshot_guard.verify()
+                assert False
+            except SnapshotChangeError as error:
+                assert error.local_path == file_path
+
+        with SnapshotGuard(SnapshotConfig("reflink", ""), file_path) as snapshot_guard:
+            source_path = snapshot_guard.source_path()
+            with open(source_path, "rb") as file_unit:
+                assert file_unit.read() == b"headtail"
+            assert snapshot_guard.has_verify() == (source_path == file_path)
+        assert os.listdir(base_dir) == ["file.gz"]
+
+
+def test_snapshot_put():
+    print()
+
+    with tempfile.TemporaryDirectory() as base_dir:
+        file_path = os.path.join(base_dir, "file.gz")
+        with open(file_path, "wb") as file_unit:
+            file_unit.write(os.urandom(12 * MiB))
+        bucket_operator = GrowingOperatorS3(file_path, "stat")
+        try:
+            bucket_operator.resource_put_sync(file_path, "file.gz")
+            assert False
+        except SnapshotChangeError:
+            pass
+        assert bucket_operator.fake_client.abort_count == 1
+        assert "file.gz" not in bucket_operator.fake_client.object_dict
+
+
+def test_snapshot_truncate():
+    print()
+
+    with tempfile.TemporaryDirectory() as base_dir:
+        file_path = os.path.join(base_dir, "file.gz")
+        with open(file_path, "wb") as file_unit:
+            file_unit.write(os.urandom(12 * MiB))
+        bucket_operator = GrowingOperatorS3(file_path, "stat", TruncatingClientS3)
+        try:
+            bucket_operator.resource_put_sync(file_path, "file.gz")  # memory mapped parts would fault here
+            assert False
+        except SnapshotChangeError:
+            pass
+        assert bucket_operator.fake_client.abort_count == 1
+        assert "file.gz" not in bucket_operator.fake_client.object_dict
+
+
+def test_snapshot_retry():
+    print()
+
+    folder_config = FolderConfig(
+        folder_path="/tmp",
+        watcher_timeout=1,
+        watcher_recursive=False,
+        regex_include_list=[".+[.]gz"],
+        regex_exclude_list=[],
+        keeper_expire=False,
+        keeper_diem_span=3,
+        keeper_scan_period=timedelta(hours=1),
+        watcher_retry_delay=2.0,
+        watcher_retry_limit=5.0,
+    )
+    bucket_operator = ChangeOperator()
+    event_reactor = EventReactor(folder_config=folder_config, bucket_operator=bucket_operator)
+    event = FileModifiedEvent("/tmp/file.gz")
+
+    delay_list = []
+    for _ in range(3):
+        current = time.time()
+        event_reactor.process_event(event)
+        event_entry = event_reactor.pending_store.pop(event.src_path)
+        delay_list.append(round(event_entry.stamp - current))
+    assert delay_list == [2, 4, 5]
+    assert event_reactor.retry_dict[event.src_path] == 3
+
+
+def test_snapshot_clone_name():
+    print()
+
+    with tempfile.TemporaryDirectory() as base_dir:
+        folder_path = os.path.join(base_dir, "folder")
+        clone_path = os.path.join(base_dir, "clone")
+        os.makedirs(folder_path)
+        file_path = os.path.join(folder_path, "file.gz")
+        with open(file_path, "wb") as file_unit:
+            file_unit.write(b"head")
+        with SnapshotGuard(SnapshotConfig("reflink", clone_path), file_path) as snapshot_guard:
+            source_path = snapshot_guard.source_path()
+            assert os.listdir(folder_path) == ["file.gz"]  # clone, when supported, stays outside
+            assert source_path == file_path or os.path.dirname(source_path) == clone_path
+
+        folder_config = FolderConfig(
+            folder_path=folder_path,
+            watcher_timeout=1,
+            watcher_recursive=False,
+            regex_include_list=[".*"],
+            regex_exclude_list=[],
+            keeper_expire=False,
+            keeper_diem_span=3,
+            keeper_scan_period=timedelta(hours=1),
+        )
+        event_reactor = EventReactor(folder_config=folder_config, bucket_operator=ChangeOperator())
+        clone_name = os.path.join(folder_path, SnapshotSupport.clone_name(file_path))
+        assert event_reactor.has_regex_name(file_path)
+        assert not event_reactor.has_regex_name(clone_name)
+        event_reactor.on_any_event(FileModifiedEvent(clone_name))
+        assert event_reactor.pending_store.lookup(clone_name) is None
@@ -0,0 +1,190 @@
+"""
+"""
+
+from file_sync_s3.sparse import *
+from file_sync_s3.aws_s3 import BucketOperatorS3, SupportFuncS3
+from file_sync_s3.dedup import DedupConfig, DedupIndex
+from file_sync_s3.aio_s3 import AuthBucketS3, BucketOperatorAio, EngineConfig
+from file_sync_s3_test.aio_s3_test import LocalServerS3
+
+import asyncio
+import pytest
+import tempfile
+
+MiB = 1024 * 1024
+
+
+class SparseClientS3:
+    "boto3 client stand-in: object store of packed bodies with meta"
+
+    def __init__(self):
+        self.object_dict = dict()  # key -> (body, meta)
+
+    def upload_fileobj(self, Fileobj, Bucket, Key, ExtraArgs, Config, Callback):
+        Fileobj.seek(0, io.SEEK_END)
+        body_size = Fileobj.tell()
+        Fileobj.seek(0)
+        body = bytearray()
+        while True:
+            chunk = Fileobj.read(300 * 1024)  # reads cross extent borders
+            if not chunk:
+                break
+            body += chunk
+            Callback(len(chunk))
+        assert len(body) == body_size
+        self.object_dict[Key] = (bytes(body), dict(ExtraArgs['Metadata']))
+
+    def upload_file(self, Bucket, Filename, Key, ExtraArgs, Config, Callback):
+        with open(Filename, "rb") as file_unit:
+            self.upload_fileobj(file_unit, Bucket, Key, ExtraArgs, Config, Callback)
+
+    def head_object(self, Bucket, Key):
+        body, meta = self.object_dict[Key]
+        return dict(ContentLength=len(body), Metadata=meta)
+
+    def get_object(self, Bucket, Key):
+        return dict(Body=io.BytesIO(self.object_dict[Key][0]))
+
+
+class SparseOperatorS3(BucketOperatorS3):
+
+    def __init__(self):
+        super().__init__(
+            config_access=AuthBucketS3("us-east-1", "bucket", "private", "access", "secret"),
+            dedup_index=DedupIndex(DedupConfig(dedup_mode="none", index_path=":memory:")),
+            sparse_config=produce_config(),
+        )
+        self.fake_client = SparseClientS3()
+
+    def client_s3(self):
+        return self.fake_client
+
+
+def produce_config() -> SparseConfig:
+    return SparseConfig(sparse_enable=True, sparse_minimum=MiB, sparse_extent_limit=8)
+
+
+def produce_sparse(file_path:str, total_size:int, extent_list:List[Tuple[int, int]]) -> bytes:
+    "file of holes with random data extents, report its dense content"
+    content = bytearray(total_size)
+    with open(file_path, "wb") as file_unit:
+        file_unit.truncate(total_size)
+        for start, length in extent_list:
+            data = os.urandom(length)
+            content[start:start + length] = data
+            file_unit.seek(start)
+            file_unit.write(data)
+    return bytes(content)
+
+
+def require_holes(file_path:str, total_size:int) -> None:
+    extent_list = SupportFuncSparse.extent_scan(file_path, total_size)
+    if extent_list is None or sum(length for _, length in extent_list) == total_size:
+        pytest.skip("file system does not report holes")
+
+
+def test_extent_map():
+    print()
+
+    sparse_map = SparseExtentMap([(4096, 100), (8192, 0), (65536, 50)], 100000)
+    assert sparse_map.extent_list == [(4096, 100), (65536, 50)]
+    assert sparse_map.data_size == 150
+    assert sparse_map.hole_size() == 100000 - 150
+    assert sparse_map.encode() == "1000+64,10000+32,186a0+0"
+    assert SparseExtentMap.decode(sparse_map.encode()) == sparse_map
+    assert SparseExtentMap.decode(SparseExtentMap([], 4096).encode()).total_size == 4096  # only hole
+    assert sparse_map.file_range_list(0, 150) == [(4096, 100), (65536, 50)]
+    assert sparse_map.file_range_list(90, 20) == [(4186, 10), (65536, 10)]
+    assert sparse_map.file_range_list(100, 1000) == [(65536, 50)]
+    assert sparse_map.file_range_list(150, 10) == []
+
+
+def test_sparse_reader():
+    print()
+
+    with tempfile.TemporaryDirectory() as base_dir:
+        file_path = os.path.join(base_dir, "image.raw")
+        extent_list = [(MiB, 256 * 1024), (3 * MiB, 64 * 1024)]
+        content = produce_sparse(file_path, 4 * MiB, extent_list)
+        require_holes(file_path, 4 * MiB)
+        assert SupportFuncSparse.extent_scan(file_path, 4 * MiB) == extent_list
+        sparse_map = SparseExtentMap(extent_list, 4 * MiB)
+        packed = b"".join(content[start:start + length] for start, length in extent_list)
+        with SparseReader(file_path, sparse_map) as sparse_reader:
+            assert sparse_reader.read() == packed
+            sparse_reader.seek(200 * 1024)
+            assert sparse_reader.read(100 * 1024) == packed[200 * 1024:300 * 1024]
+            assert sparse_reader.tell() == 300 * 1024
+            assert sparse_reader.read() == packed[300 * 1024:]
+            assert sparse_reader.read(100) == b""
+
+
+def test_sparse_transfer():
+    print()
+
+    with tempfile.TemporaryDirectory() as base_dir:
+        source_path = os.path.join(base_dir, "source.raw")
+        target_path = os.path.join(base_dir, "target.raw")
+        total_size = 16 * MiB
+        content = produce_sparse(source_path, total_size, [(2 * MiB, MiB), (9 * MiB, 64 * 1024)])
+        require_holes(source_path, total_size)
+
+        bucket_operator = SparseOperatorS3()
+        bucket_operator.resource_put_sync(source_path, "image.raw")
+        body, meta = bucket_operator.fake_client.object_dict["image.raw"]
+        assert len(body) == MiB + 64 * 1024  # only data is sent
+        assert meta[SupportFuncS3.key_entry_length] == str(total_size)
+        assert SupportFuncS3.meta_extent(dict(Metadata=meta)).data_size == len(body)
+
+        bucket_operator.resource_get_sync(target_path, "image.raw")
+        with open(target_path, "rb") as file_unit:
+            assert file_unit.read() == content
+        assert os.stat(target_path).st_blocks * 512 < 2 * MiB  # holes are recreated
+        assert bucket_operator.local_meta(target_path) == bucket_operator.local_meta(source_path)
+
+        dense_path = os.path.join(base_dir, "dense.raw")
+        produce_sparse(dense_path, total_size, [(index * MiB, 4096) for index in range(16)])
+        bucket_operator.resource_put_sync(dense_path, "dense.raw")  # too many extents
+        body, meta = bucket_operator.fake_client.object_dict["dense.raw"]
+        assert len(body) == total_size and SupportFuncS3.key_entry_extent not in meta
+
+        body, meta = bucket_operator.fake_client.object_dict["image.raw"]
+        bucket_operator.fake_client.object_dict["image.raw"] = (body[:MiB], meta)  # stream ends early
+        with pytest.raises(RuntimeError):
+            bucket_operator.resource_get_sync(target_path, "image.raw", use_check=False)
+        with open(target_path, "rb") as file_unit:
+            assert file_unit.read() == content  # previous copy is intact
+        assert sorted(os.listdir(base_dir)) == ["dense.raw", "source.raw", "target.raw"]
+
+
+def test_sparse_transfer_aio():
+    print()
+
+    async def scenario(base_dir):
+        local_server = LocalServerS3()
+        server = await asyncio.start_server(local_server.handle, "127.0.0.1", 0)
+        port = server.sockets[0].getsockname()[1]
+        bucket_operator = BucketOperatorAio(
+            config_access=AuthBucketS3("us-east-1", "bucket", "private", "access", "secret"),
+            engine_config=EngineConfig("asyncio", f"http://127.0.0.1:{port}", 8, 2, 5 * MiB),
+            sparse_config=produce_config(),
+        )
+        try:
+            source_path = os.path.join(base_dir, "source.raw")
+            target_path = os.path.join(base_dir, "target.raw")
+            total_size = 64 * MiB
+            content = produce_sparse(source_path, total_size, [(MiB, 4 * MiB), (20 * MiB, 3 * MiB), (60 * MiB, 4096)])
+            require_holes(source_path, total_size)
+            await bucket_operator.resource_put(source_path, "image.raw")
+            body, _ = local_server.object_dict["/bucket/image.raw"]
+            assert len(body) == 7 * MiB + 4096  # multipart over packed body
+            await bucket_operator.resource_get(target_path, "image.raw")
+            with open(target_path, "rb") as file_unit:
+                assert file_unit.read() == content
+            assert os.stat(target_path).st_blocks * 512 < 8 * MiB
+        finally:
+            bucket_operator.close()
+            server.close()
+
+    with tempfile.TemporaryDirectory() as base_dir:
+        asyncio.run(scenario(base_dir))
@@ -0,0 +1,118 @@
+"""
+startup benchmark: import time and time to first event
+"""
+
+import os
+import sys
+import time
+import shutil
+import subprocess
+import threading
+
+from file_sync_s3_test import *
+
+from file_sync_s3.watcher import *
+
+logger = logging.getLogger(__name__)
+
+this_dir = os.path.dirname(os.path.abspath(__file__))
+file_sync_dir = f"{this_dir}/tmp/startup"
+
+import_script = """
+import sys, time
+time_start = time.perf_counter()
+import file_sync_s3.watcher
+time_finish = time.perf_counter()
+print(time_finish - time_start, 'boto3' in sys.modules)
+"""
+
+
+class RecordOperator:
+    "bucket operator stand-in which records first transfer"
+
+    def __init__(self):
+        self.transfer_event = threading.Event()
+
+    def resource_put_sync(self, local_path:str, remot_path:str) -> None:
+        if remot_path == "fresh.bin":
+            self.transfer_event.set()
+
+    def resource_delete_sync(self, remot_path:str) -> None:
+        pass
+
+
+def measure_import(count:int=5) -> None:
+    "module import time in fresh interpreter"
+    env = dict(os.environ, PYTHONPATH=os.pathsep.join(sys.path))
+    for index in range(count):
+        result = subprocess.run(
+            [sys.executable, "-c", import_script],
+            env=env, capture_output=True, text=True, check=True,
+        )
+        import_time, has_boto3 = result.stdout.split()
+        logger.info(f"import: {float(import_time) * 1000:8.2f} ms boto3={has_boto3}")
+
+
+def measure_first_event() -> None:
+    "time from service start to captured event and to first transfer"
+
+    shutil.rmtree(file_sync_dir, ignore_errors=True)
+    os.makedirs(file_sync_dir)
+
+    logging.getLogger("file_sync_s3.watcher").setLevel(logging.WARNING)
+
+    for index in range(10000):  # initial scan backlog
+        with open(f"{file_sync_dir}/backlog-{index}.bin", "wb"):
+            pass
+
+    folder_config = FolderConfig(
+        folder_path=file_sync_dir,
+        watcher_timeout=1,
+        watcher_recursive=True,
+        regex_include_list=[".+[.]bin"],
+        regex_exclude_list=[],
+        keeper_expire=False,
+        keeper_diem_span=3,
+        keeper_scan_period=timedelta(hours=1),
+    )
+
+    record_operator = RecordOperator()
+
+    time_start = time.perf_counter()
+
+    watcher_operator = WatcherOperator(
+        folder_config=folder_config,
+        bucket_operator=record_operator,
+    )
+    watcher_operator.initiate()
+    time_ready = time.perf_counter()
+
+    with open(f"{file_sync_dir}/fresh.bin", "wb") as file_unit:
+        file_unit.write(b"fresh")
+
+    event_reactor = watcher_operator.event_reactor
+    fresh_path = f"{file_sync_dir}/fresh.bin"
+    while fresh_path not in event_reactor.pending_store and not record_operator.transfer_event.is_set():
+        time.sleep(0.0001)
+    time_event = time.perf_counter()
+
+    record_operator.transfer_event.wait(30)
+    time_transfer = time.perf_counter()
+
+    watcher_operator.terminate()
+    shutil.rmtree(file_sync_dir, ignore_errors=True)
+
+    logger.info(f"initiate: {(time_ready - time_start) * 1000:8.2f} ms")
+    logger.info(f"event:    {(time_event - time_start) * 1000:8.2f} ms")
+    logger.info(f"transfer: {(time_transfer - time_start) * 1000:8.2f} ms (includes watcher_timeout)")
+
+
+def startup_main():
+    logger.info(f"INITIATE")
+    measure_import()
+    measure_first_event()
+    logger.info(f"TERMINATE")
+
+
+if __name__ == "__main__":
+    startup_main()
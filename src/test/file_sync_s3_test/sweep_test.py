@@ -0,0 +1,73 @@
+"""
+"""
+
+from file_sync_s3.sweep import *
+
+import pytest
+import tempfile
+import threading
+
+
+def produce_tree(base_dir:str) -> None:
+    "nested folders with files, symlinks and a fifo"
+    for index in range(5):
+        folder = os.path.join(base_dir, f"one-{index}", f"two-{index}")
+        os.makedirs(folder)
+        for count in range(index + 1):
+            with open(os.path.join(folder, f"file-{count}.gz"), "wb") as file_unit:
+                file_unit.write(b"x" * (index * 10 + count))
+    with open(os.path.join(base_dir, "root.gz"), "wb") as file_unit:
+        file_unit.write(b"root")
+    os.symlink(os.path.join(base_dir, "root.gz"), os.path.join(base_dir, "link.gz"))
+    os.symlink(os.path.join(base_dir, "one-1"), os.path.join(base_dir, "link-dir"))
+    os.symlink(os.path.join(base_dir, "missing"), os.path.join(base_dir, "broken.gz"))
+    os.mkfifo(os.path.join(base_dir, "pipe.gz"))
+
+
+def walk_record_list(base_dir:str) -> List[MetaRecord]:
+    "reference: os.walk with a stat per regular file"
+    record_list = []
+    for base, dir_list, file_list in os.walk(base_dir):
+        for file in file_list:
+            file_path = os.path.join(base, file)
+            if os.path.isfile(file_path):
+                file_stat = os.stat(file_path)
+                record_list.append(MetaRecord(
+                    file_path, file_stat.st_size, file_stat.st_mtime_ns, file_stat.st_ino, file_stat.st_ctime_ns,
+                ))
+    return record_list
+
+
+def path_sorted(record_list:List[MetaRecord]) -> List[MetaRecord]:
+    return sorted(record_list, key=lambda meta_record: meta_record.path)
+
+
+def test_sweep_tree():
+    print()
+
+    with tempfile.TemporaryDirectory() as base_dir:
+        produce_tree(base_dir)
+        expected_list = path_sorted(walk_record_list(base_dir))
+        assert len(expected_list) == 17  # 15 nested, root and file link
+        for sweep_threads in [1, 2, 16]:
+            meta_sweeper = MetaSweeper(SweepConfig(sweep_threads=sweep_threads))
+            assert path_sorted(meta_sweeper.sweep(base_dir)) == expected_list
+            plain_list = path_sorted(meta_sweeper.sweep(base_dir, recursive=False))
+            assert [os.path.basename(meta_record.path) for meta_record in plain_list] == ["link.gz", "root.gz"]
+        meta_record = expected_list[-1]
+        assert meta_record.mtime_ns == os.stat(meta_record.path).st_mtime_ns
+        assert meta_record.mtime() == pytest.approx(os.path.getmtime(meta_record.path))
+        assert not hasattr(meta_record, "__dict__")
+
+
+def test_sweep_close():
+    print()
+
+    with tempfile.TemporaryDirectory() as base_dir:
+        produce_tree(base_dir)
+        meta_sweeper = MetaSweeper(SweepConfig(sweep_threads=4))
+        record_iter = meta_sweeper.sweep(base_dir)
+        assert isinstance(next(record_iter), MetaRecord)
+        record_iter.close()  # abandoned sweep releases its pool
+        assert not any(thread.name.startswith("meta_sweep") for thread in threading.enumerate())
+        assert list(meta_sweeper.sweep(os.path.join(base_dir, "missing"))) == []
@@ -0,0 +1,108 @@
+"""
+"""
+
+from file_sync_s3.trace import *
+from file_sync_s3.schedule import ScheduleConfig, TransferScheduler
+
+from watchdog.events import DirCreatedEvent
+from watchdog.events import FileCreatedEvent
+from watchdog.events import FileDeletedEvent
+from watchdog.events import FileModifiedEvent
+from watchdog.events import FileMovedEvent
+
+import io
+import tempfile
+
+from datetime import timedelta
+
+
+def produce_trace(base_dir:str, trace_path:str) -> List[FileSystemEvent]:
+    for name, body in [("a.gz", b"a" * 100), ("b.gz", b"b" * 200), ("c.txt", b"c")]:
+        with open(os.path.join(base_dir, name), "wb") as file_unit:
+            file_unit.write(body)
+    event_list = [
+        DirCreatedEvent(f"{base_dir}/tree"),
+        FileCreatedEvent(f"{base_dir}/a.gz"),
+        FileModifiedEvent(f"{base_dir}/a.gz"),
+        FileModifiedEvent(f"{base_dir}/a.gz"),
+        FileModifiedEvent(f"{base_dir}/c.txt"),
+        FileMovedEvent(f"{base_dir}/x.gz", f"{base_dir}/b.gz"),
+        FileDeletedEvent(f"{base_dir}/gone.gz"),
+    ]
+    trace_recorder = TraceRecorder(trace_path, base_dir)
+    for event in event_list:
+        trace_recorder.dispatch(event)
+        time.sleep(0.01)
+    trace_recorder.close()
+    trace_recorder.dispatch(FileModifiedEvent(f"{base_dir}/a.gz"))  # late event after close is dropped
+    return event_list
+
+
+def test_trace_code():
+    print()
+
+    for value in [0, 1, 127, 128, 300, 2 ** 40]:
+        data = TraceCode.varint_pack(value)
+        assert TraceCode.varint_read(io.BytesIO(data)) == value
+    assert len(TraceCode.varint_pack(127)) == 1
+
+
+def test_trace_roundtrip():
+    print()
+
+    with tempfile.TemporaryDirectory() as base_dir:
+        trace_path = os.path.join(base_dir, "event.trace")
+        event_list = produce_trace(base_dir, trace_path)
+        trace_reader = TraceReader(trace_path)
+        assert trace_reader.folder_path == base_dir
+        entry_list = list(trace_reader)
+        assert [entry.event for entry in entry_list] == event_list
+        assert [entry.size for entry in entry_list] == [0, 100, 100, 100, 1, 200, 0]
+        stamp_list = [entry.stamp for entry in entry_list]
+        assert stamp_list == sorted(stamp_list)
+        assert stamp_list[-1] - stamp_list[0] >= 0.05
+        assert os.path.getsize(trace_path) < 400
+
+        with open(trace_path, "ab") as file_unit:
+            file_unit.write(bytes((2,)))  # partial record of interrupted recorder
+        assert len(list(TraceReader(trace_path))) == len(event_list)
+
+
+def test_trace_replay():
+    print()
+
+    with tempfile.TemporaryDirectory() as base_dir:
+        trace_path = os.path.join(base_dir, "event.trace")
+        produce_trace(base_dir, trace_path)
+        folder_config = FolderConfig(
+            folder_path="/",
+            watcher_timeout=1,
+            watcher_recursive=True,
+            regex_include_list=[".+[.]gz"],
+            regex_exclude_list=[],
+            keeper_expire=False,
+            keeper_diem_span=3,
+            keeper_scan_period=timedelta(hours=1),
+        )
+        trace_replay = TraceReplay(
+            trace_path,
+            speed=10.0,
+            trace_config=TraceConfig(trace_path="", replay_bandwidth=1000, replay_latency=0.1),
+            folder_config=folder_config,
+            transfer_scheduler=TransferScheduler(ScheduleConfig(schedule_aging_rate=1024, schedule_slice=0.1)),
+        )
+        assert trace_replay.event_reactor.folder_config.folder_path == base_dir
+        replay_report = trace_replay.perform_replay()
+        assert replay_report.trace_count == 7
+        assert replay_report.event_count == 5  # directory and unmatched file are filtered
+        assert replay_report.put_count == 2  # a.gz coalesced, b.gz moved in
+        assert replay_report.delete_count == 2  # x.gz moved away, gone.gz
+        assert replay_report.put_bytes == 300
+        assert replay_report.coalesce_ratio() == 5 / 4
+        assert len(replay_report.delay_list) == 3
+        assert all(delay >= 0.9 for delay in replay_report.delay_list)  # settle timeout in trace time
+        assert replay_report.pending_peak >= 1
+        assert not trace_replay.has_backlog()
+        report = json.loads(replay_report.report_json())
+        assert report['put_count'] == 2 and report['delay_p50'] >= 0.9
+        assert "coalesce_ratio" in replay_report.report_text()
@@ -2,8 +2,159 @@
 """
 
 from file_sync_s3.watcher import *
+from file_sync_s3.pending import PendingQueue
+
+import tempfile
+
+
+class RecordOperator:
+
+    def __init__(self):
+        self.record_list = []
+
+    def resource_put_sync(self, local_path, remot_path):
+        self.record_list.append(("put", remot_path))
+
+    def resource_delete_sync(self, remot_path):
+        self.record_list.append(("delete", remot_path))
+
 
 def test_watcher():
     print()
-    
-    
\ No newline at end of file
+
+
+def test_reconfigure():
+    print()
+
+    home_dir = os.environ.get('HOME')
+    with tempfile.TemporaryDirectory() as base_dir:
+        past_dir = os.path.join(base_dir, "past")
+        next_dir = os.path.join(base_dir, "next")
+        os.makedirs(past_dir)
+        os.makedirs(next_dir)
+        folder_config = FolderConfig(
+            folder_path=past_dir,
+            watcher_timeout=1,
+            watcher_recursive=False,
+            regex_include_list=[".+[.]gz"],
+            regex_exclude_list=[],
+            keeper_expire=False,
+            keeper_diem_span=3,
+            keeper_scan_period=timedelta(hours=1),
+        )
+        watcher_operator = WatcherOperator(
+            folder_config=folder_config,
+            bucket_operator=RecordOperator(),
+        )
+        event_reactor = watcher_operator.event_reactor
+        event_reactor.on_any_event(FileModifiedEvent(f"{past_dir}/file.gz"))
+        past_watch = watcher_operator.folder_watch
+
+        with open(os.path.join(base_dir, ".file_sync_s3.ini"), "w") as file_unit:
+            file_unit.write(
+                "[folder/watcher]\n"
+                f"folder_path = {next_dir}\n"
+                "regex_include@list = .+[.]txt,\n"
+                "regex_exclude@list = .+/skip/.+,\n"
+            )
+        try:
+            os.environ['HOME'] = base_dir
+            watcher_operator.reconfigure()
+        finally:
+            os.environ['HOME'] = home_dir
+            CONFIG.reload()
+
+        assert watcher_operator.folder_watch is not past_watch
+        assert watcher_operator.folder_watch.path == next_dir
+        assert event_reactor.folder_config.folder_path == next_dir
+        assert [regex.pattern for regex in event_reactor.regexes] == [".+[.]txt"]
+        assert f"{past_dir}/file.gz" in event_reactor.pending_store
+        assert event_reactor.remot_path(f"{past_dir}/file.gz") == "file.gz"
+        assert event_reactor.remot_path(f"{next_dir}/file.txt") == "file.txt"
+
+
+def test_reconfigure_reject():
+    print()
+
+    home_dir = os.environ.get('HOME')
+    with tempfile.TemporaryDirectory() as base_dir:
+        folder_config = FolderConfig(
+            folder_path=base_dir,
+            watcher_timeout=1,
+            watcher_recursive=False,
+            regex_include_list=[".+[.]gz"],
+            regex_exclude_list=[],
+            keeper_expire=False,
+            keeper_diem_span=3,
+            keeper_scan_period=timedelta(hours=1),
+        )
+        watcher_operator = WatcherOperator(
+            folder_config=folder_config,
+            bucket_operator=RecordOperator(),
+        )
+        event_reactor = watcher_operator.event_reactor
+        fanin_config = event_reactor.folder_fanin.fanin_config
+
+        with open(os.path.join(base_dir, ".file_sync_s3.ini"), "w") as file_unit:
+            file_unit.write(
+                "[folder/fanin]\n"
+                f"fanin_rate@int = {fanin_config.fanin_rate + 1}\n"
+                "[folder/diagnose]\n"
+                "inflight_limit@int = many\n"
+            )
+        try:
+            os.environ['HOME'] = base_dir
+            try:
+                watcher_operator.reconfigure()
+                assert False, "broken section must reject reload"
+            except ValueError:
+                pass
+            assert CONFIG['folder/fanin']['fanin_rate@int'] == fanin_config.fanin_rate
+        finally:
+            os.environ['HOME'] = home_dir
+            CONFIG.reload()
+
+        assert event_reactor.folder_fanin.fanin_config == fanin_config  # no partial apply
+
+        with open(os.path.join(base_dir, ".file_sync_s3.ini"), "w") as file_unit:
+            file_unit.write(
+                "[folder/watcher]\n"
+                f"folder_path = {base_dir}\n"
+                "watcher_timeout@int = 2\n"
+            )
+        try:
+            os.environ['HOME'] = base_dir
+            watcher_operator.reconfigure()
+        finally:
+            os.environ['HOME'] = home_dir
+            CONFIG.reload()
+
+        assert watcher_operator.folder_observer.timeout == 1  # observer timeout requires restart
+        assert watcher_operator.folder_config.watcher_timeout == 1
+
+
+def test_register_class_change():
+    print()
+
+    with tempfile.TemporaryDirectory() as base_dir:
+        folder_config = FolderConfig(
+            folder_path=base_dir,
+            watcher_timeout=1,
+            watcher_recursive=False,
+            regex_include_list=[".+[.]gz"],
+            regex_exclude_list=[],
+            keeper_expire=False,
+            keeper_diem_span=3,
+            keeper_scan_period=timedelta(hours=1),
+            watcher_settle_limit=0,
+        )
+        event_reactor = EventReactor(folder_config=folder_config, bucket_operator=RecordOperator())
+        pending_store = event_reactor.pending_store
+        event_reactor.register_event(FileModifiedEvent(f"{base_dir}/early.gz"), PriorityClass.init)
+        time.sleep(0.01)
+        event_reactor.register_event(FileModifiedEvent(f"{base_dir}/live.gz"), PriorityClass.live)
+        time.sleep(0.01)
+        event_reactor.register_event(FileModifiedEvent(f"{base_dir}/early.gz"), PriorityClass.live)  # settle limit is reached
+        queue = pending_store.queue_list[PriorityClass.live]
+        stamp_list = [stamp for stamp, code in zip(queue.stamp_array, queue.code_array) if code != PendingQueue.code_free]
+        assert len(stamp_list) == 2 and stamp_list == sorted(stamp_list)